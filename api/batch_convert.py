@@ -0,0 +1,444 @@
+"""
+Offline batch conversion.
+
+Converts every file of a directory tree to Markdown with the converters of
+api/route/converter.py, on a pool of worker processes, without the HTTP
+layer (no uploads, result cache or response rendering):
+
+    python -m api.batch_convert archive/ converted/
+    python -m api.batch_convert archive/ converted/ --workers 8 --pdf-tier layout
+    python -m api.batch_convert archive/ converted/ --retry-failed
+
+``archive/docs/a.pdf`` is written to ``converted/docs/a.pdf.md``. Every
+finished file is appended to ``converted/manifest.jsonl`` with its content
+hash, so an interrupted run picks up where it stopped and a later run only
+converts files that changed, failed with --retry-failed, or were converted
+by another converter version or PDF tier. ``converted/report.json`` gets the
+timings per format and the slowest files.
+
+Each file gets the memory budget and per-format time budget of /convert
+(FRIDA_CONVERSION_MEMORY_MB, FRIDA_CONVERSION_TIMEOUT(S)); a PDF that runs
+out of time keeps its partial output and is converted again next run.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import hashlib
+import argparse
+import mimetypes
+import statistics
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from api.controllers.conversion_engine import (
+    ENGINE_START_METHOD,
+    ConverterError,
+    _warm_worker,
+    budgeted_call,
+    kill_workers,
+    record_pid,
+    run_converter,
+    timed_call,
+)
+from api.controllers.pdf_layout import PDF_TIER, PDF_TIERS
+from api.controllers.resource_limits import (
+    CONVERSION_KILL_GRACE,
+    CONVERSION_MEMORY_MB,
+    CONVERSION_TIMEOUT,
+    CONVERSION_TIMEOUTS,
+    ConversionTimeout,
+    parse_timeouts,
+    timeout_for,
+)
+
+MANIFEST_NAME = "manifest.jsonl"
+REPORT_NAME = "report.json"
+# A file whose worker died is tried again this many times before it fails
+CRASH_RETRIES = 1
+
+
+def options_for(fmt: Optional[str], pdf_tier: str) -> Dict[str, str]:
+    return {"tier": pdf_tier} if fmt == "pdf" else {}
+
+
+def start_worker(pids) -> None:
+    # Ctrl-C is for the parent, which stops the pool; workers just get killed
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    record_pid(pids)
+    _warm_worker()
+
+
+def convert_file(
+    source: str, output: str, previous_hash: Optional[str], pdf_tier: str
+) -> Dict:
+    """
+    Worker entry point: convert ``source`` into the Markdown file ``output``
+    unless its content hash is still ``previous_hash``. Returns its manifest
+    fields.
+    """
+    from api.route.converter import converter_registry
+
+    started = time.perf_counter()
+    with open(source, "rb") as f:
+        content = f.read()
+    entry = {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content)}
+    if entry["sha256"] == previous_hash:
+        return {**entry, "status": "unchanged"}
+
+    filename = os.path.basename(source)
+    fmt, content_type = converter_registry.detect(
+        converter_registry.head(content), filename, mimetypes.guess_type(filename)[0]
+    )
+    options = options_for(fmt, pdf_tier)
+    timeout = timeout_for(fmt)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    entry.update(format=fmt, options=options)
+    try:
+        result, peak = budgeted_call(
+            CONVERSION_MEMORY_MB,
+            timed_call,
+            deadline,
+            run_converter,
+            fmt,
+            content,
+            filename,
+            content_type,
+            options,
+        )
+    except ConverterError as ce:
+        return {**entry, "status": "error", "error": f"{ce.status_code}: {ce.detail}"}
+    except ConversionTimeout:
+        return {**entry, "status": "timeout", "error": f"Took longer than {timeout:g} s"}
+    except Exception as e:
+        return {**entry, "status": "error", "error": str(e)}
+
+    data = result.markdown.encode("utf-8")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # Written aside and renamed, so an interrupted run leaves no torn output
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, output)
+    return {
+        **entry,
+        "status": "partial" if "partial" in result.metadata else "ok",
+        "markdown_bytes": len(data),
+        "seconds": round(time.perf_counter() - started, 4),
+        "peak_memory_bytes": peak,
+    }
+
+
+def scan(source: str, skip: str) -> Iterator[str]:
+    """Relative paths of the files under ``source``, without hidden files and ``skip``"""
+    for directory, dirs, files in os.walk(source):
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and os.path.abspath(os.path.join(directory, d)) != skip
+        )
+        for name in sorted(files):
+            if not name.startswith("."):
+                yield os.path.relpath(os.path.join(directory, name), source)
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    """The latest entry of each file; a line torn by an interruption is ignored"""
+    entries: Dict[str, Dict] = {}
+    try:
+        with open(path, encoding="utf-8") as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                    entries[entry["path"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def write_manifest(path: str, entries: Dict[str, Dict]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as manifest:
+        for name in sorted(entries):
+            manifest.write(json.dumps(entries[name], ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+
+
+class BatchRun:
+    """Schedules the files of one run on the worker pool and records their results"""
+
+    def __init__(self, args: argparse.Namespace):
+        from api.route.converter import CONVERTER_VERSION
+
+        self.args = args
+        self.version = CONVERTER_VERSION
+        self.manifest_path = os.path.join(args.output, MANIFEST_NAME)
+        self.entries = load_manifest(self.manifest_path)
+        self.results: List[Dict] = []
+        self.crashes: Dict[str, int] = {}
+        # A worker still busy this long after it got a file is stuck in native code
+        budgets = [CONVERSION_TIMEOUT, *parse_timeouts(CONVERSION_TIMEOUTS).values()]
+        self.stuck_after = (
+            max(budgets) + CONVERSION_KILL_GRACE if min(budgets) > 0 else None
+        )
+
+    def output_path(self, name: str) -> str:
+        return os.path.join(self.args.output, name + ".md")
+
+    def plan(self, name: str) -> Tuple[bool, Optional[str]]:
+        """Whether ``name`` must be read, and the hash it is unchanged at"""
+        entry = self.entries.get(name)
+        if self.args.force or entry is None or entry.get("version") != self.version:
+            return True, None
+        if entry.get("options", {}) != options_for(entry.get("format"), self.args.pdf_tier):
+            return True, None
+        if entry["status"] == "ok":
+            if not os.path.exists(self.output_path(name)):
+                return True, None
+        elif self.args.retry_failed or entry["status"] == "partial":
+            return True, None
+
+        stat = os.stat(os.path.join(self.args.source, name))
+        if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+            return False, None
+        return True, entry.get("sha256")
+
+    def record(self, manifest, name: str, fields: Dict) -> None:
+        try:
+            stat = os.stat(os.path.join(self.args.source, name))
+            mtime_ns = stat.st_mtime_ns
+            # Files that never got read are still skipped while they don't change
+            fields.setdefault("size", stat.st_size)
+        except FileNotFoundError:
+            mtime_ns = None
+        if fields["status"] == "unchanged":
+            # Same content, touched: keep what the last conversion recorded
+            entry = {**self.entries[name], "mtime_ns": mtime_ns}
+        else:
+            entry = {"path": name, **fields, "mtime_ns": mtime_ns, "version": self.version}
+            if fields["status"] not in ("error", "timeout"):
+                entry["output"] = name + ".md"
+        self.entries[name] = entry
+        manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        manifest.flush()
+        self.results.append({"path": name, **fields})
+
+        if fields["status"] != "unchanged":
+            mark = {"ok": "converted"}.get(fields["status"], fields["status"])
+            detail = fields.get("error") or f"{fields.get('seconds', 0) * 1000:.0f} ms"
+            print(f"{mark:<10} {fields.get('format', '?'):<8} {name} ({detail})", flush=True)
+
+    def run(self, names: List[str]) -> bool:
+        """Convert ``names``; returns False if the run was interrupted"""
+        todo = []
+        for name in names:
+            read, previous_hash = self.plan(name)
+            if read:
+                todo.append((name, previous_hash))
+        print(
+            f"{len(names)} files, {len(names) - len(todo)} unchanged, "
+            f"{len(todo)} to check with {self.args.workers} workers",
+            flush=True,
+        )
+        todo.reverse()  # Popped from the end, in order
+
+        os.makedirs(self.args.output, exist_ok=True)
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            try:
+                while todo:
+                    self._drain(manifest, todo)
+            except KeyboardInterrupt:
+                print("Interrupted; run again to resume", flush=True)
+                return False
+        # Compact the manifest to the files that still exist
+        present = set(names)
+        self.entries = {name: e for name, e in self.entries.items() if name in present}
+        write_manifest(self.manifest_path, self.entries)
+        return True
+
+    def _drain(self, manifest, todo: List[Tuple[str, Optional[str]]]) -> None:
+        """Run ``todo`` on a worker pool until it is done or the pool breaks"""
+        context = multiprocessing.get_context(ENGINE_START_METHOD)
+        # Killing the workers breaks the pool and fails its pending futures
+        pids = context.Array("i", self.args.workers)
+        pool = ProcessPoolExecutor(
+            self.args.workers,
+            mp_context=context,
+            initializer=start_worker,
+            initargs=(pids,),
+        )
+        # At most one file per worker, so a submitted file is a running one
+        running: Dict = {}
+        try:
+            # Start the workers first, so their warm-up doesn't count as stuck
+            wait([pool.submit(os.getpid) for _ in range(self.args.workers)])
+            while todo or running:
+                while todo and len(running) < self.args.workers:
+                    name, previous_hash = todo.pop()
+                    future = pool.submit(
+                        convert_file,
+                        os.path.join(self.args.source, name),
+                        self.output_path(name),
+                        previous_hash,
+                        self.args.pdf_tier,
+                    )
+                    running[future] = (name, previous_hash, time.monotonic())
+
+                done, _ = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        fields = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+                    except Exception as e:
+                        # The file couldn't be read
+                        fields = {"status": "error", "error": str(e)}
+                    self.record(manifest, running.pop(future)[0], fields)
+                if broken:
+                    self._recover(manifest, todo, running)
+                    return
+
+                if self.stuck_after is not None and any(
+                    time.monotonic() - submitted > self.stuck_after
+                    for _, _, submitted in running.values()
+                ):
+                    kill_workers(pids, "the batch pool")
+                    self._recover(manifest, todo, running)
+                    return
+        except KeyboardInterrupt:
+            kill_workers(pids, "the batch pool")
+            raise
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _recover(self, manifest, todo, running: Dict) -> None:
+        """
+        After the pool broke, fail the stuck files and queue the others again.
+        ProcessPoolExecutor doesn't tell which file a dead worker had, so each
+        file of a broken pool gets CRASH_RETRIES more tries.
+        """
+        now = time.monotonic()
+        for name, previous_hash, submitted in running.values():
+            if self.stuck_after is not None and now - submitted > self.stuck_after:
+                fields = {"status": "timeout", "error": "Worker was stuck and killed"}
+                self.record(manifest, name, fields)
+                continue
+            self.crashes[name] = self.crashes.get(name, 0) + 1
+            if self.crashes[name] > CRASH_RETRIES:
+                fields = {"status": "error", "error": "Worker process died"}
+                self.record(manifest, name, fields)
+            else:
+                todo.append((name, previous_hash))
+        running.clear()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def build_report(run: BatchRun, files: int, wall_seconds: float, finished: bool) -> Dict:
+    converted = [r for r in run.results if "seconds" in r]
+    formats: Dict[str, Dict] = {}
+    for fmt in sorted({r["format"] for r in converted}):
+        results = [r for r in converted if r["format"] == fmt]
+        times = [r["seconds"] * 1000 for r in results]
+        formats[fmt] = {
+            "files": len(results),
+            "total_ms": round(sum(times), 3),
+            "median_ms": round(statistics.median(times), 3),
+            "p95_ms": round(percentile(times, 0.95), 3),
+            "max_ms": round(max(times), 3),
+            "input_bytes": sum(r["size"] for r in results),
+            "markdown_bytes": sum(r["markdown_bytes"] for r in results),
+        }
+    statuses: Dict[str, int] = {}
+    for r in run.results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    input_bytes = sum(r["size"] for r in converted)
+    return {
+        "source": os.path.abspath(run.args.source),
+        "output": os.path.abspath(run.args.output),
+        "workers": run.args.workers,
+        "pdf_tier": run.args.pdf_tier,
+        "converter_version": run.version,
+        "finished": finished,
+        "files": files,
+        "skipped": files - len(run.results),
+        "statuses": statuses,
+        "wall_seconds": round(wall_seconds, 3),
+        "input_bytes": input_bytes,
+        "throughput_mb_s": round(input_bytes / wall_seconds / 1e6, 3) if wall_seconds else None,
+        "formats": formats,
+        "slowest": [
+            {"path": r["path"], "format": r["format"], "seconds": r["seconds"]}
+            for r in sorted(converted, key=lambda r: -r["seconds"])[:10]
+        ],
+        "failures": [
+            {"path": r["path"], "status": r["status"], "error": r.get("error")}
+            for r in run.results
+            if r["status"] in ("error", "timeout")
+        ],
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.batch_convert",
+        description="Convert a directory tree to Markdown",
+    )
+    parser.add_argument("source", help="directory of the files to convert")
+    parser.add_argument("output", help="directory for the Markdown, manifest and report")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--pdf-tier", default=PDF_TIER, choices=PDF_TIERS)
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="convert failed files again"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="convert every file, changed or not"
+    )
+    parser.add_argument("--report", help=f"timing report path (default: OUTPUT/{REPORT_NAME})")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.source):
+        parser.error(f"{args.source!r} is not a directory")
+    args.workers = max(1, args.workers)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    names = list(scan(args.source, os.path.abspath(args.output)))
+    run = BatchRun(args)
+    finished = run.run(names)
+    report = build_report(run, len(names), time.perf_counter() - started, finished)
+
+    report_path = args.report or os.path.join(args.output, REPORT_NAME)
+    with open(report_path, "w") as output:
+        json.dump(report, output, indent=2)
+    counts = [f"{count} {status}" for status, count in sorted(report["statuses"].items())]
+    counts.append(f"{report['skipped']} skipped")
+    print(f"{report['files']} files in {report['wall_seconds']:.1f} s: {', '.join(counts)}")
+    for fmt, stats in report["formats"].items():
+        print(
+            f"  {fmt:<8} {stats['files']:>6} files {stats['median_ms']:>10.1f} ms median "
+            f"{stats['p95_ms']:>10.1f} ms p95"
+        )
+    print(f"Report written to {report_path}")
+    if not finished:
+        return 130
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,33 @@
 import os
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# The connection is opened by the first request that needs it, not at import
+_database = None
+_database_lock = threading.Lock()
+
 
 def get_database():
     """
-    Connects to MongoDB using the URI provided in the .env file.
-    Returns the database object if the connection is successful.
+    Connects to MongoDB using the URI provided in the .env file on first use.
+    Returns the (shared) database object if the connection is successful.
     """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = connect_database()
+    return _database
+
+
+def connect_database():
+    """Open a new MongoDB connection and check it with a ping"""
+    # pymongo is only imported once a route actually needs the database
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
     # Fetch MongoDB URI from environment variables
     db_uri = os.getenv("MONGODB_URI")
 
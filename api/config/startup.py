@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import asyncio
+import importlib
+import threading
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+# Imported first by api/index.py, so this is (close to) the process boot time
+BOOT_STARTED = time.perf_counter()
+
+# Warm-up after startup (overridable through the environment / .env file):
+# "background" loads libraries and starts worker pools without delaying the
+# first request, "blocking" finishes that before serving and "off" leaves
+# everything to the first conversion that needs it.
+WARM_UP = os.getenv("FRIDA_WARM_UP", "background")
+
+# Module -> import time in milliseconds
+IMPORT_TIMES: Dict[str, float] = {}
+_import_lock = threading.RLock()
+
+startup_state = {
+    "readyMs": None,
+    "warmUp": WARM_UP,
+    "warmUpStatus": "pending" if WARM_UP != "off" else "off",
+    "warmUpMs": None,
+}
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def timed_import(name: str) -> ModuleType:
+    """
+    Import a module, recording how long the import took. Modules that are
+    already loaded are returned as they are, so only the cost that wasn't
+    paid by an earlier import is recorded.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _import_lock:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        IMPORT_TIMES.setdefault(name, _elapsed_ms(started))
+    return module
+
+
+def mark_ready() -> None:
+    startup_state["readyMs"] = _elapsed_ms(BOOT_STARTED)
+
+
+async def warm_up(hook: Callable[[], None]) -> Optional[asyncio.Task]:
+    """
+    Run the blocking warm-up ``hook`` on a thread according to WARM_UP.
+    Returns the background task, if one was started.
+    """
+    if WARM_UP == "off":
+        return None
+
+    async def run():
+        started = time.perf_counter()
+        startup_state["warmUpStatus"] = "running"
+        try:
+            await asyncio.to_thread(hook)
+            startup_state["warmUpStatus"] = "done"
+        except Exception as e:
+            startup_state["warmUpStatus"] = "failed"
+            print(f"Warm-up failed: {e}")
+        startup_state["warmUpMs"] = _elapsed_ms(started)
+        print(f"Warm-up {startup_state['warmUpStatus']} in {startup_state['warmUpMs']} ms")
+
+    if WARM_UP == "blocking":
+        await run()
+        return None
+    return asyncio.create_task(run())
+
+
+def startup_report() -> Dict:
+    """Boot timings and the import cost of each tracked module, slowest first"""
+    return {
+        **startup_state,
+        "uptimeMs": _elapsed_ms(BOOT_STARTED),
+        "imports": dict(sorted(IMPORT_TIMES.items(), key=lambda item: -item[1])),
+    }
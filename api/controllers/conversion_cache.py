@@ -0,0 +1,239 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from api.controllers.disk_lru import DiskLRU
+
+
+# Cache configuration (overridable through the environment / .env file)
+CACHE_ENABLED = os.getenv("FRIDA_CACHE_ENABLED", "1") == "1"
+CACHE_MEMORY_ENTRIES = int(os.getenv("FRIDA_CACHE_MEMORY_ENTRIES", "256"))
+CACHE_MEMORY_BYTES = int(os.getenv("FRIDA_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+CACHE_DISK_BYTES = int(os.getenv("FRIDA_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+CACHE_DIR = os.getenv(
+    "FRIDA_CACHE_DIR",
+    str(Path(__file__).resolve().parents[2] / "tmp" / "markdown" / "cache"),
+)
+
+
+def make_cache_key(
+    content: bytes,
+    fmt: str,
+    version: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+    options: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Build a content-addressed cache key.
+
+    The converters also print the filename and content type into their
+    output, so those are part of the key alongside the content hash, the
+    converter version and the converter options.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    variant = f"{fmt}\0{version}\0{filename}\0{content_type}"
+    for name, value in sorted((options or {}).items()):
+        variant += f"\0{name}={value}"
+    variant = hashlib.sha256(variant.encode("utf-8")).hexdigest()
+    return f"{digest}-{variant[:16]}"
+
+
+class RetryConversion(Exception):
+    """
+    Set on an in-flight conversion whose request was cancelled (e.g. the
+    client went away), so the requests sharing it convert again instead of
+    being cancelled too.
+    """
+
+
+class ConversionCache:
+    """
+    Two-tier cache for conversion results with in-flight request coalescing.
+
+    The memory tier is an LRU bounded by entry count and markdown bytes; the
+    disk tier stores results as JSON files and evicts the least recently used
+    files once ``disk_bytes`` is exceeded. Concurrent misses for the same key
+    share one conversion.
+    """
+
+    def __init__(
+        self,
+        result_type,
+        enabled: bool = CACHE_ENABLED,
+        memory_entries: int = CACHE_MEMORY_ENTRIES,
+        memory_bytes: int = CACHE_MEMORY_BYTES,
+        disk_bytes: int = CACHE_DISK_BYTES,
+        directory: str = CACHE_DIR,
+    ):
+        self.result_type = result_type
+        self.enabled = enabled
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = Path(directory)
+        self.disk = DiskLRU(self.directory, "*/*.json", disk_bytes)
+
+        self._memory: "OrderedDict[str, BaseModel]" = OrderedDict()
+        self._memory_size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+    # Memory tier
+    @staticmethod
+    def _weight(result) -> int:
+        return len(result.markdown) + len(result.preview or "")
+
+    def _memory_get(self, key: str):
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+        return result
+
+    def _memory_put(self, key: str, result) -> None:
+        weight = self._weight(result)
+        if weight > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= self._weight(self._memory.pop(key))
+        self._memory[key] = result
+        self._memory_size += weight
+        while self._memory and (
+            len(self._memory) > self.memory_entries
+            or self._memory_size > self.memory_bytes
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= self._weight(evicted)
+            self.counters["memory_evictions"] += 1
+
+    # Disk tier (blocking, always called through a thread)
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str):
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            self.disk.touch(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            return None
+        return self.result_type.model_validate_json(data)
+
+    def _disk_put(self, key: str, result) -> None:
+        data = result.model_dump_json().encode("utf-8")
+        if len(data) > self.disk_bytes:
+            return
+        self.counters["disk_evictions"] += self.disk.write(self._path(key), data)
+
+    async def get(self, key: str):
+        result = self._memory_get(key)
+        if result is not None:
+            self.counters["memory_hits"] += 1
+            return result
+        try:
+            result = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            self.counters["disk_errors"] += 1
+            print(f"Conversion cache read failed for {key}: {e}")
+            return None
+        if result is not None:
+            self.counters["disk_hits"] += 1
+            self._memory_put(key, result)
+        return result
+
+    async def put(self, key: str, result) -> None:
+        self._memory_put(key, result)
+        try:
+            await asyncio.to_thread(self._disk_put, key, result)
+        except Exception as e:
+            self.counters["disk_errors"] += 1
+            print(f"Conversion cache write failed for {key}: {e}")
+
+    async def get_or_convert(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        Return a cached result, join an identical in-flight conversion or run
+        ``producer``. Its result is only cached if ``cacheable`` (if given)
+        accepts it.
+        """
+        if not self.enabled:
+            return await producer()
+
+        while True:
+            result = await self.get(key)
+            if result is not None:
+                return self._copy(result)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.counters["coalesced"] += 1
+            try:
+                return self._copy(await asyncio.shield(inflight))
+            except RetryConversion:
+                # The request running it went away; the first waiter takes over
+                continue
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await producer()
+        except asyncio.CancelledError:
+            # Only this request was cancelled, not the conversion's waiters
+            future.set_exception(RetryConversion())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        future.set_result(result)
+        if cacheable is None or cacheable(result):
+            await self.put(key, result)
+        return self._copy(result)
+
+    @staticmethod
+    def _copy(result):
+        # Callers may add to the metadata; keep the cached entry untouched
+        return result.model_copy(update={"metadata": dict(result.metadata)})
+
+    def stats(self) -> Dict:
+        lookups = (
+            self.counters["memory_hits"]
+            + self.counters["disk_hits"]
+            + self.counters["misses"]
+        )
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return {
+            "enabled": self.enabled,
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "memory_limit_bytes": self.memory_bytes,
+            "disk_bytes": self.disk.size,
+            "disk_limit_bytes": self.disk_bytes,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,715 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from api.controllers.markdown_writer import normalize_seconds
+from api.controllers.profiler import active_profile, profiled_call
+from api.controllers.resource_limits import (
+    CONVERSION_KILL_GRACE,
+    CONVERSION_MEMORY_MB,
+    ConversionTimeout,
+    caused_by,
+    conversion_deadline,
+    conversion_memory,
+    memory_status,
+    reset_peak_rss,
+    time_limit,
+    timeout_for,
+)
+
+
+# Engine configuration (overridable through the environment / .env file)
+# "process" runs converters in worker processes, "thread" in a thread pool
+# (for hosts without multiprocessing support) and "inline" calls them directly.
+ENGINE_MODE = os.getenv("FRIDA_ENGINE_MODE", "process")
+ENGINE_WORKERS = int(os.getenv("FRIDA_ENGINE_WORKERS", str(os.cpu_count() or 2)))
+ENGINE_QUEUE_SIZE = int(os.getenv("FRIDA_ENGINE_QUEUE_SIZE", str(ENGINE_WORKERS * 4)))
+ENGINE_START_METHOD = os.getenv("FRIDA_ENGINE_START_METHOD", "spawn")
+# Formats with their own pool so they can't starve the others, e.g. "pdf=2,xlsx=1"
+ENGINE_LANES = os.getenv("FRIDA_ENGINE_LANES", "pdf=2")
+# Formats that are cheap enough to skip the process hop and run on a thread
+ENGINE_THREAD_FORMATS = os.getenv("FRIDA_ENGINE_THREAD_FORMATS", "txt")
+# Frames a streaming producer may run ahead of a slow client
+ENGINE_STREAM_BUFFER = int(os.getenv("FRIDA_ENGINE_STREAM_BUFFER", "8"))
+
+_STREAM_DONE = object()
+
+
+class ConverterError(Exception):
+    """Picklable stand-in for an HTTPException raised inside a worker process"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def run_converter(
+    fmt: str,
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    options: Optional[Dict[str, str]] = None,
+):
+    """
+    Worker entry point: look up the synchronous converter and run it. The
+    result's ``_stages`` get the time spent parsing and normalizing text.
+    """
+    from api.route.converter import converter_registry
+
+    try:
+        started = time.perf_counter()
+        normalized = normalize_seconds()
+        result = converter_registry.get(fmt)(
+            content, filename, content_type, **(options or {})
+        )
+        normalize = normalize_seconds() - normalized
+        result._stages = {
+            "parse": time.perf_counter() - started - normalize,
+            "normalize": normalize,
+        }
+        return result
+    except HTTPException as he:
+        raise ConverterError(he.status_code, he.detail)
+
+
+def budgeted_call(budget_mb: int, fn: Callable, *args) -> Tuple[object, Optional[int]]:
+    """
+    Run ``fn(*args)`` with at most ``budget_mb`` more address space (0: no
+    limit) and return its result with how much the peak resident memory
+    grew, in bytes. Only worker processes on Linux are limited and measured;
+    elsewhere the limit would apply to the whole server, so ``fn`` just runs
+    and the peak is None.
+    """
+    if multiprocessing.parent_process() is None or not reset_peak_rss():
+        return fn(*args), None
+
+    import resource
+
+    baseline = memory_status("VmRSS") or 0
+    limits = None
+    if budget_mb > 0:
+        limits = resource.getrlimit(resource.RLIMIT_AS)
+        limit = (memory_status("VmSize") or 0) + budget_mb * 1024 * 1024
+        if limits[1] != resource.RLIM_INFINITY:
+            limit = min(limit, limits[1])
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limits[1]))
+    try:
+        result = fn(*args)
+    except Exception as e:
+        # Converters wrap errors in HTTPExceptions, so look for the cause
+        if caused_by(e, MemoryError):
+            raise ConverterError(
+                413, f"Conversion needs more than the {budget_mb} MB of memory allowed"
+            )
+        raise
+    finally:
+        if limits is not None:
+            resource.setrlimit(resource.RLIMIT_AS, limits)
+    return result, max(0, (memory_status("VmHWM") or 0) - baseline)
+
+
+def timed_call(deadline: Optional[float], fn: Callable, *args):
+    """
+    Run ``fn(*args)`` until the time.monotonic() ``deadline`` (see
+    time_limit). Converters wrap errors in HTTPExceptions, so one raised by
+    the timeout becomes a ConversionTimeout again.
+    """
+    try:
+        with time_limit(deadline):
+            return fn(*args)
+    except ConversionTimeout:
+        raise
+    except Exception as e:
+        if caused_by(e, ConversionTimeout):
+            raise ConversionTimeout("Conversion ran out of time")
+        raise
+
+
+def _warm_worker() -> int:
+    """Import the converter module and its libraries ahead of the first request"""
+    from api.route.converter import converter_registry
+
+    converter_registry.load_libraries()
+    return os.getpid()
+
+
+def record_pid(slots) -> None:
+    """
+    Worker initializer: note the worker's pid in the first free slot of the
+    shared array ``slots``, so the parent can kill it without reaching into
+    the executor.
+    """
+    with slots.get_lock():
+        for index, pid in enumerate(slots):
+            if not pid:
+                slots[index] = os.getpid()
+                return
+
+
+def kill_workers(slots, owner: str) -> int:
+    """Terminate the workers noted in ``slots``; returns how many were signalled"""
+    killed = 0
+    for pid in slots[:]:
+        if not pid:
+            continue
+        try:
+            os.kill(pid, signal.SIGTERM)
+            killed += 1
+        except ProcessLookupError:
+            pass
+    if not killed:
+        print(f"No worker process of {owner} was found to kill")
+    return killed
+
+
+def send_items(conn, fn: Callable[..., Iterator], *args) -> int:
+    """
+    Worker entry point of streamed conversions: send the items of the
+    generator ``fn(*args)`` through the pipe ``conn``. Returns their count.
+    """
+    count = 0
+    try:
+        for item in fn(*args):
+            conn.send(item)
+            count += 1
+    except HTTPException as he:
+        raise ConverterError(he.status_code, he.detail)
+    finally:
+        conn.close()
+    return count
+
+
+def timeout_error(fmt: str) -> HTTPException:
+    budget = timeout_for(fmt)
+    return HTTPException(
+        status_code=504,
+        detail=f"Conversion took longer than the {budget:g} s allowed"
+        if budget
+        else "Conversion ran out of time",
+    )
+
+
+def _set_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def parse_lanes(spec: str) -> Dict[str, int]:
+    """Parse a "fmt=workers,fmt=workers" lane specification"""
+    lanes = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        fmt, workers = item.split("=", 1)
+        if fmt.strip() and int(workers) > 0:
+            lanes[fmt.strip()] = int(workers)
+    return lanes
+
+
+class ConversionLane:
+    """
+    A bounded number of queued and running conversions on ``workers``
+    single-worker executors. An executor only gets a task while it is idle,
+    so a task that runs past its time budget is stopped by killing its own
+    worker process: ProcessPoolExecutor fails every task of the pool once
+    one of its workers dies, which would take the lane's other conversions
+    down with it.
+    """
+
+    def __init__(self, name: str, mode: str, workers: int, queue_size: int):
+        self.name = name
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.killed = 0
+        self._executors: List[Executor] = []
+        self._idle: List[Executor] = []
+        # Pid of the worker process of each process executor
+        self._pids: Dict[Executor, object] = {}
+        # Conversions waiting for an idle executor, with their event loop
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        # start() may run on a warm-up thread while a request needs the lane
+        self._lock = threading.Lock()
+
+    def _new_executor(self) -> Executor:
+        if self.mode == "process":
+            context = multiprocessing.get_context(ENGINE_START_METHOD)
+            pids = context.Array("i", 1)
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=record_pid,
+                initargs=(pids,),
+            )
+            self._pids[executor] = pids
+            return executor
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"convert-{self.name}")
+
+    def start(self, warm: bool = True) -> None:
+        """
+        Create the executors. With ``warm``, also start every worker process
+        and load the converter libraries in it before returning; otherwise
+        workers are started by the first conversions.
+        """
+        with self._lock:
+            if self._executors or self.mode == "inline":
+                return
+            if self.mode == "process":
+                try:
+                    self._executors = [self._new_executor() for _ in range(self.workers)]
+                except (OSError, NotImplementedError) as e:
+                    self._use_threads(e)
+            else:
+                self._use_threads()
+            self._idle = list(self._executors)
+            executors = self._executors
+        self._wake()
+
+        if warm and self.mode == "process":
+            try:
+                # Start every worker now so the first upload doesn't pay for it
+                futures = [executor.submit(_warm_worker) for executor in executors]
+                wait_futures(futures)
+                for future in futures:
+                    future.result()
+            except (OSError, BrokenProcessPool) as e:
+                with self._lock:
+                    if self._executors is not executors:
+                        return
+                    for executor in executors:
+                        self._pids.pop(executor, None)
+                        executor.shutdown(wait=False, cancel_futures=True)
+                    self._use_threads(e)
+                    self._idle = list(self._executors)
+                self._wake()
+
+    def _use_threads(self, error: Optional[Exception] = None) -> None:
+        if error is not None:
+            print(f"Process pool unavailable for lane '{self.name}', using threads: {error}")
+        self.mode = "thread"
+        self._executors = [self._new_executor() for _ in range(self.workers)]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors, self._executors, self._idle = self._executors, [], []
+            self._pids = {}
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _acquire(self) -> Executor:
+        """Wait for an idle executor of the lane"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self.start(warm=False)
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop()
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    woken = (loop, waiter) not in self._waiters
+                    if not woken:
+                        self._waiters.remove((loop, waiter))
+                if woken:
+                    # Pass the executor this waiter was woken for on
+                    self._wake()
+                raise
+
+    def _wake(self) -> None:
+        with self._lock:
+            count = min(len(self._idle), len(self._waiters))
+            waiters = [self._waiters.popleft() for _ in range(count)]
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_set_waiter, waiter)
+
+    def _release(self, executor: Executor, broken: bool = False) -> None:
+        """
+        Make ``executor`` idle again, or replace it with a new one if its
+        worker died. An executor the lane no longer has (after a shutdown or
+        a fallback to threads) is shut down instead.
+        """
+        retired = None
+        with self._lock:
+            if executor not in self._executors:
+                retired = executor
+            else:
+                if broken:
+                    retired = executor
+                    executor = self._new_executor()
+                    self._executors[self._executors.index(retired)] = executor
+                self._idle.append(executor)
+        if retired is not None:
+            self._pids.pop(retired, None)
+            retired.shutdown(wait=False, cancel_futures=True)
+        self._wake()
+
+    def _release_after(self, executor: Executor, future, broken: bool = False) -> None:
+        """
+        Release ``executor`` once its task ``future`` is done. An abandoned
+        task (timed out on a thread, or the request went away) keeps it busy
+        until it returns.
+        """
+        if future is None or future.done() or broken:
+            self._release(executor, broken)
+        else:
+            future.cancel()
+            future.add_done_callback(lambda _: self._release(executor))
+
+    def kill(self, executor: Executor) -> None:
+        """
+        Terminate the worker process of ``executor``, e.g. one stuck in
+        native code past its time budget. Only the task it runs fails; the
+        executor is replaced once the task is released.
+        """
+        self.killed += 1
+        pids = self._pids.get(executor)
+        if pids is None:
+            print(f"No worker process of lane '{self.name}' was found to kill")
+            return
+        kill_workers(pids, f"lane '{self.name}'")
+
+    async def run(self, fn, *args, timeout: Optional[float] = None):
+        """
+        Run ``fn(*args)`` in the lane. Past ``timeout`` seconds the task is
+        abandoned with a ConversionTimeout; a process lane also kills its
+        worker so the task doesn't hold one. Tasks are expected to stop by
+        themselves before that (see time_limit), so this is the backstop.
+        """
+        if self.mode == "inline":
+            return fn(*args)
+
+        # The counter is only touched from the event loop, so no lock is needed
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Conversion queue '{self.name}' is full, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        started = time.monotonic()
+        executor = future = None
+        broken = False
+        self.pending += 1
+        try:
+            try:
+                executor = await asyncio.wait_for(self._acquire(), timeout)
+            except asyncio.TimeoutError:
+                # A task that never started just leaves the queue
+                raise ConversionTimeout("Conversion ran out of time")
+            future = executor.submit(fn, *args)
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - started))
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                # A thread can't be stopped; it is released once it returns
+                if self.mode == "process":
+                    self.kill(executor)
+                    broken = True
+                raise ConversionTimeout("Conversion ran out of time")
+        except BrokenProcessPool:
+            # The worker died (e.g. killed by the OOM killer); replace it
+            broken = True
+            raise HTTPException(
+                status_code=500, detail="Conversion worker crashed, please retry"
+            )
+        finally:
+            if executor is not None:
+                self._release_after(executor, future, broken)
+            self.pending -= 1
+            self.completed += 1
+
+    async def iterate(
+        self,
+        fn: Callable[..., Iterator],
+        *args,
+        deadline: Optional[float] = None,
+        budget_mb: int = 0,
+        buffer: int = ENGINE_STREAM_BUFFER,
+    ) -> AsyncIterator:
+        """
+        Drive the generator ``fn(*args)`` on a worker and yield its items as
+        they are produced, until the time.monotonic() ``deadline`` (see
+        time_limit). A worker process sends them through a pipe, under the
+        ``budget_mb`` memory budget, and is killed if it is still busy
+        CONVERSION_KILL_GRACE seconds past the deadline; a worker thread
+        holds at most ``buffer`` items and is abandoned then. Either stops as
+        soon as the consumer goes away.
+        """
+        if self.mode == "inline":
+            for item in fn(*args):
+                yield item
+            return
+
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Conversion queue '{self.name}' is full, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            executor = await self._acquire()
+            if self.mode == "process":
+                items = self._iterate_process(executor, fn, args, deadline, budget_mb)
+            else:
+                items = self._iterate_thread(executor, fn, args, deadline, buffer)
+            try:
+                async for item in items:
+                    yield item
+            finally:
+                await items.aclose()
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def _iterate_process(
+        self, executor: Executor, fn, args, deadline: Optional[float], budget_mb: int
+    ) -> AsyncIterator:
+        reader, writer = multiprocessing.get_context(ENGINE_START_METHOD).Pipe(duplex=False)
+        future = None
+        broken = False
+        try:
+            future = executor.submit(
+                budgeted_call, budget_mb, timed_call, deadline, send_items, writer, fn, *args
+            )
+            while True:
+                if await asyncio.to_thread(reader.poll, 0.25):
+                    try:
+                        item = await asyncio.to_thread(reader.recv)
+                    except EOFError:
+                        break
+                    yield item
+                elif future.done():
+                    # Everything sent is in the pipe; closing our end of it
+                    # (only safe once the task was handed over) ends it
+                    writer.close()
+                elif deadline is not None and (
+                    time.monotonic() > deadline + CONVERSION_KILL_GRACE
+                ):
+                    self.kill(executor)
+                    broken = True
+                    raise ConversionTimeout("Conversion ran out of time")
+            future.result()
+        except BrokenProcessPool:
+            broken = True
+            raise HTTPException(
+                status_code=500, detail="Conversion worker crashed, please retry"
+            )
+        finally:
+            # A worker still sending gets a broken pipe and stops
+            reader.close()
+            writer.close()
+            self._release_after(executor, future, broken)
+
+    async def _iterate_thread(
+        self, executor: Executor, fn, args, deadline: Optional[float], buffer: int
+    ) -> AsyncIterator:
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(max(1, buffer))
+        stop = threading.Event()
+
+        def produce():
+            try:
+                # Threads aren't interrupted; the generator calls check_deadline()
+                with time_limit(deadline):
+                    for item in fn(*args):
+                        while not slots.acquire(timeout=0.5):
+                            if stop.is_set():
+                                return
+                        if stop.is_set():
+                            return
+                        loop.call_soon_threadsafe(items.put_nowait, item)
+            except BaseException as e:
+                loop.call_soon_threadsafe(items.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, _STREAM_DONE)
+
+        future = executor.submit(produce)
+        try:
+            while True:
+                if deadline is None:
+                    item = await items.get()
+                else:
+                    # Give up on a producer that doesn't check the deadline
+                    left = deadline + CONVERSION_KILL_GRACE - time.monotonic()
+                    try:
+                        item = await asyncio.wait_for(items.get(), max(0.0, left))
+                    except asyncio.TimeoutError:
+                        raise ConversionTimeout("Conversion ran out of time")
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            stop.set()
+            self._release_after(executor, future)
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "killed": self.killed,
+        }
+
+
+class ConversionEngine:
+    """
+    Routes conversions to executor lanes by format so the event loop only
+    awaits results. Formats listed in ``lanes`` get a dedicated process pool,
+    ``thread_formats`` run on a thread pool and everything else shares the
+    default process pool.
+    """
+
+    def __init__(
+        self,
+        mode: str = ENGINE_MODE,
+        workers: int = ENGINE_WORKERS,
+        queue_size: int = ENGINE_QUEUE_SIZE,
+        lanes: str = ENGINE_LANES,
+        thread_formats: str = ENGINE_THREAD_FORMATS,
+    ):
+        self.mode = mode
+        self.lanes: Dict[str, ConversionLane] = {
+            "default": ConversionLane("default", mode, workers, queue_size)
+        }
+        self.routes: Dict[str, str] = {}
+
+        for fmt, lane_workers in parse_lanes(lanes).items():
+            self.lanes[fmt] = ConversionLane(fmt, mode, lane_workers, queue_size)
+            self.routes[fmt] = fmt
+
+        thread_mode = "inline" if mode == "inline" else "thread"
+        self.lanes["thread"] = ConversionLane("thread", thread_mode, workers, queue_size)
+        for fmt in thread_formats.split(","):
+            if fmt.strip():
+                self.routes[fmt.strip()] = "thread"
+
+    def lane_for(self, fmt: str) -> ConversionLane:
+        return self.lanes[self.routes.get(fmt, "default")]
+
+    def start(self) -> None:
+        """Create the pools and pre-warm their workers (blocking)"""
+        for lane in self.lanes.values():
+            lane.start()
+
+    def shutdown(self) -> None:
+        for lane in self.lanes.values():
+            lane.shutdown()
+
+    async def run(
+        self,
+        fmt: str,
+        content: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        options: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Run the converter for ``fmt`` on raw bytes in its lane; ``options``
+        are passed to the converter as keyword arguments. The time not spent
+        in the converter (waiting for a worker, pickling) is added to the
+        result's ``_stages`` as "queue".
+        """
+        started = time.perf_counter()
+        result = await self.submit(
+            fmt, run_converter, fmt, content, filename, content_type, options
+        )
+        result._stages["queue"] = max(
+            0.0, time.perf_counter() - started - sum(result._stages.values())
+        )
+        return result
+
+    async def submit(self, fmt: str, fn: Callable, *args):
+        """
+        Run the picklable top-level function ``fn(*args)`` in the lane for
+        ``fmt`` under the memory budget and within the time left to the
+        request's ``conversion_deadline`` (or the format's timeout); its peak
+        memory is added to the request's ``conversion_memory``. In a profiled
+        request its stacks are sampled where it runs.
+        """
+        deadline = conversion_deadline.get()
+        if deadline is None and timeout_for(fmt) is not None:
+            deadline = time.monotonic() + timeout_for(fmt)
+        # The task stops itself at the deadline; the lane kills it a bit later
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic()) + CONVERSION_KILL_GRACE
+        try:
+            profile = active_profile.get()
+            task = (fn,) if profile is None else (profiled_call, fn)
+            result, peak = await self.lane_for(fmt).run(
+                budgeted_call,
+                CONVERSION_MEMORY_MB,
+                timed_call,
+                deadline,
+                *task,
+                *args,
+                timeout=timeout,
+            )
+            if profile is not None:
+                result, stacks = result
+                profile.add(stacks)
+            usage = conversion_memory.get()
+            if usage is not None:
+                usage.add(peak)
+            return result
+        except ConverterError as ce:
+            raise HTTPException(status_code=ce.status_code, detail=ce.detail)
+        except ConversionTimeout:
+            raise timeout_error(fmt)
+
+    async def stream(self, fmt: str, fn: Callable[..., Iterator], *args) -> AsyncIterator:
+        """
+        Stream the items of the generator ``fn(*args)`` from the lane for
+        ``fmt``, under the memory and time budgets of submit(). In a process
+        lane the arguments and items must be picklable.
+        """
+        deadline = conversion_deadline.get()
+        if deadline is None and timeout_for(fmt) is not None:
+            deadline = time.monotonic() + timeout_for(fmt)
+        items = self.lane_for(fmt).iterate(
+            fn, *args, deadline=deadline, budget_mb=CONVERSION_MEMORY_MB
+        )
+        try:
+            async for item in items:
+                yield item
+        except ConverterError as ce:
+            raise HTTPException(status_code=ce.status_code, detail=ce.detail)
+        except ConversionTimeout:
+            raise timeout_error(fmt)
+        finally:
+            await items.aclose()
+
+    def stats(self) -> Dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+conversion_engine = ConversionEngine()
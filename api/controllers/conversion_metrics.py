@@ -0,0 +1,230 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Histogram buckets (upper bounds)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4**power for power in range(10))  # 1 KB to 256 MB
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10_000, 100_000, 1_000_000)
+
+# Server-Timing stages in the order they happen in a request
+STAGES = ["read", "cache", "queue", "parse", "normalize", "style", "serialize", "compress"]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    A Prometheus histogram. Observations only bump one bucket count and the
+    sum; the cumulative bucket counts are worked out when rendering.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Iterable[float],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Label values -> [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label_text = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class ConversionMetrics:
+    """
+    Per-format conversion metrics in the Prometheus text format. They are
+    only updated from the event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.duration = Histogram(
+            "frida_conversion_duration_seconds",
+            "Time to convert a file, cache hits included.",
+            ["format"],
+            SECONDS_BUCKETS,
+        )
+        self.input_bytes = Histogram(
+            "frida_conversion_input_bytes",
+            "Size of the converted files.",
+            ["format"],
+            BYTES_BUCKETS,
+        )
+        self.output_bytes = Histogram(
+            "frida_conversion_output_bytes",
+            "Size of the markdown produced, in UTF-8 bytes.",
+            ["format"],
+            BYTES_BUCKETS,
+        )
+        self.pages = Histogram(
+            "frida_conversion_pages",
+            "Pages of the converted PDFs.",
+            ["format"],
+            COUNT_BUCKETS,
+        )
+        self.rows = Histogram(
+            "frida_conversion_rows",
+            "Rows of the converted tables and spreadsheets.",
+            ["format"],
+            COUNT_BUCKETS,
+        )
+        self.peak_memory = Histogram(
+            "frida_conversion_peak_memory_bytes",
+            "Growth of the worker's resident memory while converting a file.",
+            ["format"],
+            BYTES_BUCKETS,
+        )
+        self.errors = Counter(
+            "frida_conversion_errors_total",
+            "Failed conversions by HTTP status.",
+            ["format", "status"],
+        )
+        self.fallbacks = Counter(
+            "frida_conversion_fallbacks_total",
+            "Files converted by the fallback converter for unsupported formats.",
+        )
+        self.partials = Counter(
+            "frida_conversion_partial_total",
+            "Conversions that ran out of time and returned the pages done so far.",
+            ["format"],
+        )
+
+    def observe(
+        self,
+        fmt: str,
+        seconds: float,
+        input_bytes: int,
+        markdown: str,
+        metadata: Dict,
+        peak_memory: Optional[int] = None,
+    ) -> None:
+        labels = (fmt,)
+        self.duration.observe(labels, seconds)
+        self.input_bytes.observe(labels, input_bytes)
+        # isascii() is O(1) on str, so only non-ASCII output is encoded
+        output = len(markdown) if markdown.isascii() else len(markdown.encode("utf-8"))
+        self.output_bytes.observe(labels, output)
+
+        pages = metadata.get("page_count")
+        if isinstance(pages, int):
+            self.pages.observe(labels, pages)
+        rows = metadata.get("rows")
+        if not isinstance(rows, int) and isinstance(metadata.get("sheets"), list):
+            rows = sum(sheet.get("rows", 0) for sheet in metadata["sheets"])
+        if isinstance(rows, int):
+            self.rows.observe(labels, rows)
+        # Only conversions run in a worker process are measured, not cache hits
+        if peak_memory is not None:
+            self.peak_memory.observe(labels, peak_memory)
+
+    def error(self, fmt: str, status_code: int) -> None:
+        self.errors.inc((fmt, str(status_code)))
+
+    def fallback(self) -> None:
+        self.fallbacks.inc()
+
+    def partial(self, fmt: str) -> None:
+        self.partials.inc((fmt,))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (
+            self.duration,
+            self.input_bytes,
+            self.output_bytes,
+            self.pages,
+            self.rows,
+            self.peak_memory,
+            self.errors,
+            self.fallbacks,
+            self.partials,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ServerTiming:
+    """Durations of the stages of one request, sent as a Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def since(self, stage: str, started: float) -> float:
+        """Add the time from ``started`` until now to ``stage``; returns now"""
+        now = time.perf_counter()
+        self.add(stage, now - started)
+        return now
+
+    def header(self) -> str:
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        entries = [
+            f"{stage};dur={self.stages[stage] * 1000:.2f}"
+            for stage in sorted(self.stages, key=lambda name: order.get(name, len(order)))
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+conversion_metrics = ConversionMetrics()
@@ -0,0 +1,159 @@
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from api.config.startup import timed_import
+
+
+# Bytes read from the start of an upload to sniff its format (overridable
+# through the environment / .env file)
+SNIFF_BYTES = int(os.getenv("FRIDA_SNIFF_BYTES", "4096"))
+
+# A sniffer gets the first SNIFF_BYTES of an upload and returns the MIME type
+# it recognises, or None
+Sniffer = Callable[[bytes], Optional[str]]
+TextSniffer = Callable[[str], Optional[str]]
+
+
+def match_prefix(prefixes: Dict[bytes, str]) -> Sniffer:
+    """Build a sniffer that recognises content by its leading magic bytes"""
+
+    def sniff(head: bytes) -> Optional[str]:
+        for prefix, mime in prefixes.items():
+            if head.startswith(prefix):
+                return mime
+        return None
+
+    return sniff
+
+
+class ConverterSpec:
+    """A registered converter with the MIME types, extensions and sniffers it claims"""
+
+    def __init__(
+        self,
+        name: str,
+        converter: Callable,
+        mime_types: Dict[str, str],
+        extensions: Iterable[str],
+        sniff: Optional[Sniffer],
+        sniff_text: Optional[TextSniffer],
+        libraries: Iterable[str],
+    ):
+        self.name = name
+        self.converter = converter
+        self.mime_types = mime_types
+        self.extensions = [ext.lower().lstrip(".") for ext in extensions]
+        self.sniff = sniff
+        self.sniff_text = sniff_text
+        self.libraries = list(libraries)
+
+    @property
+    def default_content_type(self) -> Optional[str]:
+        return next(iter(self.mime_types), None)
+
+
+class ConverterRegistry:
+    """
+    Converters by format key, with the rules that pick one for an upload.
+
+    Detection only ever looks at the first ``sniff_bytes`` of the content:
+    binary magic bytes win over the declared MIME type (clients label PDFs
+    ``application/octet-stream`` or worse), then the declared type, then the
+    file extension, then text signatures such as a leading ``<?xml``. The
+    format named ``fallback`` converts whatever is left.
+    """
+
+    def __init__(self, fallback: str = "unknown", sniff_bytes: int = SNIFF_BYTES):
+        self.fallback = fallback
+        self.sniff_bytes = sniff_bytes
+        self._specs: Dict[str, ConverterSpec] = {}
+        self._by_mime: Dict[str, str] = {}
+        self._by_extension: Dict[str, str] = {}
+
+    def register(
+        self,
+        name: str,
+        converter: Callable,
+        mime_types: Optional[Dict[str, str]] = None,
+        extensions: Iterable[str] = (),
+        sniff: Optional[Sniffer] = None,
+        sniff_text: Optional[TextSniffer] = None,
+        libraries: Iterable[str] = (),
+    ) -> None:
+        """
+        Register ``converter(content, filename, content_type)`` as format
+        ``name``. ``mime_types`` maps each MIME type it accepts to the
+        extension listed for it in SUPPORTED_FORMATS, and ``libraries`` names
+        the modules it imports lazily so they can be loaded ahead of time.
+        """
+        spec = ConverterSpec(
+            name,
+            converter,
+            dict(mime_types or {}),
+            extensions,
+            sniff,
+            sniff_text,
+            libraries,
+        )
+        self._specs[name] = spec
+        for mime in spec.mime_types:
+            self._by_mime[mime] = name
+        for ext in spec.extensions:
+            self._by_extension[ext] = name
+
+    def get(self, name: str) -> Callable:
+        return self._specs[name].converter
+
+    def load_libraries(self, names: Optional[Iterable[str]] = None) -> None:
+        """Import the libraries of the given formats (default: all), timing each import"""
+        for name in names if names is not None else self._specs:
+            for library in self._specs[name].libraries:
+                timed_import(library)
+
+    def formats(self) -> List[str]:
+        return list(self._specs)
+
+    def supported_formats(self) -> Dict[str, str]:
+        """MIME type -> extension for every registered MIME type"""
+        return {
+            mime: ext
+            for spec in self._specs.values()
+            for mime, ext in spec.mime_types.items()
+        }
+
+    def head(self, content: bytes) -> bytes:
+        return content[: self.sniff_bytes]
+
+    def detect(
+        self, head: bytes, filename: Optional[str], content_type: Optional[str]
+    ) -> Tuple[str, str]:
+        """
+        Choose the format for an upload from the first bytes of its content,
+        its name and its declared MIME type. Returns the format key and the
+        MIME type to convert it as: the declared one unless the content
+        proved it wrong or it was generic.
+        """
+        declared = (content_type or "").split(";", 1)[0].strip().lower()
+
+        for spec in self._specs.values():
+            mime = spec.sniff(head) if spec.sniff else None
+            if mime:
+                if self._by_mime.get(declared) == spec.name:
+                    return spec.name, declared
+                return spec.name, mime
+
+        if declared in self._by_mime:
+            return self._by_mime[declared], declared
+
+        # The declared type is generic (application/octet-stream) or unknown
+        extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+        name = self._by_extension.get(extension)
+        if name is not None:
+            return name, self._specs[name].default_content_type or content_type
+
+        text = head.decode("utf-8", errors="ignore").lstrip("\ufeff \t\r\n")[:256].lower()
+        for spec in self._specs.values():
+            mime = spec.sniff_text(text) if spec.sniff_text else None
+            if mime:
+                return spec.name, mime
+        return self.fallback, content_type or "application/octet-stream"
@@ -0,0 +1,104 @@
+import os
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+
+# Writes a process may make between rescans of the directory, as a fraction
+# of its limit; every worker process writes to the same directory
+DISK_LRU_SLACK = 16
+
+
+class DiskLRU:
+    """
+    Size limit of a directory of cache files shared by every worker process:
+    the files matching ``pattern`` (and ``accept``, given their name) are
+    evicted least recently used first, by mtime, once they take more than
+    ``max_bytes``.
+
+    The total is never taken from what this process wrote alone. It rescans
+    the directory before evicting and at least every ``max_bytes /
+    DISK_LRU_SLACK`` bytes it writes, so the files written by other workers
+    count too. Every method blocks, so call them from a worker or through a
+    thread.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        pattern: str,
+        max_bytes: int,
+        accept: Optional[Callable[[str], bool]] = None,
+    ):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.max_bytes = max_bytes
+        self.accept = accept
+        self._scanned: Optional[int] = None
+        self._unscanned = 0
+
+    @property
+    def size(self) -> Optional[int]:
+        """Size at the last scan plus what this process wrote since, None before the first"""
+        if self._scanned is None:
+            return None
+        return self._scanned + self._unscanned
+
+    def files(self) -> List[Tuple[float, int, Path]]:
+        """The ``(mtime, size, path)`` of the files, oldest first"""
+        files = []
+        for p in self.directory.glob(self.pattern):
+            if self.accept is not None and not self.accept(p.name):
+                continue
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        files.sort()
+        return files
+
+    def touch(self, path: Path) -> bool:
+        """Mark a file as recently used; False if it is gone"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def write(self, path: Path, data: bytes) -> int:
+        """
+        Replace ``path`` with ``data`` atomically, then evict if the
+        directory is over its limit. Returns the number of files evicted.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return self.added(len(data))
+
+    def added(self, size: int) -> int:
+        """Account for ``size`` bytes written; returns the number of files evicted"""
+        self._unscanned += size
+        if (
+            self._scanned is None
+            or self._scanned + self._unscanned > self.max_bytes
+            or self._unscanned * DISK_LRU_SLACK >= self.max_bytes
+        ):
+            return self.evict()
+        return 0
+
+    def evict(self) -> int:
+        """Rescan the directory and evict down to its limit; returns the number of files evicted"""
+        files = self.files()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, p in files:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self._scanned = total
+        self._unscanned = 0
+        return evicted
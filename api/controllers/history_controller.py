@@ -0,0 +1,183 @@
+import os
+import re
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from api.config.db import get_database
+from api.models.conversion_history_model import ConversionHistoryModel
+
+if TYPE_CHECKING:
+    from bson import ObjectId
+
+
+# Conversion history (overridable through the environment / .env file). With
+# FRIDA_HISTORY=1 every /convert result is recorded in MongoDB (MONGODB_URI)
+# under the owner named by HISTORY_OWNER_HEADER, or HISTORY_DEFAULT_OWNER.
+# The header only scopes the history, it doesn't authenticate anyone.
+HISTORY_ENABLED = os.getenv("FRIDA_HISTORY", "0") == "1"
+HISTORY_OWNER_HEADER = "X-Frida-Owner"
+HISTORY_DEFAULT_OWNER = os.getenv("FRIDA_HISTORY_DEFAULT_OWNER", "anonymous")
+# Markdown bodies larger than this go to GridFS, compressed
+HISTORY_INLINE_BYTES = int(os.getenv("FRIDA_HISTORY_INLINE_BYTES", str(64 * 1024)))
+HISTORY_PAGE_SIZE = int(os.getenv("FRIDA_HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = 100
+
+OWNER_NAME = re.compile(r"^[\w.@+-]{1,128}$")
+HISTORY_CURSOR = re.compile(r"^(\d+)-([0-9a-f]{24})$")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(moment: datetime) -> str:
+    # pymongo returns naive UTC datetimes
+    return moment.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def encode_cursor(entry: Dict) -> str:
+    milliseconds = (entry["converted_at"] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{milliseconds}-{entry['_id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, "ObjectId"]:
+    """The ``(converted_at, _id)`` a page cursor points after; ValueError if malformed"""
+    # bson comes with pymongo; only import it once the history is used
+    from bson import ObjectId
+
+    match = HISTORY_CURSOR.match(cursor)
+    if not match:
+        raise ValueError(f"Invalid history cursor {cursor!r}")
+    converted_at = _EPOCH + timedelta(milliseconds=int(match.group(1)))
+    return converted_at, ObjectId(match.group(2))
+
+
+def history_owner(header: Optional[str]) -> str:
+    """The owner named by HISTORY_OWNER_HEADER; ValueError if it isn't a valid name"""
+    if header is None or not header.strip():
+        return HISTORY_DEFAULT_OWNER
+    owner = header.strip()
+    if not OWNER_NAME.match(owner):
+        raise ValueError(f"Invalid {HISTORY_OWNER_HEADER} header {owner!r}")
+    return owner
+
+
+class HistoryController:
+    """
+    Records conversions in the history and pages through it. Every method
+    blocks on the database, so call them through a thread.
+    """
+
+    def __init__(self, db, fs=None, inline_bytes: int = HISTORY_INLINE_BYTES):
+        self.history_model = ConversionHistoryModel(db, fs, inline_bytes)
+        self._indexed = False
+
+    def _ensure_indexes(self) -> None:
+        if not self._indexed:
+            self.history_model.ensure_indexes()
+            self._indexed = True
+
+    def record_conversion(
+        self,
+        owner: str,
+        fmt: str,
+        content_hash: str,
+        size: int,
+        filename: Optional[str],
+        content_type: str,
+        markdown: str,
+        metadata: Dict,
+    ) -> str:
+        self._ensure_indexes()
+        fields = {
+            "filename": filename,
+            "content_type": content_type,
+            "format": fmt,
+            "size": size,
+            "metadata": metadata,
+        }
+        return self.history_model.record_conversion(owner, content_hash, fields, markdown)
+
+    def list_history(
+        self,
+        owner: str,
+        limit: int = HISTORY_PAGE_SIZE,
+        before: Optional[Tuple[datetime, "ObjectId"]] = None,
+    ) -> Dict:
+        """
+        A page of ``owner``'s history, newest first, starting after the
+        decoded cursor ``before``, and the cursor of the next page
+        """
+        self._ensure_indexes()
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        # One more entry than asked for tells whether there is a next page
+        entries = self.history_model.find_conversions(owner, limit + 1, before)
+        next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+        return {
+            "success": True,
+            "items": [self.serialize(entry) for entry in entries[:limit]],
+            "nextCursor": next_cursor,
+        }
+
+    def get_entry(self, owner: str, entry_id: str) -> Optional[Dict]:
+        entry = self.history_model.find_conversion_by_id(owner, entry_id)
+        if entry is None:
+            return None
+        return {
+            "success": True,
+            **self.serialize(entry),
+            "markdownContent": entry["markdown"],
+        }
+
+    @staticmethod
+    def serialize(entry: Dict) -> Dict:
+        return {
+            "id": entry["_id"],
+            "filename": entry.get("filename"),
+            "contentType": entry.get("content_type"),
+            "format": entry.get("format"),
+            "size": entry.get("size"),
+            "contentHash": entry["content_hash"],
+            "markdownBytes": entry.get("markdown_bytes"),
+            "conversions": entry.get("conversions", 1),
+            "convertedAt": _timestamp(entry["converted_at"]),
+            "firstConvertedAt": _timestamp(entry["first_converted_at"]),
+            "metadata": entry.get("metadata", {}),
+        }
+
+
+# Connect to the database when the history is first used, not at import
+_history_controller = None
+_history_controller_lock = threading.Lock()
+
+
+def get_history_controller() -> HistoryController:
+    global _history_controller
+    with _history_controller_lock:
+        if _history_controller is None:
+            _history_controller = HistoryController(get_database())
+    return _history_controller
+
+
+async def record_history(
+    owner: str,
+    fmt: str,
+    content_hash: str,
+    size: int,
+    filename: Optional[str],
+    content_type: str,
+    markdown: str,
+    metadata: Dict,
+) -> None:
+    """
+    Record a conversion after its response was sent. The history is best
+    effort: a database that can't be reached doesn't fail the conversion.
+    """
+    try:
+        await asyncio.to_thread(
+            lambda: get_history_controller().record_conversion(
+                owner, fmt, content_hash, size, filename, content_type, markdown, metadata
+            )
+        )
+    except Exception as e:
+        print(f"Could not record the conversion of {filename!r} in the history: {str(e)}")
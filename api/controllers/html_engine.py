@@ -0,0 +1,191 @@
+import os
+import codecs
+from typing import Dict, List, Optional, Tuple, Union
+
+import html2text
+
+
+# HTML parser backend (overridable through the environment / .env file).
+# "html.parser" gives exactly html2text's own output. "lxml" tokenizes in C,
+# which makes large documents convert around 20% faster, but it repairs
+# malformed markup (unclosed or mismatched tags) the way libxml2 does, so
+# the blank lines around such tags can differ. It falls back to
+# "html.parser" when lxml isn't installed.
+HTML_PARSER = os.getenv("FRIDA_HTML_PARSER", "html.parser")
+HTML_CHUNK_BYTES = 64 * 1024
+HTML_MAX_HEADINGS = int(os.getenv("FRIDA_HTML_MAX_HEADINGS", "200"))
+
+HEADING_LEVELS = {f"h{level}": level for level in range(1, 7)}
+# html2text keeps &nbsp; as this placeholder until the document is finished
+NBSP_PLACEHOLDER = "&nbsp_place_holder;"
+
+
+def _joined_text(parts: List[str]) -> str:
+    return "".join(parts).replace(NBSP_PLACEHOLDER, "\xa0")
+
+
+class MetadataHTML2Text(html2text.HTML2Text):
+    """
+    html2text's converter, configured as /convert uses it, that also records
+    the title, the headings and the link and image counts from the tags and
+    text it visits anyway.
+    """
+
+    def __init__(self):
+        super().__init__(bodywidth=0)  # No wrapping
+        self.ignore_links = False
+        self.ignore_images = False
+
+        self.title: Optional[str] = None
+        self.headings: List[Dict[str, Union[str, int]]] = []
+        self.heading_count = 0
+        self.link_count = 0
+        self.image_count = 0
+        self._title_seen = False
+        self._title_parts: Optional[List[str]] = None
+        self._in_title = False
+        self._heading: Optional[Tuple[int, List[str]]] = None
+
+    def handle_tag(self, tag: str, attrs: Dict[str, Optional[str]], start: bool) -> None:
+        if start and self._in_title:
+            # Markup inside <title>: BeautifulSoup has no title string then
+            self._title_parts = None
+            self._in_title = False
+        if tag == "title":
+            # Only the first <title> counts, like BeautifulSoup's soup.title
+            if start and not self._title_seen:
+                self._title_seen = True
+                self._title_parts = []
+                self._in_title = True
+            elif not start and self._in_title:
+                self._end_title()
+        elif tag in HEADING_LEVELS:
+            if start:
+                self.heading_count += 1
+                if len(self.headings) < HTML_MAX_HEADINGS:
+                    self._heading = (HEADING_LEVELS[tag], [])
+            elif self._heading is not None:
+                level, parts = self._heading
+                self._heading = None
+                text = " ".join(_joined_text(parts).split())
+                self.headings.append({"level": level, "text": text})
+        elif start and tag == "a" and attrs.get("href"):
+            self.link_count += 1
+        elif start and tag == "img":
+            self.image_count += 1
+        super().handle_tag(tag, attrs, start)
+
+    def _end_title(self) -> None:
+        self._in_title = False
+        self.title = _joined_text(self._title_parts).strip() or None
+
+    def handle_data(self, data: str, entity_char: bool = False) -> None:
+        if self._in_title:
+            self._title_parts.append(data)
+        if self._heading is not None:
+            self._heading[1].append(data)
+        super().handle_data(data, entity_char)
+
+
+class _LxmlTarget:
+    """Forwards lxml parser events to html2text's tag and data handlers"""
+
+    def __init__(self, converter: MetadataHTML2Text):
+        self.converter = converter
+
+    def start(self, tag, attrib):
+        self.converter.handle_starttag(tag, list(attrib.items()))
+
+    def end(self, tag):
+        self.converter.handle_endtag(tag)
+
+    def data(self, data):
+        # html.parser hands html2text &nbsp; as an entity, lxml as the character
+        self.converter.handle_data(data.replace("\xa0", NBSP_PLACEHOLDER))
+
+    def close(self):
+        return None
+
+
+class HTMLMarkdownEngine:
+    """
+    Converts HTML to markdown in a single pass: fed the document in chunks
+    (bytes are decoded incrementally as UTF-8), it renders markdown through
+    html2text and collects the document's metadata on the way.
+
+    With html.parser, text is only handed over up to the last "<" of what
+    has been fed, so no text node is ever split between two parser calls
+    (html2text escapes each piece of text on its own) and the output is
+    the same as converting the whole document at once.
+    """
+
+    def __init__(self, parser: str = HTML_PARSER):
+        self.converter = MetadataHTML2Text()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending: List[str] = []
+        self._lxml = None
+        if parser == "lxml":
+            try:
+                from lxml import etree
+            except ImportError:
+                print("lxml is not installed, converting HTML with html.parser")
+            else:
+                self._lxml = etree.HTMLParser(target=_LxmlTarget(self.converter))
+
+    def feed(self, data: Union[bytes, str]) -> None:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = self._decoder.decode(data)
+        if not data:
+            return
+        if self._lxml is not None:
+            self._lxml.feed(data)
+            return
+
+        cut = data.rfind("<")
+        if cut < 0:
+            self._pending.append(data)
+            return
+        self._pending.append(data[:cut])
+        self.converter.feed("".join(self._pending))
+        self._pending = [data[cut:]]
+
+    def close(self) -> str:
+        """Finish the document and return its markdown"""
+        tail = self._decoder.decode(b"", final=True)
+        if self._lxml is not None:
+            if tail:
+                self._lxml.feed(tail)
+            self._lxml.close()
+            converter = self.converter
+            markdown = converter.optwrap(converter.finish())
+            if converter.pad_tables:
+                markdown = html2text.pad_tables_in_text(markdown)
+            return markdown
+
+        self._pending.append(tail)
+        remainder = "".join(self._pending)
+        self._pending = []
+        return self.converter.handle(remainder)
+
+    def metadata(self) -> Dict:
+        converter = self.converter
+        if converter._in_title:
+            # <title> never closed: keep what was read
+            converter._end_title()
+        return {
+            "title": converter.title,
+            "headings": converter.headings,
+            "heading_count": converter.heading_count,
+            "link_count": converter.link_count,
+            "image_count": converter.image_count,
+        }
+
+
+def convert_html(content: bytes, parser: str = HTML_PARSER) -> Tuple[str, Dict]:
+    """Convert an HTML document to markdown; returns the markdown and its metadata"""
+    engine = HTMLMarkdownEngine(parser)
+    view = memoryview(content)
+    for start in range(0, len(view), HTML_CHUNK_BYTES):
+        engine.feed(view[start : start + HTML_CHUNK_BYTES])
+    markdown = engine.close()
+    return markdown, engine.metadata()
@@ -0,0 +1,313 @@
+import os
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from api.models.job_model import JobModel
+from api.route.converter import (
+    convert_content,
+    converter_registry,
+    render_conversion_response,
+)
+
+
+# Job queue configuration (overridable through the environment / .env file)
+JOB_WORKERS = int(os.getenv("FRIDA_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("FRIDA_JOB_QUEUE_SIZE", "100"))
+JOB_RETENTION_SECONDS = int(os.getenv("FRIDA_JOB_RETENTION_SECONDS", str(60 * 60)))
+JOB_PURGE_INTERVAL_SECONDS = int(os.getenv("FRIDA_JOB_PURGE_INTERVAL_SECONDS", "60"))
+# Unfinished jobs belong to the process that queued or took them over for as
+# long as it renews its lease (a third of this); the jobs of a process that
+# stopped are taken over by another one once the lease has run out
+JOB_LEASE_SECONDS = int(os.getenv("FRIDA_JOB_LEASE_SECONDS", "30"))
+JOB_DIR = os.getenv(
+    "FRIDA_JOB_DIR", str(Path(__file__).resolve().parents[2] / "tmp" / "jobs")
+)
+
+JOB_PROGRESS = {"queued": 0.0, "running": 0.5, "succeeded": 1.0, "failed": 1.0}
+
+
+class JobController:
+    """
+    Runs conversions as background jobs. Uploads are spooled to disk and
+    tracked in a local SQLite store, a fixed number of workers drain a
+    bounded queue through the regular conversion path, and finished jobs
+    are purged once their retention period has passed. Several processes
+    can share the store: each runs the jobs it holds a lease on.
+    """
+
+    def __init__(
+        self,
+        directory: str = JOB_DIR,
+        workers: int = JOB_WORKERS,
+        queue_size: int = JOB_QUEUE_SIZE,
+        retention_seconds: int = JOB_RETENTION_SECONDS,
+        lease_seconds: int = JOB_LEASE_SECONDS,
+    ):
+        self.directory = Path(directory)
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        # Unique per process and start, so a restarted process doesn't
+        # mistake the jobs it held before for its own
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self.job_model: Optional[JobModel] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._start_lock = asyncio.Lock()
+
+    def _open(self) -> None:
+        if self.job_model is None:
+            (self.directory / "uploads").mkdir(parents=True, exist_ok=True)
+            (self.directory / "results").mkdir(parents=True, exist_ok=True)
+            self.job_model = JobModel(str(self.directory / "jobs.sqlite3"))
+
+    async def start(self) -> None:
+        """Open the store, re-queue unfinished jobs and start the workers"""
+        async with self._start_lock:
+            if not self._tasks:
+                await self._start()
+
+    async def _start(self) -> None:
+        await asyncio.to_thread(self._open)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Jobs interrupted by a restart run again from their spooled upload
+        await self.claim_orphaned_jobs()
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        self._tasks.append(asyncio.create_task(self._lease_loop()))
+
+    async def claim_orphaned_jobs(self) -> int:
+        """Queue the unfinished jobs of processes that are gone, as far as there is room"""
+        free = self.queue_size - self._queue.qsize()
+        if free <= 0:
+            return 0
+        now = time.time()
+        job_ids = await asyncio.to_thread(
+            self.job_model.claim_orphaned_jobs,
+            self.owner,
+            now,
+            now + self.lease_seconds,
+            free,
+        )
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        return len(job_ids)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, content: bytes, filename: Optional[str], content_type: Optional[str]
+    ) -> Dict:
+        """Spool an upload and queue it, or raise 429 when the queue is full"""
+        await self.start()
+        if self._queue.full():
+            raise HTTPException(
+                status_code=429,
+                detail="Conversion job queue is full, try again later",
+                headers={"Retry-After": "5"},
+            )
+
+        job_id = uuid.uuid4().hex
+        upload_path = self.directory / "uploads" / job_id
+        now = time.time()
+        await asyncio.to_thread(upload_path.write_bytes, content)
+        await asyncio.to_thread(
+            self.job_model.create_job,
+            job_id,
+            filename,
+            content_type,
+            len(content),
+            str(upload_path),
+            now,
+            now + self.retention_seconds,
+            self.owner,
+            now + self.lease_seconds,
+        )
+        self._queue.put_nowait(job_id)
+        return await self.get_job(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        await self.start()
+        job = await asyncio.to_thread(self.job_model.find_job_by_id, job_id)
+        if job is None:
+            return None
+        return self.serialize(job)
+
+    @staticmethod
+    def serialize(job: Dict) -> Dict:
+        now = time.time()
+        status = {
+            "id": job["id"],
+            "status": job["status"],
+            "filename": job["filename"],
+            "contentType": job["content_type"],
+            "size": job["size"],
+            "createdAt": job["created_at"],
+            "startedAt": job["started_at"],
+            "finishedAt": job["finished_at"],
+            "expiresAt": job["expires_at"],
+            # Stage based: conversions report no finer progress than this
+            "progress": JOB_PROGRESS.get(job["status"], 0.0),
+        }
+        if job["status"] == "running":
+            status["elapsedMs"] = round((now - job["started_at"]) * 1000, 2)
+        if job["status"] == "failed":
+            status["error"] = job["error"]
+        if job["finished_at"] and job["started_at"]:
+            status["elapsedMs"] = round(
+                (job["finished_at"] - job["started_at"]) * 1000, 2
+            )
+        return status
+
+    async def get_result(self, job_id: str) -> Optional[Dict]:
+        """
+        Look up a job with its outcome: its ``job`` status, the stored
+        /convert response ``body`` (JSON bytes) of a succeeded job, or the
+        ``status_code`` of a failed one. None if there is no such job; the
+        body is None if its file is gone (the job was deleted meanwhile).
+        """
+        await self.start()
+        job = await asyncio.to_thread(self.job_model.find_job_by_id, job_id)
+        if job is None:
+            return None
+
+        outcome = {"job": self.serialize(job), "body": None, "status_code": None}
+        if job["status"] == "succeeded":
+            try:
+                outcome["body"] = await asyncio.to_thread(
+                    Path(job["result_path"]).read_bytes
+                )
+            except FileNotFoundError:
+                pass
+        elif job["status"] == "failed":
+            outcome["status_code"] = job["error_status"] or 500
+        return outcome
+
+    async def delete_job(self, job_id: str) -> int:
+        await self.start()
+        job = await asyncio.to_thread(self.job_model.find_job_by_id, job_id)
+        if job is None:
+            return 0
+        # A queued job is skipped by the workers once its row is gone
+        await asyncio.to_thread(self._remove, job)
+        return 1
+
+    def _remove(self, job: Dict) -> None:
+        self.job_model.delete_job(job["id"])
+        for path in (job["upload_path"], job["result_path"]):
+            if path:
+                Path(path).unlink(missing_ok=True)
+
+    async def _fail(self, job_id: str, status_code: int, error: str) -> None:
+        now = time.time()
+        await asyncio.to_thread(
+            self.job_model.update_job,
+            job_id,
+            {
+                "status": "failed",
+                "error": error,
+                "error_status": status_code,
+                "finished_at": now,
+                "expires_at": now + self.retention_seconds,
+            },
+        )
+
+    async def _run_job(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.job_model.find_job_by_id, job_id)
+        if job is None or job["status"] != "queued":
+            return
+
+        started = await asyncio.to_thread(
+            self.job_model.start_job, job_id, self.owner, time.time()
+        )
+        if not started:
+            return  # Deleted, or taken over by another process
+        try:
+            upload_path = Path(job["upload_path"])
+            content = await asyncio.to_thread(upload_path.read_bytes)
+            fmt, content_type = converter_registry.detect(
+                converter_registry.head(content), job["filename"], job["content_type"]
+            )
+            result = await convert_content(fmt, content, job["filename"], content_type)
+            response = render_conversion_response(result, content_type)
+
+            result_path = self.directory / "results" / f"{job_id}.json"
+            await asyncio.to_thread(result_path.write_bytes, response)
+            now = time.time()
+            updated = await asyncio.to_thread(
+                self.job_model.update_job,
+                job_id,
+                {
+                    "status": "succeeded",
+                    "result_path": str(result_path),
+                    "upload_path": None,
+                    "finished_at": now,
+                    "expires_at": now + self.retention_seconds,
+                },
+            )
+            if not updated:
+                # Deleted while it ran: _remove didn't know about the result yet
+                await asyncio.to_thread(result_path.unlink, True)
+            await asyncio.to_thread(upload_path.unlink, True)
+        except HTTPException as he:
+            await self._fail(job_id, he.status_code, str(he.detail))
+        except Exception as e:
+            print(f"Unexpected error during conversion job {job_id}: {str(e)}")
+            await self._fail(job_id, 500, f"Failed to convert file: {str(e)}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def purge_expired(self) -> int:
+        expired = await asyncio.to_thread(
+            self.job_model.find_expired_jobs, time.time() - self.retention_seconds
+        )
+        for job in expired:
+            await asyncio.to_thread(self._remove, job)
+        return len(expired)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                print(f"Failed to purge expired conversion jobs: {e}")
+            await asyncio.sleep(JOB_PURGE_INTERVAL_SECONDS)
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                now = time.time()
+                await asyncio.to_thread(
+                    self.job_model.renew_leases, self.owner, now + self.lease_seconds
+                )
+                await self.claim_orphaned_jobs()
+            except Exception as e:
+                print(f"Failed to renew the conversion job leases: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "capacity": self.queue_size,
+        }
+
+
+job_controller = JobController()
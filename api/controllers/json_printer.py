@@ -0,0 +1,307 @@
+import os
+import re
+from json import JSONDecodeError
+from json.decoder import scanstring
+from json.encoder import encode_basestring_ascii
+from typing import Dict, List, Optional
+
+from api.controllers.markdown_writer import MarkdownWriter
+
+
+# Caps for pretty-printed JSON (overridable through the environment / .env
+# file). Containers nested deeper than JSON_MAX_DEPTH are summarised as
+# "[... N items]" / "{... N keys}", and printing stops after JSON_MAX_CHARS
+# characters; the rest of the document is still validated and counted.
+JSON_MAX_DEPTH = int(os.getenv("FRIDA_JSON_MAX_DEPTH", "64"))
+JSON_MAX_CHARS = int(os.getenv("FRIDA_JSON_MAX_CHARS", str(32 * 1024 * 1024)))
+
+# Output fragments are joined into one string every so often, so a document
+# with millions of tokens doesn't keep millions of small strings alive
+_FLUSH_PARTS = 4096
+_FLUSH_CHARS = 1024 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SPACE = frozenset(" \t\n\r")
+# A string that json.dumps writes back unchanged: printable ASCII, no escapes
+_PLAIN_STRING = re.compile(r'"[ !#-\[\]-~]*"')
+# Values json.dumps writes back as they are: plain strings, integers other
+# than -0, literals and decimals that are already in their shortest form
+# (at most 15 digits, so they round-trip, no trailing zeros and not small
+# enough for repr() to switch to an exponent)
+_PLAIN_VALUE = (
+    r'"[ !#-\[\]-~]*"'
+    r"|-?(?=[\d.]{3,16}(?![\d.eE]))(?:[1-9]\d*\.(?:0|\d*[1-9])|0\.0{0,3}[1-9]\d*(?<=[1-9]))"
+    r"|(?:-?[1-9]\d*|0)(?![.eE\d])|true|false|null"
+)
+# An object member with a plain key and, if possible, a plain value
+_MEMBER = re.compile(
+    r'[ \t\n\r]*("[ !#-\[\]-~]*")[ \t\n\r]*:[ \t\n\r]*(?:(%s)(?![\w.]))?' % _PLAIN_VALUE
+)
+# An array item with a plain value
+_ITEM = re.compile(r"[ \t\n\r]*(%s)(?![\w.])" % _PLAIN_VALUE)
+# Runs of such entries, each after its comma
+_MEMBER_SEP = re.compile(
+    r'[ \t\n\r]*,[ \t\n\r]*("[ !#-\[\]-~]*")[ \t\n\r]*:[ \t\n\r]*(%s)(?![\w.])' % _PLAIN_VALUE
+)
+_MEMBER_RUN = re.compile("(?:%s)+" % _MEMBER_SEP.pattern)
+_ITEM_SEP = re.compile(r"[ \t\n\r]*,[ \t\n\r]*(%s)(?![\w.])" % _PLAIN_VALUE)
+_ITEM_RUN = re.compile("(?:%s)+" % _ITEM_SEP.pattern)
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+_CLOSING = {"{": "}", "[": "]"}
+_INFINITY = float("inf")
+
+
+class JSONStats:
+    """What write_pretty_json learned about a document while printing it"""
+
+    def __init__(self):
+        self.keys: Optional[Dict[str, None]] = None  # Top-level keys, in order
+        self.items: Optional[int] = None  # Top-level array length
+        self.depth = 0
+        self.truncated: List[str] = []
+
+
+def _read_string(text: str, pos: int):
+    """Read the string starting at pos; returns its json.dumps form, its value and the end"""
+    match = _PLAIN_STRING.match(text, pos)
+    if match:
+        token = match.group()
+        return token, token[1:-1], match.end()
+    value, end = scanstring(text, pos + 1)
+    return encode_basestring_ascii(value), value, end
+
+
+def _read_key(text: str, pos: int):
+    """Read an object key and its colon; returns the key's json.dumps form, its value and where the value starts"""
+    if text[pos : pos + 1] != '"':
+        raise JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+    token, key, pos = _read_string(text, pos)
+    pos = _WHITESPACE.match(text, pos).end()
+    if text[pos : pos + 1] != ":":
+        raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+    return token, key, _WHITESPACE.match(text, pos + 1).end()
+
+
+def _read_scalar(text: str, pos: int):
+    """Read a number or literal; returns its json.dumps form and the end"""
+    match = _NUMBER.match(text, pos)
+    if match:
+        token = match.group()
+        if match.group(1) or match.group(2):
+            number = float(token)
+            if number == _INFINITY:
+                token = "Infinity"
+            elif number == -_INFINITY:
+                token = "-Infinity"
+            else:
+                token = repr(number)
+        elif token == "-0":
+            token = "0"
+        return token, match.end()
+    for literal in _LITERALS:
+        if text.startswith(literal, pos):
+            return literal, pos + len(literal)
+    raise JSONDecodeError("Expecting value", text, pos)
+
+
+def write_pretty_json(
+    text: str,
+    writer: MarkdownWriter,
+    max_depth: int = JSON_MAX_DEPTH,
+    max_chars: int = JSON_MAX_CHARS,
+) -> JSONStats:
+    """
+    Write ``text`` to ``writer`` as json.dumps(json.loads(text), indent=2)
+    would, without building the document's Python objects: the document is
+    tokenized in one pass and only the stack of open containers is kept.
+    Duplicate keys are printed as they appear (json.loads keeps the last).
+
+    Raises json.JSONDecodeError, with json's messages, for invalid input.
+    """
+    if text.startswith("\ufeff"):
+        # Like json.loads, which only takes BOM-less text
+        raise JSONDecodeError("Unexpected UTF-8 BOM (decode using utf-8-sig)", text, 0)
+
+    stats = JSONStats()
+    parts: List[str] = []
+    append = parts.append
+    written = buffered = 0
+
+    def flush() -> bool:
+        """Move the buffered output to the writer; True if it went past max_chars"""
+        nonlocal written, buffered
+        chunk = "".join(parts)
+        parts.clear()
+        buffered = 0
+        cut = written + len(chunk) > max_chars
+        if cut:
+            chunk = chunk[: max_chars - written]
+        writer.write(chunk)
+        written += len(chunk)
+        return cut
+    # Nothing is printed while skipping a container nested deeper than
+    # max_depth (skip_depth is its depth) or once max_chars were written
+    skip_depth = 0
+    full = False
+
+    # Open containers as [opening bracket, entries so far]
+    stack: List[list] = []
+    indents = ["\n"]
+    pos = _WHITESPACE.match(text).end()
+
+    while True:
+        # A value starts at pos
+        quiet = skip_depth or full
+        char = text[pos : pos + 1]
+        if char == "{" or char == "[":
+            closing = _CLOSING[char]
+            depth = len(stack) + 1
+            if depth > stats.depth:
+                stats.depth = depth
+            after = pos + 1
+            if text[after : after + 1] in _SPACE:
+                after = _WHITESPACE.match(text, after).end()
+            if text[after : after + 1] == closing:
+                if not quiet:
+                    append(char + closing)
+                if depth == 1:
+                    stats.keys, stats.items = ({}, None) if char == "{" else (None, 0)
+                pos = after + 1
+            else:
+                if depth == len(indents):
+                    indents.append(indents[-1] + "  ")
+                stack.append([char, 1])
+                if not quiet and depth > max_depth:
+                    skip_depth = quiet = depth
+                    if "depth" not in stats.truncated:
+                        stats.truncated.append("depth")
+                elif not quiet:
+                    append(char + indents[depth])
+                pos = after
+                if char == "[":
+                    continue
+                # The first member; a plain key with a plain scalar value is
+                # read with a single regex match
+                match = _MEMBER.match(text, pos)
+                if match is None:
+                    token, key, pos = _read_key(text, pos)
+                    value = None
+                else:
+                    token, value = match.group(1, 2)
+                    key = token[1:-1]
+                    pos = match.end()
+                if depth == 1:
+                    stats.keys = {key: None}
+                if value is None:
+                    if not quiet:
+                        append(token + ": ")
+                    continue
+                if not quiet:
+                    append(token + ": " + value)
+        elif char == '"':
+            token, _, pos = _read_string(text, pos)
+            if not quiet:
+                append(token)
+        else:
+            token, pos = _read_scalar(text, pos)
+            if not quiet:
+                append(token)
+
+        # After a value: close finished containers and read plain entries
+        # until the next one that needs the value parser above
+        while stack:
+            char = text[pos : pos + 1]
+            if char in _SPACE:
+                pos = _WHITESPACE.match(text, pos).end()
+                char = text[pos : pos + 1]
+            entry = stack[-1]
+            opening = entry[0]
+            depth = len(stack)
+            if char == ",":
+                quiet = skip_depth or full
+                # A run of plain entries is matched and split up by the regex
+                # engine (top-level members are read one by one for their keys)
+                if opening == "[":
+                    run = _ITEM_RUN.match(text, pos)
+                elif depth > 1:
+                    run = _MEMBER_RUN.match(text, pos)
+                else:
+                    run = None
+                if run is not None:
+                    end = run.end()
+                    if opening == "[":
+                        entries = _ITEM_SEP.findall(text, pos, end)
+                    else:
+                        entries = [
+                            key + ": " + value
+                            for key, value in _MEMBER_SEP.findall(text, pos, end)
+                        ]
+                    entry[1] += len(entries)
+                    pos = end
+                    if not quiet:
+                        separator = "," + indents[depth]
+                        printed = separator + separator.join(entries)
+                        append(printed)
+                        buffered += len(printed)
+                    continue
+                entry[1] += 1
+                if opening == "[":
+                    match = _ITEM.match(text, pos + 1)
+                    if match is None:
+                        pos = _WHITESPACE.match(text, pos + 1).end()
+                        if not quiet:
+                            append("," + indents[depth])
+                        break
+                    pos = match.end()
+                    if not quiet:
+                        append("," + indents[depth] + match.group(1))
+                    continue
+                match = _MEMBER.match(text, pos + 1)
+                if match is None:
+                    pos = _WHITESPACE.match(text, pos + 1).end()
+                    token, key, pos = _read_key(text, pos)
+                    value = None
+                else:
+                    token, value = match.group(1, 2)
+                    key = token[1:-1]
+                    pos = match.end()
+                if depth == 1:
+                    stats.keys[key] = None
+                if value is None:
+                    if not quiet:
+                        append("," + indents[depth] + token + ": ")
+                    break
+                if not quiet:
+                    append("," + indents[depth] + token + ": " + value)
+                continue
+            if char != _CLOSING[opening]:
+                raise JSONDecodeError("Expecting ',' delimiter", text, pos)
+            pos += 1
+            stack.pop()
+            count = entry[1]
+            if depth == 1 and opening == "[":
+                stats.items = count
+            if skip_depth == depth:
+                skip_depth = 0
+                if not full:
+                    noun = ("key" if opening == "{" else "item") + ("s" if count != 1 else "")
+                    append(f"{opening}... {count} {noun}{_CLOSING[opening]}")
+            elif not (skip_depth or full):
+                append(indents[depth - 1] + _CLOSING[opening])
+        else:
+            # The top-level value is complete
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos != len(text):
+                raise JSONDecodeError("Extra data", text, pos)
+            break
+
+        if not full and (len(parts) >= _FLUSH_PARTS or buffered >= _FLUSH_CHARS):
+            full = flush()
+
+    if not full:
+        full = flush()
+    if full:
+        stats.truncated.append("size")
+        writer.write(f"\n... (truncated after {written} characters)")
+    return stats
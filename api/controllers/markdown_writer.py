@@ -0,0 +1,119 @@
+import re
+import json
+import time
+import threading
+from typing import Iterable, List, Optional
+
+
+# Python's \s is exactly str.isspace(), so after collapsing whitespace runs
+# the only whitespace left is " " and strip() has nothing else to remove
+_WHITESPACE = re.compile(r"\s+")
+_CONTROL = re.compile(r"[\x00-\x1F\x7F]+")
+
+# Seconds each thread has spent normalizing text, read around a converter
+# call to report the "normalize" stage separately from parsing
+_normalize_clock = threading.local()
+
+
+def normalize_seconds() -> float:
+    """Total time normalize_text() and TextNormalizer took on this thread"""
+    return getattr(_normalize_clock, "seconds", 0.0)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace runs to single spaces, drop control characters and
+    strip the ends, in one regex pass over the text plus a scan for control
+    characters (which extracted text rarely contains).
+    """
+    started = time.perf_counter()
+    text = _WHITESPACE.sub(" ", text)
+    if _CONTROL.search(text):
+        text = _CONTROL.sub("", text)
+    _normalize_clock.seconds = normalize_seconds() + time.perf_counter() - started
+    return text.strip()
+
+
+class MarkdownWriter:
+    """
+    Append-only markdown buffer. Fragments are kept in a list and joined
+    once by getvalue(), so a document costs a single copy however many
+    pieces it was written in.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+
+    def write(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+
+    def writelines(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.write(line)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def getvalue(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+class TextNormalizer:
+    """
+    Streaming form of normalize_text(). Fragments fed one at a time are
+    written to ``writer`` exactly as normalize_text() would render their
+    concatenation, without ever building the concatenated text.
+    """
+
+    def __init__(self, writer: MarkdownWriter):
+        self.writer = writer
+        self._in_whitespace = False
+        self._started = False
+        self._pending = ""
+
+    def feed(self, text: str) -> None:
+        started = time.perf_counter()
+        try:
+            self._feed(text)
+        finally:
+            _normalize_clock.seconds = (
+                normalize_seconds() + time.perf_counter() - started
+            )
+
+    def _feed(self, text: str) -> None:
+        collapsed = _WHITESPACE.sub(" ", text)
+        # A whitespace run may continue across fragments
+        if self._in_whitespace and collapsed.startswith(" "):
+            collapsed = collapsed[1:]
+        if not collapsed:
+            return
+        self._in_whitespace = collapsed.endswith(" ")
+        if _CONTROL.search(collapsed):
+            collapsed = _CONTROL.sub("", collapsed)
+
+        # Trailing spaces are held back until more text follows them
+        body = collapsed.rstrip()
+        if not body:
+            self._pending += collapsed
+            return
+        tail = collapsed[len(body) :]
+        if self._started:
+            self.writer.write(self._pending)
+        else:
+            body = body.lstrip()
+            self._started = True
+        self.writer.write(body)
+        self._pending = tail
+
+    def close(self) -> None:
+        self._pending = ""
+
+
+def encode_json_string(text: Optional[str]) -> bytes:
+    """JSON-encode a string as starlette's JSONResponse would"""
+    return json.dumps(text, ensure_ascii=False).encode("utf-8")
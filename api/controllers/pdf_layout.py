@@ -0,0 +1,196 @@
+import os
+import io
+import re
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from api.controllers.markdown_writer import normalize_text
+
+
+# PDF extraction tier (overridable through the environment / .env file, and
+# per request with ?pdf_tier=). "fast" is PyPDF2's plain text extraction.
+# "layout" reads each page with pdfplumber, renders ruled tables as markdown
+# tables and lines set in a larger font than the body text as headings; it is
+# an order of magnitude slower. "auto" uses "layout" only for pages whose
+# content stream draws enough rules to hold a table.
+PDF_TIERS = ["fast", "layout", "auto"]
+PDF_TIER = os.getenv("FRIDA_PDF_TIER", "fast")
+# Rectangles and line segments a page must draw before "auto" reads its layout
+PDF_AUTO_MIN_RULES = int(os.getenv("FRIDA_PDF_AUTO_MIN_RULES", "6"))
+# Lines whose font is this much larger than the page's body text are headings
+PDF_HEADING_RATIO = float(os.getenv("FRIDA_PDF_HEADING_RATIO", "1.2"))
+
+_RECTANGLE = re.compile(rb"(?:-?[\d.]+\s+){4}re\b")
+_SEGMENT = re.compile(rb"(?:-?[\d.]+\s+){2}l\b")
+
+
+def count_rules(page) -> int:
+    """Count the rectangles and line segments drawn by a PyPDF2 page's content stream"""
+    contents = page.get_contents()
+    if contents is None:
+        return 0
+    data = contents.get_data()
+    return len(_RECTANGLE.findall(data)) + len(_SEGMENT.findall(data))
+
+
+def render_table(rows: List[List[Optional[str]]]) -> str:
+    """Render the cell texts of a pdfplumber table as a markdown table"""
+    rows = [
+        [normalize_text(cell).replace("|", "\\|") if cell else "" for cell in row]
+        for row in rows
+    ]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ""
+    columns = max(len(row) for row in rows)
+    lines = []
+    for index, row in enumerate(rows):
+        cells = row + [""] * (columns - len(row))
+        lines.append("| " + " | ".join(cells) + " |")
+        if index == 0:
+            lines.append("| " + " | ".join(["---"] * columns) + " |")
+    return "\n".join(lines)
+
+
+def _line_size(line: Dict) -> float:
+    sizes = sorted(char["size"] for char in line["chars"])
+    return round(sizes[len(sizes) // 2], 1) if sizes else 0.0
+
+
+def _outside(bboxes: List[Tuple[float, float, float, float]]):
+    """pdfplumber filter keeping the objects whose centre is in none of ``bboxes``"""
+
+    def keep(obj) -> bool:
+        if "x0" not in obj or "top" not in obj:
+            return True
+        x = (obj["x0"] + obj["x1"]) / 2
+        y = (obj["top"] + obj["bottom"]) / 2
+        return not any(
+            x0 <= x < x1 and top <= y < bottom for x0, top, x1, bottom in bboxes
+        )
+
+    return keep
+
+
+def render_layout_page(page) -> str:
+    """
+    Render a pdfplumber page as markdown: tables as markdown tables,
+    larger-font lines as ### headings and the other lines as paragraphs,
+    in reading order from the top of the page.
+    """
+    tables = page.find_tables()
+    blocks: List[Tuple[float, str]] = [
+        (table.bbox[1], render_table(table.extract())) for table in tables
+    ]
+    if tables:
+        page = page.filter(_outside([table.bbox for table in tables]))
+    lines = page.extract_text_lines(return_chars=True)
+
+    # The body size is the one most of the page's characters are set in
+    weights: Dict[float, int] = {}
+    for line in lines:
+        size = _line_size(line)
+        weights[size] = weights.get(size, 0) + len(line["chars"])
+    body_size = max(weights, key=weights.get) if weights else 0.0
+
+    paragraph: List[str] = []
+    paragraph_top = 0.0
+    previous_bottom: Optional[float] = None
+
+    def end_paragraph() -> None:
+        if paragraph:
+            blocks.append((paragraph_top, " ".join(paragraph)))
+            paragraph.clear()
+
+    for line in lines:
+        text = normalize_text(line["text"])
+        if not text:
+            continue
+        if body_size and _line_size(line) >= body_size * PDF_HEADING_RATIO:
+            end_paragraph()
+            blocks.append((line["top"], f"### {text}"))
+            previous_bottom = None
+            continue
+        # A gap of more than a line's height starts a new paragraph
+        if previous_bottom is not None and line["top"] - previous_bottom > body_size:
+            end_paragraph()
+        if not paragraph:
+            paragraph_top = line["top"]
+        paragraph.append(text)
+        previous_bottom = line["bottom"]
+    end_paragraph()
+
+    blocks.sort(key=lambda block: block[0])
+    return "\n\n".join(markdown for _, markdown in blocks if markdown)
+
+
+class TierCosts:
+    """Pages extracted and seconds spent per tier, reported in the PDF metadata"""
+
+    def __init__(self):
+        self.costs: Dict[str, List[float]] = {}
+
+    def add(self, tier: str, seconds: float, pages: int = 1) -> None:
+        cost = self.costs.setdefault(tier, [0, 0.0])
+        cost[0] += pages
+        cost[1] += seconds
+
+    def merge(self, other: "TierCosts") -> None:
+        for tier, (pages, seconds) in other.costs.items():
+            self.add(tier, seconds, pages)
+
+    def as_metadata(self) -> List[Dict[str, Union[str, int]]]:
+        # "auto" is the cost of the page statistics the tiers were picked from
+        return [
+            {"tier": tier, "pages": int(pages), "ms": round(seconds * 1000)}
+            for tier, (pages, seconds) in self.costs.items()
+        ]
+
+
+class PDFPageExtractor:
+    """
+    Extracts the pages of one PDF with the requested tier. The document is
+    opened with PyPDF2; pdfplumber only opens it once a page needs its
+    layout.
+
+    extract() returns (page number, text, is markdown): fast pages are raw
+    text, layout pages markdown that is already formatted.
+    """
+
+    def __init__(self, content: bytes, pdf_reader, tier: str = PDF_TIER):
+        if tier not in PDF_TIERS:
+            raise ValueError(f"Unknown PDF tier: {tier}")
+        self.content = content
+        self.pdf_reader = pdf_reader
+        self.tier = tier
+        self.costs = TierCosts()
+        self._plumber = None
+
+    def page_tier(self, page_num: int) -> str:
+        if self.tier != "auto":
+            return self.tier
+        started = time.perf_counter()
+        rules = count_rules(self.pdf_reader.pages[page_num])
+        self.costs.add("auto", time.perf_counter() - started)
+        return "layout" if rules >= PDF_AUTO_MIN_RULES else "fast"
+
+    def extract(self, page_num: int) -> Tuple[int, Optional[str], bool]:
+        tier = self.page_tier(page_num)
+        started = time.perf_counter()
+        if tier == "layout":
+            if self._plumber is None:
+                import pdfplumber
+
+                self._plumber = pdfplumber.open(io.BytesIO(self.content))
+            page = self._plumber.pages[page_num]
+            text = render_layout_page(page)
+            page.close()
+        else:
+            text = self.pdf_reader.pages[page_num].extract_text()
+        self.costs.add(tier, time.perf_counter() - started)
+        return page_num, text, tier == "layout"
+
+    def close(self) -> None:
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
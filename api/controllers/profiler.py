@@ -0,0 +1,186 @@
+import os
+import re
+import sys
+import time
+import hmac
+import uuid
+import random
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Conversion profiling (overridable through the environment / .env file).
+# A /convert request is profiled when it sends PROFILE_HEADER with the value
+# of FRIDA_PROFILE_TOKEN (no token: the header is refused), or at random for
+# a PROFILE_SAMPLE_RATE fraction of requests. Profiles can only be read
+# back with the token.
+PROFILE_HEADER = "X-Frida-Profile"
+PROFILE_TOKEN = os.getenv("FRIDA_PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("FRIDA_PROFILE_SAMPLE_RATE", "0"))
+# Time between two stack samples; samples are never taken more often than
+# the interpreter switches threads (sys.getswitchinterval(), 5 ms by default)
+PROFILE_INTERVAL_MS = float(os.getenv("FRIDA_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv(
+    "FRIDA_PROFILE_DIR", str(Path(__file__).resolve().parents[2] / "tmp" / "profiles")
+)
+# The oldest profiles are deleted beyond this many
+PROFILE_KEEP = int(os.getenv("FRIDA_PROFILE_KEEP", "200"))
+
+PROFILE_NAME = re.compile(r"^[0-9a-f]{32}$")
+
+# The profile of the conversion running in the current request, if it is
+# profiled. The conversion engine checks it for every task it submits.
+active_profile: ContextVar[Optional["ConversionProfile"]] = ContextVar(
+    "active_profile", default=None
+)
+
+_path_prefixes = sorted(
+    {os.path.abspath(path) + os.sep for path in sys.path if path}, key=len, reverse=True
+)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in _path_prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix) :]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread from a background thread and
+    counts identical stacks, in the "folded" format of flamegraph.pl,
+    speedscope and inferno: frames from the outermost, joined by ";".
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        labels = self._labels
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                names.append(label)
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def profiled_call(fn: Callable, *args) -> Tuple[object, Dict[str, int]]:
+    """Run ``fn(*args)`` while sampling this thread; returns its result and the stacks"""
+    sampler = StackSampler(threading.get_ident()).start()
+    try:
+        result = fn(*args)
+    finally:
+        stacks = sampler.stop()
+    return result, stacks
+
+
+class ConversionProfile:
+    """The stacks sampled from every task of one profiled conversion"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.started = time.time()
+        self.stacks: Dict[str, int] = {}
+
+    def add(self, stacks: Dict[str, int]) -> None:
+        for stack, count in stacks.items():
+            self.stacks[stack] = self.stacks.get(stack, 0) + count
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])
+        )
+
+
+def valid_token(header: Optional[str]) -> bool:
+    """Whether ``header`` is the profiling token, compared in constant time"""
+    return (
+        bool(PROFILE_TOKEN)
+        and header is not None
+        and hmac.compare_digest(header.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+    )
+
+
+def should_profile(header: Optional[str]) -> bool:
+    """
+    Whether to profile a request, from its PROFILE_HEADER value and the
+    sample rate. Raises PermissionError for a header with the wrong token.
+    """
+    if header is not None:
+        if not valid_token(header):
+            raise PermissionError("Invalid profiling token")
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def authorize(header: Optional[str]) -> None:
+    """
+    Profiles can only be read with the profiling token. Without one set
+    they can't be read at all: raises LookupError, to answer as if there
+    were no such profile, or PermissionError for a wrong token.
+    """
+    if not PROFILE_TOKEN:
+        raise LookupError("Profile not found")
+    if not valid_token(header):
+        raise PermissionError("Invalid profiling token")
+
+
+class ProfileStore:
+    """
+    Folded-stack profiles on disk, one <id>.folded file each; only the
+    newest ``keep`` are kept. Every method blocks, so call them through a
+    thread.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not PROFILE_NAME.match(profile_id):
+            return None
+        return self.directory / f"{profile_id}.folded"
+
+    def put(self, profile: ConversionProfile) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path(profile.id).write_text(profile.folded(), encoding="utf-8")
+        files = sorted(self.directory.glob("*.folded"), key=lambda path: path.stat().st_mtime)
+        for path in files[: max(0, len(files) - self.keep)]:
+            path.unlink(missing_ok=True)
+
+    def get(self, profile_id: str) -> Optional[Path]:
+        path = self.path(profile_id)
+        if path is None or not path.exists():
+            return None
+        return path
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,224 @@
+import io
+import os
+import time
+import signal
+import zipfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from fastapi import HTTPException
+
+
+# Resource limits of a conversion (overridable through the environment / .env
+# file). Uploads are at most MAX_FILE_SIZE, but a small zip container (DOCX,
+# XLSX) or image can expand to gigabytes once parsed, so:
+# - zip containers whose members add up to more than ZIP_MAX_UNCOMPRESSED_BYTES,
+#   or expand more than ZIP_MAX_RATIO times (past ZIP_RATIO_MIN_BYTES, small
+#   documents often compress better than that), are refused before parsing,
+# - images of more than IMAGE_MAX_PIXELS are refused from their header,
+# - each conversion task may grow its worker process's address space by at
+#   most CONVERSION_MEMORY_MB (0: no limit); a task that needs more fails
+#   with a 413 instead of getting the worker killed.
+ZIP_MAX_UNCOMPRESSED_BYTES = int(
+    os.getenv("FRIDA_ZIP_MAX_UNCOMPRESSED_BYTES", str(512 * 1024 * 1024))
+)
+ZIP_MAX_RATIO = float(os.getenv("FRIDA_ZIP_MAX_RATIO", "100"))
+ZIP_RATIO_MIN_BYTES = int(os.getenv("FRIDA_ZIP_RATIO_MIN_BYTES", str(16 * 1024 * 1024)))
+ZIP_MAX_MEMBERS = int(os.getenv("FRIDA_ZIP_MAX_MEMBERS", "10000"))
+IMAGE_MAX_PIXELS = int(os.getenv("FRIDA_IMAGE_MAX_PIXELS", str(100_000_000)))
+CONVERSION_MEMORY_MB = int(os.getenv("FRIDA_CONVERSION_MEMORY_MB", "1024"))
+# Seconds a conversion may take (0: no limit), with per-format overrides such
+# as "pdf=60,xlsx=30". A worker process is interrupted once its conversion
+# runs out of time: PDFs return the pages extracted so far, other formats
+# fail with a 504. A worker still busy CONVERSION_KILL_GRACE seconds later
+# (stuck in native code) is killed.
+CONVERSION_TIMEOUT = float(os.getenv("FRIDA_CONVERSION_TIMEOUT", "120"))
+CONVERSION_TIMEOUTS = os.getenv("FRIDA_CONVERSION_TIMEOUTS", "pdf=60")
+CONVERSION_KILL_GRACE = float(os.getenv("FRIDA_CONVERSION_KILL_GRACE", "5"))
+
+# The memory used by the conversion running in the current request. The
+# conversion engine adds the peak of every task it submits.
+conversion_memory: ContextVar[Optional["MemoryUsage"]] = ContextVar(
+    "conversion_memory", default=None
+)
+
+# The time.monotonic() deadline of the conversion running in the current
+# request, which the conversion engine passes on to every task it submits.
+# The monotonic clock is system-wide, so worker processes share it.
+conversion_deadline: ContextVar[Optional[float]] = ContextVar(
+    "conversion_deadline", default=None
+)
+
+
+def _mb(size: float) -> str:
+    return f"{size / 1024 / 1024:.0f} MB"
+
+
+def check_zip_container(content: bytes, kind: str) -> None:
+    """
+    Refuse a zip container (DOCX, XLSX) that would expand past the limits,
+    from the sizes in its central directory. zipfile never inflates a member
+    past its declared size, so an archive can't lie its way through.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            members = archive.infolist()
+    except zipfile.BadZipFile:
+        # Not a zip; the converter reports what is wrong with it
+        return
+
+    if len(members) > ZIP_MAX_MEMBERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{kind} has {len(members)} parts, more than the {ZIP_MAX_MEMBERS} allowed",
+        )
+    expanded = sum(member.file_size for member in members)
+    if expanded > ZIP_MAX_UNCOMPRESSED_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{kind} expands to {_mb(expanded)}, more than the {_mb(ZIP_MAX_UNCOMPRESSED_BYTES)} allowed",
+        )
+    if expanded > ZIP_RATIO_MIN_BYTES and expanded > len(content) * ZIP_MAX_RATIO:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{kind} expands {expanded / max(1, len(content)):.0f} times, more than the {ZIP_MAX_RATIO:g} allowed",
+        )
+
+
+def check_image_pixels(width: int, height: int) -> None:
+    """Refuse an image that would decode to more than IMAGE_MAX_PIXELS"""
+    if width * height > IMAGE_MAX_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image of {width}x{height} pixels is larger than the {IMAGE_MAX_PIXELS} pixels allowed",
+        )
+
+
+def memory_status(field: str) -> Optional[int]:
+    """A size in bytes from /proc/self/status (VmRSS, VmHWM, VmSize...), None off Linux"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset this process's peak resident memory (VmHWM) to its current size"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryUsage:
+    """
+    The largest growth of a worker's resident memory over the tasks of one
+    conversion, reported as the ``peak_memory_bytes`` of its metadata.
+    """
+
+    def __init__(self):
+        self.peak: Optional[int] = None
+
+    def add(self, peak: Optional[int]) -> None:
+        if peak is not None:
+            self.peak = max(self.peak or 0, peak)
+
+
+class ConversionTimeout(Exception):
+    """Raised in a conversion task that ran out of time"""
+
+
+def caused_by(error: Optional[BaseException], kind: type) -> bool:
+    """Whether ``error`` is, or was raised while handling, a ``kind`` exception"""
+    while error is not None:
+        if isinstance(error, kind):
+            return True
+        error = error.__context__
+    return False
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """Parse a "fmt=seconds,fmt=seconds" timeout specification"""
+    timeouts = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        fmt, seconds = item.split("=", 1)
+        if fmt.strip():
+            timeouts[fmt.strip()] = float(seconds)
+    return timeouts
+
+
+_timeouts = parse_timeouts(CONVERSION_TIMEOUTS)
+_task = threading.local()
+
+
+def timeout_for(fmt: str) -> Optional[float]:
+    """The time budget of a conversion of ``fmt`` in seconds, None without one"""
+    seconds = _timeouts.get(fmt, CONVERSION_TIMEOUT)
+    return seconds if seconds > 0 else None
+
+
+def check_deadline() -> None:
+    """Raise ConversionTimeout if the task running on this thread is out of time"""
+    deadline = getattr(_task, "deadline", None)
+    if deadline is not None and time.monotonic() >= deadline:
+        raise ConversionTimeout("Conversion ran out of time")
+
+
+def _expire(signum, frame) -> None:
+    raise ConversionTimeout("Conversion ran out of time")
+
+
+@contextmanager
+def time_limit(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Stop the task running on this thread at the time.monotonic()
+    ``deadline`` (None: no limit). In the main thread of a worker process a
+    timer interrupts it wherever it is in Python code, and again every
+    second in case library code swallows the exception; elsewhere it only
+    stops at check_deadline() calls.
+    """
+    if deadline is None:
+        yield
+        return
+    seconds = deadline - time.monotonic()
+    if seconds <= 0:
+        raise ConversionTimeout("Conversion ran out of time")
+
+    previous = getattr(_task, "deadline", None), getattr(_task, "interrupt", False)
+    interrupt = (
+        multiprocessing.parent_process() is not None
+        and threading.current_thread() is threading.main_thread()
+        and hasattr(signal, "setitimer")
+    )
+    _task.deadline = deadline
+    _task.interrupt = interrupt
+    if interrupt:
+        handler = signal.signal(signal.SIGALRM, _expire)
+        signal.setitimer(signal.ITIMER_REAL, seconds, 1.0)
+    try:
+        yield
+    finally:
+        if interrupt:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, handler)
+        _task.deadline, _task.interrupt = previous
+
+
+def stop_interrupts() -> None:
+    """
+    Stop the timer of time_limit() so a task that ran out of time can
+    assemble its partial result; the deadline itself stays.
+    """
+    if getattr(_task, "interrupt", False):
+        signal.setitimer(signal.ITIMER_REAL, 0)
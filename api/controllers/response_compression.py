@@ -0,0 +1,106 @@
+import os
+import gzip
+import time
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from api.controllers.conversion_metrics import ServerTiming
+
+
+# Bodies smaller than this are sent as they are (overridable through the
+# environment / .env file)
+COMPRESS_MIN_BYTES = int(os.getenv("FRIDA_COMPRESS_MIN_BYTES", "1024"))
+
+# Server preference when the client accepts several encodings equally.
+# Levels favour speed: these bodies are compressed once per request.
+ENCODINGS = ["zstd", "br", "gzip"]
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+_available: Dict[str, bool] = {"gzip": True}
+
+
+def encoding_available(encoding: str) -> bool:
+    """brotli and zstandard are optional; encodings without them are never offered"""
+    if encoding not in _available:
+        try:
+            if encoding == "br":
+                import brotli  # noqa: F401
+            elif encoding == "zstd":
+                import zstandard  # noqa: F401
+            _available[encoding] = True
+        except ImportError:
+            _available[encoding] = False
+    return _available[encoding]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header, if any"""
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q and encoding_available(encoding):
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressed_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+    timing: Optional[ServerTiming] = None,
+) -> Response:
+    """
+    Build a response for a pre-rendered body, compressed with the encoding
+    negotiated from the request's Accept-Encoding when it is large enough.
+    With ``timing``, the compression is timed and a Server-Timing header added.
+    """
+    headers = dict(headers or {})
+    vary = headers.get("Vary")
+    headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding:
+        started = time.perf_counter()
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        if timing is not None:
+            timing.since("compress", started)
+    if timing is not None:
+        headers["Server-Timing"] = timing.header()
+    return Response(
+        content=body, status_code=status_code, media_type=media_type, headers=headers
+    )
@@ -0,0 +1,62 @@
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from api.controllers.disk_lru import DiskLRU
+
+
+# Thumbnail storage (overridable through the environment / .env file)
+THUMBNAIL_DIR = os.getenv(
+    "FRIDA_THUMBNAIL_DIR",
+    str(Path(__file__).resolve().parents[2] / "tmp" / "markdown" / "thumbnails"),
+)
+THUMBNAIL_CACHE_BYTES = int(
+    os.getenv("FRIDA_THUMBNAIL_CACHE_BYTES", str(128 * 1024 * 1024))
+)
+
+# <sha256 of the image>-<size>.<extension>
+THUMBNAIL_NAME = re.compile(r"^[0-9a-f]{64}-\d+\.(webp|jpg|png)$")
+THUMBNAIL_MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg", "png": "image/png"}
+
+
+class ThumbnailStore:
+    """
+    Image thumbnails on disk, named after the hash of the original image so
+    identical uploads share one file. The least recently used files are
+    evicted once ``max_bytes`` is exceeded. Every method blocks, so call
+    them from a worker or through a thread.
+    """
+
+    def __init__(self, directory: str = THUMBNAIL_DIR, max_bytes: int = THUMBNAIL_CACHE_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lru = DiskLRU(
+            self.directory, "*/*", max_bytes, lambda name: bool(THUMBNAIL_NAME.match(name))
+        )
+
+    @staticmethod
+    def name_for(digest: str, size: int, extension: str) -> str:
+        return f"{digest}-{size}.{extension}"
+
+    @staticmethod
+    def media_type(name: str) -> str:
+        return THUMBNAIL_MEDIA_TYPES[name.rsplit(".", 1)[1]]
+
+    def path(self, name: str) -> Optional[Path]:
+        """Path of a stored thumbnail, or None for names this store never creates"""
+        if not THUMBNAIL_NAME.match(name):
+            return None
+        return self.directory / name[:2] / name
+
+    def get(self, name: str) -> Optional[Path]:
+        path = self.path(name)
+        if path is None or not self.lru.touch(path):
+            return None
+        return path
+
+    def put(self, name: str, data: bytes) -> None:
+        self.lru.write(self.path(name), data)
+
+
+thumbnail_store = ThumbnailStore()
@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from api.controllers.disk_lru import DiskLRU
+
+
+# Incremental conversion (overridable through the environment / .env file,
+# and per request with ?incremental=). PDF pages and workbook sheets are
+# fingerprinted and their output is kept in the unit store, so a revised
+# document only converts the units that changed.
+INCREMENTAL = os.getenv("FRIDA_INCREMENTAL", "0") == "1"
+UNIT_DIR = os.getenv(
+    "FRIDA_UNIT_DIR",
+    str(Path(__file__).resolve().parents[2] / "tmp" / "markdown" / "units"),
+)
+UNIT_STORE_BYTES = int(os.getenv("FRIDA_UNIT_STORE_BYTES", str(256 * 1024 * 1024)))
+
+# Fingerprints are sha256 hex digests
+UNIT_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+# Keys that don't change what a PDF page's text extracts to: stream data is
+# hashed decoded, so re-compressing a document keeps its fingerprints
+_PDF_SKIPPED_KEYS = {"/Parent", "/Length", "/Filter", "/DecodeParms"}
+
+
+class PageFingerprinter:
+    """
+    Content fingerprints of the pages of one PDF: a hash of the page's
+    boxes, rotation, content streams and resources (fonts, encodings, form
+    XObjects), with references followed. Image data is left out since no
+    tier extracts anything from it. Objects shared by several pages, such
+    as fonts, are hashed once.
+    """
+
+    def __init__(self, salt: str):
+        self.salt = salt.encode("utf-8")
+        self._objects: Dict[Tuple[int, int], bytes] = {}
+
+    def page(self, page) -> str:
+        digest = hashlib.sha256(self.salt)
+        for key in ("/MediaBox", "/CropBox", "/Rotate", "/Resources", "/Contents"):
+            digest.update(key.encode("ascii"))
+            if key in page:
+                self._feed(digest, page.raw_get(key))
+        return digest.hexdigest()
+
+    def _feed(self, digest, obj) -> None:
+        from PyPDF2.generic import (
+            ArrayObject,
+            DictionaryObject,
+            IndirectObject,
+            StreamObject,
+        )
+
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            hashed = self._objects.get(key)
+            if hashed is None:
+                # Marks the object while it is hashed, in case it refers to itself
+                self._objects[key] = b"cycle"
+                sub = hashlib.sha256()
+                self._feed(sub, obj.get_object())
+                hashed = self._objects[key] = sub.digest()
+            digest.update(hashed)
+        elif isinstance(obj, DictionaryObject):
+            digest.update(b"<<")
+            for key, value in sorted(obj.items()):
+                if key in _PDF_SKIPPED_KEYS:
+                    continue
+                digest.update(key.encode("utf-8"))
+                self._feed(digest, value)
+            if isinstance(obj, StreamObject) and obj.get("/Subtype") != "/Image":
+                digest.update(obj.get_data())
+            digest.update(b">>")
+        elif isinstance(obj, ArrayObject):
+            digest.update(b"[")
+            for item in obj:
+                self._feed(digest, item)
+            digest.update(b"]")
+        else:
+            digest.update(f"{type(obj).__name__}:{obj!r};".encode("utf-8"))
+
+
+class UnitStore:
+    """
+    Converted units (PDF pages, workbook sheets) on disk as JSON, one file
+    per content fingerprint so every document sharing a unit reuses it. The
+    least recently used files are evicted once ``max_bytes`` is exceeded.
+    Every method blocks, so call them through a thread.
+    """
+
+    def __init__(self, directory: str = UNIT_DIR, max_bytes: int = UNIT_STORE_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lru = DiskLRU(self.directory, "*/*.json", max_bytes)
+
+    def path(self, fingerprint: str) -> Optional[Path]:
+        if not UNIT_NAME.match(fingerprint):
+            return None
+        return self.directory / fingerprint[:2] / f"{fingerprint}.json"
+
+    def get_many(self, fingerprints: Iterable[str]) -> Dict[str, object]:
+        """The stored units among ``fingerprints``"""
+        units = {}
+        for fingerprint in set(fingerprints):
+            path = self.path(fingerprint)
+            if path is None:
+                continue
+            try:
+                units[fingerprint] = json.loads(path.read_bytes())
+                self.lru.touch(path)  # Mark as recently used for eviction
+            except (FileNotFoundError, ValueError):
+                continue
+        return units
+
+    def put_many(self, units: Dict[str, object]) -> None:
+        for fingerprint, unit in units.items():
+            path = self.path(fingerprint)
+            if path is None:
+                continue
+            self.lru.write(path, json.dumps(unit, ensure_ascii=False).encode("utf-8"))
+
+
+unit_store = UnitStore()
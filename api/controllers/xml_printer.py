@@ -0,0 +1,256 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from api.controllers.markdown_writer import MarkdownWriter
+
+
+# Bytes handed to the XML parser at a time; the parsed tree never holds more
+# than the open elements and the children of one chunk
+XML_CHUNK_BYTES = 64 * 1024
+# Raw bytes shown for a document that isn't well-formed (overridable through
+# the environment / .env file)
+XML_PREVIEW_BYTES = int(os.getenv("FRIDA_XML_PREVIEW_BYTES", "4096"))
+# Finished children are dropped from their parent in batches of this size
+_RELEASE_CHILDREN = 64
+_FLUSH_LINES = 4096
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+INDENT = "\t"
+
+
+def _text(text: str) -> str:
+    return escape(text) if "&" in text or "<" in text or ">" in text else text
+
+
+def _attribute(value: str) -> str:
+    if any(char in value for char in '&<>"\n\r\t'):
+        return quoteattr(value)
+    return f'"{value}"'
+
+
+class XMLStats:
+    """What write_pretty_xml learned about a document while printing it"""
+
+    def __init__(self):
+        self.root: Optional[str] = None
+        self.namespaces: Dict[str, str] = {}  # xmlns attribute -> URI, first seen
+        self.elements = 0
+        self.attributes = 0
+        self.comments = 0
+        self.depth = 0
+        self.tags: Dict[str, int] = {}
+
+    def top_tags(self, limit: int = 10) -> List[Dict[str, object]]:
+        counts = sorted(self.tags.items(), key=lambda item: -item[1])[:limit]
+        return [{"tag": tag, "count": count} for tag, count in counts]
+
+
+class _EventTarget:
+    """
+    Parser target that builds the tree like TreeBuilder, comments and
+    processing instructions included, and queues the events XMLPullParser
+    would report for it.
+    """
+
+    def __init__(self):
+        self.builder = ET.TreeBuilder(insert_comments=True, insert_pis=True)
+        self.events: List[tuple] = []
+
+    def start(self, tag, attrib):
+        self.events.append(("start", self.builder.start(tag, attrib)))
+
+    def end(self, tag):
+        self.events.append(("end", self.builder.end(tag)))
+
+    def data(self, data):
+        self.builder.data(data)
+
+    def comment(self, text):
+        self.events.append(("comment", self.builder.comment(text)))
+
+    def pi(self, target, data=None):
+        self.events.append(("pi", self.builder.pi(target, data)))
+
+    def start_ns(self, prefix, uri):
+        self.events.append(("start-ns", (prefix or "", uri)))
+
+    def end_ns(self, prefix):
+        self.events.append(("end-ns", None))
+
+    def close(self):
+        return self.builder.close()
+
+    def read_events(self) -> List[tuple]:
+        events, self.events = self.events, []
+        return events
+
+
+class _XMLPrinter:
+    """Turns parser events into indented lines"""
+
+    def __init__(self, writer: MarkdownWriter, stats: XMLStats):
+        self.writer = writer
+        self.stats = stats
+        # Open elements as [element, printed name, finished children]
+        self.stack: List[list] = []
+        # An element whose start tag waits until we know if it has children
+        self.pending: Optional[ET.Element] = None
+        self.pending_tag = ""
+        # The last finished node, whose tail text is complete at the next event
+        self.closed: Optional[ET.Element] = None
+        self.declarations: List[str] = []
+        self.prefixes: Dict[str, List[str]] = {XML_NAMESPACE: ["xml"]}
+        self.scopes: List[str] = []
+        self.indents = [""]
+        self.lines: List[str] = []
+
+    def indent(self, depth: int) -> str:
+        while len(self.indents) <= depth:
+            self.indents.append(self.indents[-1] + INDENT)
+        return self.indents[depth]
+
+    def name(self, tag: str, attribute: bool = False) -> str:
+        """Print {uri}local names with the prefix declared for the URI"""
+        if tag[:1] != "{":
+            return tag
+        uri, local = tag[1:].split("}", 1)
+        prefixes = self.prefixes.get(uri)
+        if prefixes:
+            prefix = prefixes[-1]
+            if attribute and not prefix:
+                # Attributes aren't in the default namespace: use another prefix
+                prefix = next((p for p in reversed(prefixes) if p), "")
+            if prefix or not attribute:
+                return f"{prefix}:{local}" if prefix else local
+        return tag
+
+    def write_line(self, depth: int, text: str) -> None:
+        self.lines.append(self.indent(depth) + text + "\n")
+        if len(self.lines) >= _FLUSH_LINES:
+            self.flush_lines()
+
+    def flush_lines(self) -> None:
+        # One string per batch of lines rather than per line
+        self.writer.write("".join(self.lines))
+        self.lines.clear()
+
+    def flush_pending(self) -> None:
+        """Print the waiting start tag and text of an element that has children"""
+        element = self.pending
+        if element is None:
+            return
+        self.pending = None
+        depth = len(self.stack) - 1
+        self.write_line(depth, f"<{self.pending_tag}>")
+        if element.text and element.text.strip():
+            self.write_line(depth + 1, _text(element.text.strip()))
+
+    def finish_closed(self) -> None:
+        """Print the tail of the last finished node and release finished children"""
+        node = self.closed
+        if node is None:
+            return
+        self.closed = None
+        if node.tail and node.tail.strip():
+            self.write_line(len(self.stack), _text(node.tail.strip()))
+        if self.stack:
+            entry = self.stack[-1]
+            entry[2] += 1
+            if entry[2] >= _RELEASE_CHILDREN:
+                del entry[0][: entry[2]]
+                entry[2] = 0
+
+    def handle(self, events) -> None:
+        stats = self.stats
+        for event, node in events:
+            if event == "start-ns":
+                prefix, uri = node
+                self.prefixes.setdefault(uri, []).append(prefix)
+                self.scopes.append(uri)
+                attribute = f"xmlns:{prefix}" if prefix else "xmlns"
+                self.declarations.append(f"{attribute}={_attribute(uri)}")
+                stats.namespaces.setdefault(attribute, uri)
+                continue
+            if event == "end-ns":
+                self.prefixes[self.scopes.pop()].pop()
+                continue
+
+            self.finish_closed()
+            if event == "start":
+                self.flush_pending()
+                name = self.name(node.tag)
+                attributes = self.declarations + [
+                    f"{self.name(key, attribute=True)}={_attribute(value)}"
+                    for key, value in node.attrib.items()
+                ]
+                self.declarations = []
+                self.stack.append([node, name, 0])
+                self.pending = node
+                self.pending_tag = " ".join([name] + attributes)
+
+                stats.elements += 1
+                stats.attributes += len(node.attrib)
+                stats.tags[name] = stats.tags.get(name, 0) + 1
+                if len(self.stack) > stats.depth:
+                    stats.depth = len(self.stack)
+                if stats.root is None:
+                    stats.root = name
+            elif event == "end":
+                _, name, _ = self.stack.pop()
+                depth = len(self.stack)
+                if self.pending is node:
+                    # No children: print the element on one line
+                    self.pending = None
+                    text = node.text.strip() if node.text else ""
+                    if text:
+                        self.write_line(
+                            depth, f"<{self.pending_tag}>{_text(text)}</{name}>"
+                        )
+                    else:
+                        self.write_line(depth, f"<{self.pending_tag}/>")
+                else:
+                    self.write_line(depth, f"</{name}>")
+                del node[:]
+                self.closed = node
+            else:
+                self.flush_pending()
+                text = node.text or ""
+                if event == "comment":
+                    stats.comments += 1
+                    self.write_line(len(self.stack), f"<!--{text}-->")
+                else:
+                    self.write_line(len(self.stack), f"<?{text}?>")
+                self.closed = node
+
+    def finish(self) -> None:
+        self.finish_closed()
+        self.flush_lines()
+
+
+def write_pretty_xml(content: bytes, writer: MarkdownWriter) -> XMLStats:
+    """
+    Write ``content`` to ``writer`` as indented XML while parsing it in
+    chunks. Elements are printed as soon as their children are known and
+    dropped from the tree afterwards, so memory follows the nesting depth
+    rather than the size of the document. Whitespace around text is
+    trimmed and namespaces keep the prefixes the document declared.
+
+    Raises xml.etree.ElementTree.ParseError if the document isn't well-formed.
+    """
+    stats = XMLStats()
+    printer = _XMLPrinter(writer, stats)
+    # Comments and processing instructions go into the tree so the text
+    # around them stays split where they were
+    target = _EventTarget()
+    parser = ET.XMLParser(target=target)
+
+    writer.write('<?xml version="1.0" ?>\n')
+    view = memoryview(content)
+    for start in range(0, len(view), XML_CHUNK_BYTES):
+        parser.feed(view[start : start + XML_CHUNK_BYTES])
+        printer.handle(target.read_events())
+    parser.close()
+    printer.handle(target.read_events())
+    printer.finish()
+    return stats
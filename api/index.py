@@ -1,11 +1,45 @@
+from api.config.startup import mark_ready, startup_report, timed_import, warm_up
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.route.converter import router as converter_router
-from api.route.user_routes import  user_routes
-from api.route.message import message_routes
+from fastapi.responses import PlainTextResponse
+
+# Imported through timed_import so /api/py/startup can report their cost
+converter = timed_import("api.route.converter")
+batch = timed_import("api.route.batch")
+jobs = timed_import("api.route.jobs")
+history = timed_import("api.route.history")
+user_routes = timed_import("api.route.user_routes").user_routes
+message_routes = timed_import("api.route.message").message_routes
+from api.controllers.conversion_engine import conversion_engine
+from api.controllers.conversion_metrics import conversion_metrics
+from api.controllers.job_controller import job_controller
 #from api.route.upload import router as upload_router
 
-app = FastAPI()
+
+def warm_up_conversions() -> None:
+    """Load the format libraries here and in the converter worker pools"""
+    converter.converter_registry.load_libraries()
+    conversion_engine.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The job controller opens its store on first use, not here
+    # Pre-warm the converter libraries and worker pools; by default in the
+    # background so the app answers right away (see FRIDA_WARM_UP)
+    warm_up_task = await warm_up(warm_up_conversions)
+    mark_ready()
+    yield
+    if warm_up_task:
+        warm_up_task.cancel()
+    await job_controller.stop()
+    conversion_engine.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,7 +49,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(converter_router, prefix="/api/py")
+app.include_router(converter.router, prefix="/api/py")
+app.include_router(batch.router, prefix="/api/py")
+app.include_router(jobs.router, prefix="/api/py")
+app.include_router(history.router, prefix="/api/py")
 app.include_router(user_routes, prefix="/api/py")
 app.include_router(message_routes, prefix="/api/py")
 ## app.include_router(upload_router, prefix="/api/py")
@@ -25,3 +62,17 @@ app.include_router(message_routes, prefix="/api/py")
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to Frida the FastAPI application!"}
+
+
+@app.get("/api/py/startup")
+async def get_startup_report():
+    """Get boot and warm-up timings and the import cost of each module"""
+    return startup_report()
+
+
+@app.get("/api/py/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Get the conversion metrics in the Prometheus text format"""
+    return PlainTextResponse(
+        conversion_metrics.render(), media_type="text/plain; version=0.0.4"
+    )
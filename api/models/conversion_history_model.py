@@ -0,0 +1,149 @@
+import zlib
+import hashlib
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from bson import ObjectId
+
+
+class ConversionHistoryModel:
+    """
+    Conversion history in MongoDB: one document per owner and uploaded
+    content (by hash) in ``conversion_history``, converting the same file
+    again updates it. Markdown up to ``inline_bytes`` is kept in the
+    document, larger bodies are zlib-compressed into GridFS
+    (``conversion_bodies``), one file per distinct body.
+
+    ``db`` is a pymongo database (or a stand-in such as mongomock's); ``fs``
+    defaults to a GridFS on it.
+    """
+
+    def __init__(self, db, fs=None, inline_bytes: int = 64 * 1024):
+        self.collection = db.conversion_history  # Use the "conversion_history" collection
+        if fs is None:
+            # gridfs pulls in the whole driver; only import it with a database
+            import gridfs
+
+            fs = gridfs.GridFS(db, collection="conversion_bodies")
+        self.fs = fs
+        self.inline_bytes = inline_bytes
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index(
+            [("owner", 1), ("content_hash", 1)], unique=True, name="owner_content_hash"
+        )
+        self.collection.create_index(
+            [("owner", 1), ("converted_at", -1), ("_id", -1)], name="owner_converted_at"
+        )
+
+    def _store_body(self, markdown: str) -> Dict:
+        data = markdown.encode("utf-8")
+        if len(data) <= self.inline_bytes:
+            return {"markdown": markdown, "body_id": None}
+
+        # Identical bodies (the same file under another owner) share a file
+        name = hashlib.sha256(data).hexdigest()
+        stored = self.fs.find_one({"filename": name})
+        if stored is not None:
+            body_id = stored._id
+        else:
+            body_id = self.fs.put(
+                zlib.compress(data, 6),
+                filename=name,
+                metadata={"compression": "zlib", "length": len(data)},
+            )
+        return {"markdown": None, "body_id": body_id}
+
+    def _release_body(self, body_id) -> None:
+        # Delete a GridFS body once no entry refers to it any more
+        if body_id is not None and self.collection.find_one({"body_id": body_id}) is None:
+            self.fs.delete(body_id)
+
+    def record_conversion(
+        self, owner: str, content_hash: str, fields: Dict, markdown: str
+    ) -> str:
+        """
+        Add a conversion to ``owner``'s history, or refresh the entry of an
+        earlier conversion of the same content. Returns the entry id.
+        """
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        # MongoDB keeps milliseconds; truncate so pagination cursors round-trip
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        body = self._store_body(markdown)
+        query = {"owner": owner, "content_hash": content_hash}
+        update = {
+            "$set": {
+                **fields,
+                **body,
+                "markdown_bytes": len(markdown.encode("utf-8")),
+                "converted_at": now,
+            },
+            "$setOnInsert": {"first_converted_at": now},
+            "$inc": {"conversions": 1},
+        }
+        try:
+            previous = self.collection.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Another request inserted the same entry first; update it instead
+            previous = self.collection.find_one_and_update(
+                query, update, return_document=ReturnDocument.BEFORE
+            )
+
+        if previous is None:
+            return str(self.collection.find_one(query, {"_id": 1})["_id"])
+        if previous.get("body_id") != body["body_id"]:
+            self._release_body(previous.get("body_id"))
+        return str(previous["_id"])
+
+    def find_conversions(
+        self,
+        owner: str,
+        limit: int,
+        before: Optional[Tuple[datetime, "ObjectId"]] = None,
+    ) -> List[Dict]:
+        """
+        ``owner``'s entries, newest first and without their markdown,
+        starting after the ``(converted_at, _id)`` of ``before``.
+        """
+        query: Dict = {"owner": owner}
+        if before is not None:
+            converted_at, entry_id = before
+            query["$or"] = [
+                {"converted_at": {"$lt": converted_at}},
+                {"converted_at": converted_at, "_id": {"$lt": entry_id}},
+            ]
+        entries = list(
+            self.collection.find(query, {"markdown": 0})
+            .sort([("converted_at", -1), ("_id", -1)])
+            .limit(limit)
+        )
+        # Convert ObjectIds to strings for easy use in JSON
+        for entry in entries:
+            entry["_id"] = str(entry["_id"])
+            entry.pop("body_id", None)
+        return entries
+
+    def find_conversion_by_id(self, owner: str, entry_id: str) -> Optional[Dict]:
+        """One of ``owner``'s entries with its markdown, None if there is no such entry"""
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        try:
+            query = {"_id": ObjectId(entry_id), "owner": owner}
+        except (InvalidId, TypeError):
+            return None
+        entry = self.collection.find_one(query)
+        if entry is None:
+            return None
+        if entry.get("body_id") is not None:
+            data = self.fs.get(entry["body_id"]).read()
+            entry["markdown"] = zlib.decompress(data).decode("utf-8")
+        entry["_id"] = str(entry["_id"])
+        entry.pop("body_id", None)
+        return entry
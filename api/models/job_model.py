@@ -0,0 +1,182 @@
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+
+JOB_FIELDS = [
+    "id",
+    "status",
+    "filename",
+    "content_type",
+    "size",
+    "upload_path",
+    "result_path",
+    "error",
+    "error_status",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "expires_at",
+    "owner",
+    "lease_expires",
+]
+
+# Columns added after the first release, created on stores that lack them
+JOB_ADDED_COLUMNS = {"owner": "TEXT", "lease_expires": "REAL"}
+
+
+class JobModel:
+    def __init__(self, db_path: str):
+        # SQLite keeps the job store local and persistent without another service
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    content_type TEXT,
+                    size INTEGER,
+                    upload_path TEXT,
+                    result_path TEXT,
+                    error TEXT,
+                    error_status INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    expires_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+            )
+            columns = {
+                row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")
+            }
+            for column, kind in JOB_ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)"
+            )
+
+    def create_job(
+        self,
+        job_id,
+        filename,
+        content_type,
+        size,
+        upload_path,
+        created_at,
+        expires_at,
+        owner=None,
+        lease_expires=None,
+    ):
+        job_data = {
+            "id": job_id,
+            "status": "queued",
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "upload_path": upload_path,
+            "created_at": created_at,
+            "expires_at": expires_at,
+            "owner": owner,
+            "lease_expires": lease_expires,
+        }
+        columns = ", ".join(job_data)
+        placeholders = ", ".join("?" for _ in job_data)
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+                list(job_data.values()),
+            )
+        return job_id
+
+    def find_job_by_id(self, job_id) -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_expired_jobs(self, finished_before: float) -> List[Dict]:
+        """Finished jobs older than ``finished_before``; unfinished jobs never expire"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM jobs WHERE finished_at < ?", (finished_before,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_orphaned_jobs(self, owner: str, now: float, lease_expires: float, limit: int) -> List[str]:
+        """
+        Take over up to ``limit`` unfinished jobs whose owner's lease ran out
+        (it stopped or crashed), oldest first, and queue them again under
+        ``owner``. Returns their ids.
+        """
+        with self.lock, self.connection:
+            # Take the write lock first so two processes can't claim the same jobs
+            self.connection.execute("BEGIN IMMEDIATE")
+            rows = self.connection.execute(
+                """
+                SELECT id FROM jobs
+                WHERE status IN ('queued', 'running')
+                AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY created_at LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            job_ids = [row["id"] for row in rows]
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'queued', owner = ?, lease_expires = ? WHERE id = ?",
+                [(owner, lease_expires, job_id) for job_id in job_ids],
+            )
+        return job_ids
+
+    def start_job(self, job_id, owner: str, started_at: float) -> bool:
+        """Mark a queued job of ``owner`` as running; False if it was deleted or taken over"""
+        with self.lock, self.connection:
+            result = self.connection.execute(
+                """
+                UPDATE jobs SET status = 'running', started_at = ?
+                WHERE id = ? AND owner = ? AND status = 'queued'
+                """,
+                (started_at, job_id, owner),
+            )
+        return result.rowcount > 0
+
+    def renew_leases(self, owner: str, lease_expires: float) -> int:
+        """Extend the lease of ``owner`` on its unfinished jobs"""
+        with self.lock, self.connection:
+            result = self.connection.execute(
+                """
+                UPDATE jobs SET lease_expires = ?
+                WHERE owner = ? AND status IN ('queued', 'running')
+                """,
+                (lease_expires, owner),
+            )
+        return result.rowcount
+
+    def update_job(self, job_id, update_fields: Dict):
+        unknown = set(update_fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        assignments = ", ".join(f"{field} = ?" for field in update_fields)
+        with self.lock, self.connection:
+            result = self.connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                [*update_fields.values(), job_id],
+            )
+        return result.rowcount
+
+    def delete_job(self, job_id):
+        with self.lock, self.connection:
+            result = self.connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return result.rowcount
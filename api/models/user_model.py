@@ -1,5 +1,4 @@
 from bson import ObjectId
-from pymongo.collection import Collection
 
 
 class UserModel:
@@ -0,0 +1,344 @@
+import os
+import io
+import re
+import json
+import time
+import asyncio
+import zipfile
+import mimetypes
+import posixpath
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, File, UploadFile, Query
+from fastapi.responses import StreamingResponse
+
+from api.route.converter import (
+    MAX_FILE_SIZE,
+    SUPPORTED_FORMATS,
+    MarkdownStyler,
+    convert_content,
+    converter_registry,
+    create_error_response,
+    spool_upload,
+)
+
+
+# Batch limits (overridable through the environment / .env file)
+BATCH_CONCURRENCY = int(os.getenv("FRIDA_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.getenv("FRIDA_BATCH_MAX_FILES", "1000"))
+BATCH_MAX_BYTES = int(os.getenv("FRIDA_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+
+ZIP_CONTENT_TYPES = [
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/x-zip",
+]
+
+# Extension -> MIME type for archive entries, preferring the types /convert knows
+EXTENSION_CONTENT_TYPES = {ext: mime for mime, ext in SUPPORTED_FORMATS.items()}
+
+router = APIRouter()
+
+
+class BatchEntry:
+    """One file of a batch: its name, MIME type, size and a blocking loader"""
+
+    def __init__(self, name: str, content_type: str, size: int, load: Callable[[], bytes]):
+        self.name = name
+        self.content_type = content_type
+        self.size = size
+        self.load = load
+
+
+class ZipStream(io.RawIOBase):
+    """Write-only sink that lets ZipFile emit an archive chunk by chunk"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def guess_content_type(name: str) -> str:
+    """Guess the MIME type of an archive entry from its extension"""
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    if extension in EXTENSION_CONTENT_TYPES:
+        return EXTENSION_CONTENT_TYPES[extension]
+    if extension == "jpeg":
+        return "image/jpeg"
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def is_zip_upload(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (
+        file.filename or ""
+    ).lower().endswith(".zip")
+
+
+def safe_path(name: str) -> str:
+    """
+    A client-supplied file or entry name as a relative path that can't leave
+    the directory it is extracted to: backslashes become slashes and drive
+    letters, leading slashes and ``..`` segments are dropped. Empty if
+    nothing is left.
+    """
+    path = re.sub(r"^[A-Za-z]:", "", name.replace("\\", "/"))
+    # Resolving against the root drops the ".." segments that would leave it
+    path = posixpath.normpath("/" + path).lstrip("/")
+    return "" if path == "." else path
+
+
+def output_name(name: str, used: set) -> str:
+    """Name of the markdown file for ``name``, unique within the archive"""
+    base = os.path.splitext(safe_path(name))[0] or "file"
+    candidate = f"{base}.md"
+    counter = 1
+    while candidate in used:
+        counter += 1
+        candidate = f"{base}-{counter}.md"
+    used.add(candidate)
+    return candidate
+
+
+async def read_zip_entries(file: UploadFile) -> Tuple[List[BatchEntry], Callable[[], None]]:
+    """
+    List the files of an uploaded ZIP archive. The archive is copied to a
+    private temporary file because the upload is closed before the response
+    is streamed; entries are only decompressed when they are converted.
+    Returns the entries and a callback that releases the copy.
+    """
+    spool = await spool_upload(file)
+    try:
+        archive = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile:
+        spool.close()
+        raise
+    lock = threading.Lock()
+
+    def loader(info: zipfile.ZipInfo) -> Callable[[], bytes]:
+        def load() -> bytes:
+            with lock:
+                return archive.read(info)
+
+        return load
+
+    entries = []
+    for info in archive.infolist():
+        if info.is_dir() or info.filename.startswith("__MACOSX/"):
+            continue
+        if not safe_path(info.filename):
+            continue  # Nothing but "..", "/" or the like: not a file
+        entries.append(
+            BatchEntry(
+                info.filename,
+                guess_content_type(info.filename),
+                info.file_size,
+                loader(info),
+            )
+        )
+
+    def close() -> None:
+        archive.close()
+        spool.close()
+
+    return entries, close
+
+
+async def read_upload_entries(files: List[UploadFile]) -> List[BatchEntry]:
+    """Read the multipart uploads of a batch into memory"""
+    entries = []
+    for file in files:
+        content = await file.read()
+        entries.append(
+            BatchEntry(
+                file.filename or "file",
+                file.content_type or "application/octet-stream",
+                len(content),
+                lambda content=content: content,
+            )
+        )
+    return entries
+
+
+async def convert_entry(entry: BatchEntry) -> Dict:
+    """Convert one batch entry, recording its status and timing"""
+    started = time.perf_counter()
+    record = {
+        "name": entry.name,
+        "contentType": entry.content_type,
+        "sourceFormat": SUPPORTED_FORMATS.get(entry.content_type, "unknown"),
+        "size": entry.size,
+    }
+    try:
+        if entry.size > MAX_FILE_SIZE:
+            raise ValueError(f"File size exceeds {MAX_FILE_SIZE / 1024 / 1024} MB")
+        content = await asyncio.to_thread(entry.load)
+        fmt, content_type = converter_registry.detect(
+            converter_registry.head(content), entry.name, entry.content_type
+        )
+        record["sourceFormat"] = SUPPORTED_FORMATS.get(content_type, "unknown")
+        result = await convert_content(fmt, content, entry.name, content_type)
+        record["status"] = "ok"
+        record["markdown"] = MarkdownStyler.enhance_markdown(
+            result.markdown, result.metadata
+        )
+        record["metadata"] = result.metadata
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = getattr(e, "detail", None) or str(e)
+    record["elapsedMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+async def iter_batch_results(
+    entries: List[BatchEntry], concurrency: int
+) -> AsyncIterator[Dict]:
+    """
+    Convert entries with at most ``concurrency`` in flight and yield the
+    records in completion order. Entries are loaded lazily, so memory is
+    bounded by the concurrency rather than the size of the batch.
+    """
+    pending = iter(entries)
+    results: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+
+    async def worker():
+        for entry in pending:
+            await results.put(await convert_entry(entry))
+
+    workers = [
+        asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(entries))))
+    ]
+    try:
+        for _ in range(len(entries)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def build_manifest(records: List[Dict], started: float) -> Dict:
+    return {
+        "total": len(records),
+        "succeeded": sum(1 for r in records if r["status"] == "ok"),
+        "failed": sum(1 for r in records if r["status"] != "ok"),
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        "files": records,
+    }
+
+
+async def stream_zip(
+    entries: List[BatchEntry], concurrency: int, close: Optional[Callable[[], None]] = None
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in _stream_zip(entries, concurrency):
+            yield chunk
+    finally:
+        if close:
+            close()
+
+
+async def _stream_zip(entries: List[BatchEntry], concurrency: int) -> AsyncIterator[bytes]:
+    started = time.perf_counter()
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    used_names = {"manifest.json"}
+    records = []
+
+    async for record in iter_batch_results(entries, concurrency):
+        markdown_text = record.pop("markdown", None)
+        record.pop("metadata", None)
+        if markdown_text is not None:
+            record["output"] = output_name(record["name"], used_names)
+            await asyncio.to_thread(archive.writestr, record["output"], markdown_text)
+            yield sink.drain()
+        records.append(record)
+
+    manifest = json.dumps(build_manifest(records, started), indent=2, default=str)
+    archive.writestr("manifest.json", manifest)
+    archive.close()
+    yield sink.drain()
+
+
+async def stream_ndjson(
+    entries: List[BatchEntry], concurrency: int, close: Optional[Callable[[], None]] = None
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    records = []
+    try:
+        async for record in iter_batch_results(entries, concurrency):
+            yield json.dumps({"type": "file", **record}, default=str) + "\n"
+            record.pop("markdown", None)
+            record.pop("metadata", None)
+            records.append(record)
+        yield json.dumps({"type": "manifest", **build_manifest(records, started)}) + "\n"
+    finally:
+        if close:
+            close()
+
+
+@router.post("/convert/batch")
+async def convert_batch(
+    files: List[UploadFile] = File(...),
+    output_format: str = Query("zip", alias="format"),
+    concurrency: Optional[int] = Query(None, ge=1),
+):
+    """
+    Convert several uploaded files, or the files inside a single uploaded
+    ZIP archive, with bounded parallelism. Returns a ZIP of markdown files
+    plus ``manifest.json`` (default) or NDJSON (``?format=ndjson``) with one
+    line per file and a final manifest line.
+    """
+    if output_format not in ("zip", "ndjson"):
+        return create_error_response(400, "format must be 'zip' or 'ndjson'")
+
+    close = None
+    if len(files) == 1 and is_zip_upload(files[0]):
+        try:
+            entries, close = await read_zip_entries(files[0])
+        except zipfile.BadZipFile as e:
+            return create_error_response(400, f"Invalid ZIP archive: {str(e)}")
+    else:
+        total = 0
+        for file in files:
+            file.file.seek(0, 2)
+            total += file.file.tell()
+            file.file.seek(0)
+        if total > BATCH_MAX_BYTES:
+            return create_error_response(
+                400, f"Batch size exceeds {BATCH_MAX_BYTES / 1024 / 1024} MB"
+            )
+        entries = await read_upload_entries(files)
+
+    error = None
+    if not entries:
+        error = "No files to convert"
+    elif len(entries) > BATCH_MAX_FILES:
+        error = f"Batch contains more than {BATCH_MAX_FILES} files"
+    elif sum(entry.size for entry in entries) > BATCH_MAX_BYTES:
+        error = f"Batch size exceeds {BATCH_MAX_BYTES / 1024 / 1024} MB"
+    if error:
+        if close:
+            close()
+        return create_error_response(400, error)
+
+    concurrency = min(concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    if output_format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(entries, concurrency, close), media_type="application/x-ndjson"
+        )
+    return StreamingResponse(
+        stream_zip(entries, concurrency, close),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="markdown.zip"'},
+    )
@@ -1,57 +1,150 @@
 import os
 import io
+import shutil
+import asyncio
+import tempfile
 import re
 import json
-import base64
-from typing import Dict, List, Optional, Tuple, Union
-
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-
-# File processing libraries
-import docx2txt
+import time
+import hashlib
+import uuid
+import warnings
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, PrivateAttr
+
+# File processing libraries. The heavy ones (PyPDF2, mammoth, openpyxl,
+# html2text, PIL) are imported by the converters that use them
+# so that starting the app doesn't pay for all of them; see the ``libraries``
+# of each registered format.
 import csv
-import PyPDF2
-import mammoth
-import openpyxl
-import markdown
-import html2text
+import zipfile
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
-from PIL import Image
+
+if TYPE_CHECKING:
+    import PyPDF2
+
+from api.controllers.conversion_cache import ConversionCache, make_cache_key
+from api.controllers.conversion_engine import conversion_engine
+from api.controllers.conversion_metrics import ServerTiming, conversion_metrics
+from api.controllers.converter_registry import ConverterRegistry, match_prefix
+from api.controllers.history_controller import (
+    HISTORY_ENABLED,
+    HISTORY_OWNER_HEADER,
+    history_owner,
+    record_history,
+)
+from api.controllers.json_printer import write_pretty_json
+from api.controllers.markdown_writer import (
+    MarkdownWriter,
+    TextNormalizer,
+    encode_json_string,
+    normalize_seconds,
+    normalize_text,
+)
+from api.controllers.pdf_layout import (
+    PDF_AUTO_MIN_RULES,
+    PDF_HEADING_RATIO,
+    PDF_TIER,
+    PDF_TIERS,
+    PDFPageExtractor,
+    TierCosts,
+)
+from api.controllers.profiler import (
+    PROFILE_HEADER,
+    ConversionProfile,
+    active_profile,
+    authorize,
+    profile_store,
+    should_profile,
+)
+from api.controllers.resource_limits import (
+    IMAGE_MAX_PIXELS,
+    ConversionTimeout,
+    MemoryUsage,
+    caused_by,
+    check_deadline,
+    check_image_pixels,
+    check_zip_container,
+    conversion_deadline,
+    conversion_memory,
+    stop_interrupts,
+    timeout_for,
+)
+from api.controllers.response_compression import compressed_response
+from api.controllers.thumbnail_store import thumbnail_store
+from api.controllers.unit_store import INCREMENTAL, PageFingerprinter, unit_store
+from api.controllers.xml_printer import XML_PREVIEW_BYTES, write_pretty_xml
 
 
 # Type definitions for clarity
 class ConversionResult(BaseModel):
     markdown: str
-    metadata: Dict[str, Union[str, int, float, List[str], Dict[str, str]]]
+    metadata: Dict[
+        str,
+        Union[
+            str,
+            int,
+            float,
+            List[str],
+            Dict[str, str],
+            List[Dict[str, Union[str, int]]],
+        ],
+    ]
     content_type: str
     preview: Optional[str] = None
+    # Seconds per Server-Timing stage of the conversion that produced this
+    # result; not serialized, so cached copies don't report it
+    _stages: Dict[str, float] = PrivateAttr(default_factory=dict)
+    # sha256 of the converted upload, set by convert_content
+    _content_hash: Optional[str] = PrivateAttr(default=None)
 
 
 # Constants
 MAX_FILE_SIZE = 20 * 1024 * 1024
-SUPPORTED_FORMATS = {
-    # Documents
-    "application/pdf": "pdf",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
-    "application/msword": "doc",
-    "text/plain": "txt",
-    "text/markdown": "md",
-    "text/html": "html",
-    "text/xml": "xml",
-    "application/json": "json",
-    "text/csv": "csv",
-    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
-    # Images
-    "image/jpeg": "jpg",
-    "image/png": "png",
-    "image/gif": "gif",
-    "image/svg+xml": "svg",
-    # Other
-    "application/rtf": "rtf",
-}
+# Large PDFs are split into page shards that are extracted on several workers.
+# Only uploads of at least PDF_SHARD_MIN_BYTES are probed for their page count.
+PDF_SHARD_MIN_BYTES = int(os.getenv("FRIDA_PDF_SHARD_MIN_BYTES", str(256 * 1024)))
+PDF_SHARD_MIN_PAGES = int(os.getenv("FRIDA_PDF_SHARD_MIN_PAGES", "32"))
+PDF_SHARD_PAGES_PER_SHARD = int(os.getenv("FRIDA_PDF_SHARD_PAGES_PER_SHARD", "16"))
+PDF_SHARD_WORKERS = int(os.getenv("FRIDA_PDF_SHARD_WORKERS", "0"))  # 0: the PDF lane size
+# Table rows per frame when streaming CSV conversions
+CSV_STREAM_FRAME_ROWS = int(os.getenv("FRIDA_CSV_STREAM_FRAME_ROWS", "500"))
+# Rows/columns (0: all) rendered per worksheet, with per-sheet overrides such
+# as "Summary=500x20,Data=50". Workbooks of at least XLSX_PARALLEL_MIN_BYTES
+# render their sheets on several workers.
+XLSX_ROW_WINDOW = int(os.getenv("FRIDA_XLSX_ROW_WINDOW", "100"))
+XLSX_COLUMN_WINDOW = int(os.getenv("FRIDA_XLSX_COLUMN_WINDOW", "0"))
+XLSX_PARALLEL_MIN_BYTES = int(os.getenv("FRIDA_XLSX_PARALLEL_MIN_BYTES", str(256 * 1024)))
+# Image previews are thumbnails of at most THUMBNAIL_SIZE pixels a side in
+# THUMBNAIL_FORMAT (webp, jpg or png), served from THUMBNAIL_URL. Images
+# that would decode to more than THUMBNAIL_MAX_PIXELS get no preview.
+THUMBNAIL_SIZE = int(os.getenv("FRIDA_THUMBNAIL_SIZE", "256"))
+THUMBNAIL_FORMAT = os.getenv("FRIDA_THUMBNAIL_FORMAT", "webp")
+THUMBNAIL_QUALITY = int(os.getenv("FRIDA_THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_MAX_PIXELS = int(os.getenv("FRIDA_THUMBNAIL_MAX_PIXELS", str(50_000_000)))
+THUMBNAIL_URL = os.getenv("FRIDA_THUMBNAIL_URL", "/api/py/convert/thumbnails")
 
 # File converter router
 router = APIRouter()
@@ -99,6 +192,11 @@ class MarkdownStyler:
         Returns:
             str: Enhanced markdown with styling and metadata
         """
+        return MarkdownStyler.build_header(metadata) + markdown_text
+
+    @staticmethod
+    def build_header(metadata: Dict) -> str:
+        """Build the styled metadata header that enhance_markdown puts before the content"""
         # Create a styled header section
         header_sections = []
 
@@ -126,7 +224,18 @@ class MarkdownStyler:
                             f"{k}: {v}"
                             for k, v in metadata.items()
                             if k
-                            not in ["filename", "content_type", "size", "page_count"]
+                            not in [
+                                "filename",
+                                "content_type",
+                                "size",
+                                "page_count",
+                                "pdf_tier",
+                                "extraction",
+                                "peak_memory_bytes",
+                                "reused_pages",
+                                "partial",
+                                "pages_converted",
+                            ]
                         ]
                     )
                 )
@@ -145,22 +254,14 @@ class MarkdownStyler:
             )
 
         # Combine header sections
-        enhanced_markdown = "\n\n".join(header_sections) + "\n\n" + markdown_text
-
-        return enhanced_markdown
+        return "\n\n".join(header_sections) + "\n\n"
 
 
 def clean_text(text: str) -> str:
     """Clean extracted text for better markdown compatibility"""
-    # Remove excessive whitespace
-    cleaned_text = re.sub(r"\s+", " ", text)
-    # Remove control characters
-    cleaned_text = re.sub(r"[\x00-\x1F\x7F]", "", cleaned_text)
-    # Replace tabs with spaces
-    cleaned_text = cleaned_text.replace("\t", "    ")
-    # Ensure proper line breaks
-    cleaned_text = re.sub(r"(\r\n|\r|\n){3,}", "\n\n", cleaned_text)
-    return cleaned_text.strip()
+    # Collapse whitespace and remove control characters; tabs and line breaks
+    # are whitespace too, so nothing else is left to fix up afterwards
+    return normalize_text(text)
 
 
 def extract_metadata(file: UploadFile, content_type: str) -> Dict:
@@ -175,62 +276,231 @@ def extract_metadata(file: UploadFile, content_type: str) -> Dict:
     return basic_metadata
 
 
-async def convert_pdf_to_markdown(file: UploadFile) -> ConversionResult:
-    """Convert PDF files to markdown"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(file.file)
-        text = ""
-        metadata = {
-            "page_count": len(pdf_reader.pages),
-            "title": file.filename,
+def extract_pdf_metadata(pdf_reader: "PyPDF2.PdfReader", filename: Optional[str]) -> Dict:
+    """Read page count and document info from an opened PDF"""
+    metadata = {
+        "page_count": len(pdf_reader.pages),
+        "title": filename,
+    }
+
+    # Get document info if available
+    if pdf_reader.metadata:
+        info = pdf_reader.metadata
+        if info.title:
+            metadata["title"] = info.title
+        if info.author:
+            metadata["author"] = info.author
+        if info.subject:
+            metadata["subject"] = info.subject
+        if info.creator:
+            metadata["creator"] = info.creator
+
+    return metadata
+
+
+def iter_pdf_markdown(stream: BinaryIO, filename: Optional[str]) -> Iterator[Dict]:
+    """
+    Convert a PDF page by page for streaming responses.
+
+    Yields a header frame with the document metadata followed by one frame
+    per page as soon as its text has been extracted.
+    """
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(stream)
+    metadata = extract_pdf_metadata(pdf_reader, filename)
+    yield {
+        "type": "header",
+        "markdown": f"# {metadata.get('title', 'PDF Document')}",
+        "metadata": metadata,
+    }
+
+    for page_num, page in enumerate(pdf_reader.pages):
+        check_deadline()
+        page_text = page.extract_text()
+        yield {
+            "type": "page",
+            "page": page_num + 1,
+            "markdown": (
+                f"## Page {page_num + 1}\n\n{clean_text(page_text)}" if page_text else ""
+            ),
         }
 
-        # Extract text from all pages
-        for page_num, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            if page_text:
-                text += f"\n\n## Page {page_num + 1}\n\n{page_text}"
-
-        # Get document info if available
-        if pdf_reader.metadata:
-            info = pdf_reader.metadata
-            if info.title:
-                metadata["title"] = info.title
-            if info.author:
-                metadata["author"] = info.author
-            if info.subject:
-                metadata["subject"] = info.subject
-            if info.creator:
-                metadata["creator"] = info.creator
-
-        # Clean the text
-        markdown_text = clean_text(text)
-
-        # Format with proper markdown
-        markdown_text = f"# {metadata.get('title', 'PDF Document')}\n\n{markdown_text}"
 
-        return ConversionResult(
-            markdown=markdown_text, metadata=metadata, content_type="application/pdf"
+def stream_pdf_frames(content: bytes, filename: Optional[str]) -> Iterator[Dict]:
+    """iter_pdf_markdown on uploaded bytes, to stream from a conversion worker"""
+    return iter_pdf_markdown(io.BytesIO(content), filename)
+
+
+def build_pdf_result(
+    pages: Iterable[Tuple[int, Optional[str], bool]],
+    metadata: Dict,
+    costs: Optional[TierCosts] = None,
+) -> ConversionResult:
+    """
+    Assemble extracted (page number, text, is markdown) pages into the PDF
+    markdown document. ``costs`` is read once all pages are consumed. If
+    fewer pages than the document's come (the extraction ran out of time),
+    the result is marked partial.
+    """
+    writer = MarkdownWriter()
+    writer.write(f"# {metadata.get('title', 'PDF Document')}\n\n")
+    converted = 0
+
+    # Clean the text pages as they are added, as clean_text would the joined
+    # text; pages rendered by the layout tier are already markdown and keep
+    # their line breaks
+    normalizer: Optional[TextNormalizer] = TextNormalizer(writer)
+    started = False
+    for page_num, page_text, is_markdown in pages:
+        converted += 1
+        if not page_text:
+            continue
+        if is_markdown:
+            if normalizer is not None:
+                normalizer.close()
+                normalizer = None
+            separator = "\n\n" if started else ""
+            writer.write(f"{separator}## Page {page_num + 1}\n\n{page_text}")
+        else:
+            if normalizer is None:
+                writer.write("\n\n")
+                normalizer = TextNormalizer(writer)
+            normalizer.feed(f"\n\n## Page {page_num + 1}\n\n")
+            normalizer.feed(page_text)
+        started = True
+    if normalizer is not None:
+        normalizer.close()
+    if costs is not None:
+        metadata["extraction"] = costs.as_metadata()
+    if converted < metadata.get("page_count", 0):
+        metadata["partial"] = "timeout"
+        metadata["pages_converted"] = converted
+        writer.write(
+            f"\n\n*Conversion ran out of time: {converted} of "
+            f"{metadata['page_count']} pages were converted.*"
         )
+
+    return ConversionResult(
+        markdown=writer.getvalue(), metadata=metadata, content_type="application/pdf"
+    )
+
+
+def pdf_to_markdown(
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    tier: str = PDF_TIER,
+) -> ConversionResult:
+    """Convert PDF files to markdown with the given extraction tier"""
+    try:
+        import PyPDF2
+
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+        metadata = extract_pdf_metadata(pdf_reader, filename)
+        metadata["pdf_tier"] = tier
+
+        # Extract all pages, or as many as there is time for
+        extractor = PDFPageExtractor(content, pdf_reader, tier)
+        try:
+            pages = extract_pdf_pages(extractor, range(len(pdf_reader.pages)))
+            return build_pdf_result(pages, metadata, extractor.costs)
+        finally:
+            extractor.close()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
 
 
-async def convert_docx_to_markdown(file: UploadFile) -> ConversionResult:
+def extract_pdf_pages(
+    extractor: PDFPageExtractor, page_numbers: Iterable[int]
+) -> Iterator[Tuple[int, Optional[str], bool]]:
+    """
+    Extract pages in order until the task runs out of time (see
+    time_limit); the pages extracted by then are still worth returning.
+    """
+    for page_num in page_numbers:
+        try:
+            check_deadline()
+            page = extractor.extract(page_num)
+        except Exception as e:
+            # pdfplumber wraps the timeout in its own exceptions
+            if not caused_by(e, ConversionTimeout):
+                raise
+            stop_interrupts()
+            return
+        yield page
+
+
+def pdf_probe(content: bytes, filename: Optional[str]) -> Dict:
+    """Open a PDF and return its metadata without extracting any text"""
+    import PyPDF2
+
+    return extract_pdf_metadata(PyPDF2.PdfReader(io.BytesIO(content)), filename)
+
+
+def pdf_fingerprints(
+    content: bytes, filename: Optional[str], tier: str = PDF_TIER
+) -> Tuple[Dict, List[str]]:
+    """Open a PDF and return its metadata and the fingerprint of each page for ``tier``"""
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    # Page output also depends on the converter and tier settings
+    fingerprinter = PageFingerprinter(
+        f"{CONVERTER_VERSION}\0{tier}\0{PDF_AUTO_MIN_RULES}\0{PDF_HEADING_RATIO}"
+    )
+    return (
+        extract_pdf_metadata(pdf_reader, filename),
+        [fingerprinter.page(page) for page in pdf_reader.pages],
+    )
+
+
+def pdf_extract_pages(
+    content: bytes, page_numbers: Iterable[int], tier: str = PDF_TIER
+) -> Tuple[List[Tuple[int, Optional[str], bool]], TierCosts]:
+    """
+    Extract the given pages (one shard of a large PDF, or the pages of a
+    revision that changed); returns the pages, fewer if the shard ran out
+    of time, and what each tier cost
+    """
+    import PyPDF2
+
+    extractor = PDFPageExtractor(content, PyPDF2.PdfReader(io.BytesIO(content)), tier)
+    try:
+        pages = list(extract_pdf_pages(extractor, page_numbers))
+        return pages, extractor.costs
+    finally:
+        extractor.close()
+
+
+def split_page_range(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split ``range(page_count)`` into ``shards`` contiguous, near-equal ranges"""
+    size, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def docx_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Convert DOCX files to markdown"""
     try:
-        # Save temporarily
-        content = await file.read()
-        file.file.seek(0)  # Reset file pointer
+        import mammoth
 
+        check_zip_container(content, "DOCX file")
         # Use mammoth for better conversion with styles
         result = mammoth.convert_to_markdown(io.BytesIO(content))
         markdown_text = result.value
 
         # Extract basic metadata
         metadata = {
-            "filename": file.filename,
-            "content_type": file.content_type,
+            "filename": filename,
+            "content_type": content_type,
             "size": len(content),
             "messages": [message.message for message in result.messages],
         }
@@ -240,35 +510,35 @@ async def convert_docx_to_markdown(file: UploadFile) -> ConversionResult:
             metadata=metadata,
             content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting DOCX: {str(e)}")
 
 
-async def convert_txt_to_markdown(file: UploadFile) -> ConversionResult:
+def txt_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Convert plain text files to markdown"""
     try:
-        content = await file.read()
-        file.file.seek(0)
-
         # Decode text content
         text = content.decode("utf-8", errors="replace")
 
-        # For text files, we'll add basic formatting
-        lines = text.split("\n")
-
-        # Try to identify a title (first non-empty line)
-        title = file.filename
-        for line in lines:
-            if line.strip():
-                title = line.strip()
-                break
+        # Try to identify a title (first non-empty line) without splitting
+        # the whole text into lines
+        title = filename
+        first = re.search(r"\S", text)
+        if first:
+            start = text.rfind("\n", 0, first.start()) + 1
+            end = text.find("\n", first.start())
+            title = text[start : end if end >= 0 else len(text)].strip()
 
         markdown_text = f"# {title}\n\n{text}"
 
         return ConversionResult(
             markdown=markdown_text,
             metadata={
-                "filename": file.filename,
+                "filename": filename,
                 "content_type": "text/plain",
                 "size": len(content),
             },
@@ -280,34 +550,24 @@ async def convert_txt_to_markdown(file: UploadFile) -> ConversionResult:
         )
 
 
-async def convert_html_to_markdown(file: UploadFile) -> ConversionResult:
+def html_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Convert HTML files to markdown"""
     try:
-        content = await file.read()
-        file.file.seek(0)
-
-        # Decode HTML content
-        html_content = content.decode("utf-8", errors="replace")
+        from api.controllers.html_engine import convert_html
 
-        # Use html2text for conversion
-        converter = html2text.HTML2Text()
-        converter.ignore_links = False
-        converter.ignore_images = False
-        converter.body_width = 0  # No wrapping
-
-        markdown_text = converter.handle(html_content)
-
-        # Extract title if available
-        title = file.filename
-        soup = BeautifulSoup(html_content, "html.parser")
-        if soup.title and soup.title.string:
-            title = soup.title.string.strip()
+        # One pass over the document renders the markdown and collects the
+        # title, headings and link/image counts
+        markdown_text, html_metadata = convert_html(content)
+        title = html_metadata.pop("title") or filename
 
         metadata = {
-            "filename": file.filename,
+            "filename": filename,
             "content_type": "text/html",
             "size": len(content),
             "title": title,
+            **html_metadata,
         }
 
         return ConversionResult(
@@ -317,52 +577,78 @@ async def convert_html_to_markdown(file: UploadFile) -> ConversionResult:
         raise HTTPException(status_code=500, detail=f"Error converting HTML: {str(e)}")
 
 
-async def convert_csv_to_markdown(file: UploadFile) -> ConversionResult:
-    """Convert CSV files to markdown tables"""
-    try:
-        content = await file.read()
-        file.file.seek(0)
+def iter_csv_table(
+    lines: Iterable[str],
+    stats: Dict,
+    max_rows: Optional[int] = None,
+    sample_every: int = 1,
+) -> Iterator[str]:
+    """
+    Render CSV lines as markdown table rows one at a time.
 
-        # Decode CSV content
-        text = content.decode("utf-8", errors="replace")
+    ``stats`` receives the total ``rows`` (header included), ``columns`` and
+    ``rendered_rows`` while rendering. Data rows can be capped with
+    ``max_rows`` and thinned to every ``sample_every``-th row; skipped rows
+    are still counted.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    columns = len(header)
+    stats.update(rows=1, columns=columns, rendered_rows=0)
+    yield "| " + " | ".join(header) + " |\n"
+    yield "| " + " | ".join(["---" for _ in header]) + " |\n"
+
+    # Add data rows
+    for index, row in enumerate(reader):
+        stats["rows"] += 1
+        if index % sample_every or (
+            max_rows is not None and stats["rendered_rows"] >= max_rows
+        ):
+            continue
+        stats["rendered_rows"] += 1
+        # Ensure row has the same number of columns as header
+        padded_row = row + [""] * (columns - len(row))
+        yield "| " + " | ".join(padded_row[:columns]) + " |\n"
+
+
+def open_csv_text(stream: BinaryIO) -> io.TextIOWrapper:
+    """Decode a CSV byte stream incrementally"""
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
 
-        # Parse CSV
-        reader = csv.reader(io.StringIO(text))
-        rows = list(reader)
 
-        if not rows:
+def csv_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
+    """Convert CSV files to markdown tables"""
+    try:
+        # Add title, then the table rows as they are rendered
+        writer = MarkdownWriter()
+        writer.write(f"# {filename}\n\n")
+        stats = {}
+        writer.writelines(iter_csv_table(open_csv_text(io.BytesIO(content)), stats))
+
+        if not stats:
             return ConversionResult(
                 markdown="*Empty CSV file*",
                 metadata={
-                    "filename": file.filename,
+                    "filename": filename,
                     "content_type": "text/csv",
                     "size": len(content),
                 },
                 content_type="text/csv",
             )
 
-        # Create markdown table
-        header = rows[0]
-        markdown_table = "| " + " | ".join(header) + " |\n"
-        markdown_table += "| " + " | ".join(["---" for _ in header]) + " |\n"
-
-        # Add data rows
-        for row in rows[1:]:
-            # Ensure row has the same number of columns as header
-            padded_row = row + [""] * (len(header) - len(row))
-            markdown_table += "| " + " | ".join(padded_row[: len(header)]) + " |\n"
-
-        # Add title
-        markdown_text = f"# {file.filename}\n\n{markdown_table}"
-
         return ConversionResult(
-            markdown=markdown_text,
+            markdown=writer.getvalue(),
             metadata={
-                "filename": file.filename,
+                "filename": filename,
                 "content_type": "text/csv",
                 "size": len(content),
-                "rows": len(rows),
-                "columns": len(header),
+                "rows": stats["rows"],
+                "columns": stats["columns"],
             },
             content_type="text/csv",
         )
@@ -370,46 +656,98 @@ async def convert_csv_to_markdown(file: UploadFile) -> ConversionResult:
         raise HTTPException(status_code=500, detail=f"Error converting CSV: {str(e)}")
 
 
-async def convert_json_to_markdown(file: UploadFile) -> ConversionResult:
+def iter_csv_markdown(
+    stream: BinaryIO,
+    filename: Optional[str],
+    size: int,
+    max_rows: Optional[int] = None,
+    sample_every: int = 1,
+) -> Iterator[Dict]:
+    """
+    Convert a CSV for streaming responses with memory independent of the
+    file size: a header frame, table rows in frames of CSV_STREAM_FRAME_ROWS
+    and a trailer frame with the row and column counts.
+    """
+    yield {
+        "type": "header",
+        "markdown": f"# {filename}",
+        "metadata": {"filename": filename, "content_type": "text/csv", "size": size},
+    }
+
+    stats = {}
+    batch = []
+    for line in iter_csv_table(open_csv_text(stream), stats, max_rows, sample_every):
+        batch.append(line)
+        if len(batch) >= CSV_STREAM_FRAME_ROWS:
+            yield {"type": "rows", "rows": len(batch), "markdown": "".join(batch)}
+            batch = []
+            check_deadline()
+    if batch:
+        yield {"type": "rows", "rows": len(batch), "markdown": "".join(batch)}
+    if not stats:
+        yield {"type": "rows", "rows": 0, "markdown": "*Empty CSV file*"}
+
+    yield {
+        "type": "trailer",
+        "rows": stats.get("rows", 0),
+        "columns": stats.get("columns", 0),
+        "renderedRows": stats.get("rendered_rows", 0),
+    }
+
+
+def stream_csv_frames(
+    content: bytes,
+    filename: Optional[str],
+    max_rows: Optional[int] = None,
+    sample_every: int = 1,
+) -> Iterator[Dict]:
+    """iter_csv_markdown on uploaded bytes, to stream from a conversion worker"""
+    return iter_csv_markdown(io.BytesIO(content), filename, len(content), max_rows, sample_every)
+
+
+def json_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Convert JSON files to markdown with code blocks"""
     try:
-        content = await file.read()
-        file.file.seek(0)
-
         # Decode JSON content
         text = content.decode("utf-8", errors="replace")
 
-        # Parse JSON to ensure validity and for pretty formatting
-        json_data = json.loads(text)
-        pretty_json = json.dumps(json_data, indent=2)
-
-        # Create markdown with code block
-        markdown_text = f"# {file.filename}\n\n```json\n{pretty_json}\n```"
+        # Validate and pretty-print the JSON straight into the code block,
+        # without building its Python objects
+        writer = MarkdownWriter()
+        writer.write(f"# {filename}\n\n```json\n")
+        stats = write_pretty_json(text, writer)
+        writer.write("\n```")
+        markdown_text = writer.getvalue()
 
         # Extract some basic metadata
         metadata = {
-            "filename": file.filename,
+            "filename": filename,
             "content_type": "application/json",
             "size": len(content),
+            "depth": stats.depth,
         }
 
         # If JSON is an object, add top-level keys to metadata
-        if isinstance(json_data, dict):
-            metadata["keys"] = list(json_data.keys())
+        if stats.keys is not None:
+            metadata["keys"] = list(stats.keys)
         # If JSON is an array, add length
-        elif isinstance(json_data, list):
-            metadata["items"] = len(json_data)
+        elif stats.items is not None:
+            metadata["items"] = stats.items
+        if stats.truncated:
+            metadata["truncated"] = stats.truncated
 
         return ConversionResult(
             markdown=markdown_text, metadata=metadata, content_type="application/json"
         )
     except json.JSONDecodeError as e:
         # If JSON is invalid, return the error in markdown
-        markdown_text = f"# {file.filename}\n\n**Error parsing JSON:**\n\n{str(e)}\n\n```\n{text[:1000]}...\n```"
+        markdown_text = f"# {filename}\n\n**Error parsing JSON:**\n\n{str(e)}\n\n```\n{text[:1000]}...\n```"
         return ConversionResult(
             markdown=markdown_text,
             metadata={
-                "filename": file.filename,
+                "filename": filename,
                 "content_type": "application/json",
                 "size": len(content),
                 "error": str(e),
@@ -420,184 +758,441 @@ async def convert_json_to_markdown(file: UploadFile) -> ConversionResult:
         raise HTTPException(status_code=500, detail=f"Error converting JSON: {str(e)}")
 
 
-async def convert_xlsx_to_markdown(file: UploadFile) -> ConversionResult:
-    """Convert Excel files to markdown tables"""
-    try:
-        content = await file.read()
-        file.file.seek(0)
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SPREADSHEETML_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
 
-        # Open the workbook
-        workbook = openpyxl.load_workbook(io.BytesIO(content), data_only=True)
+def parse_sheet_windows(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse a "Sheet=ROWSxCOLUMNS,Other=ROWS" per-sheet window specification"""
+    windows = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, window = item.rsplit("=", 1)
+        rows, _, columns = window.partition("x")
+        windows[name.strip()] = (int(rows or XLSX_ROW_WINDOW), int(columns or 0))
+    return windows
 
-        markdown_text = f"# {file.filename}\n\n"
 
-        # Process each worksheet
-        sheets_data = []
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            sheet_md = f"## Sheet: {sheet_name}\n\n"
+XLSX_SHEET_WINDOWS = parse_sheet_windows(os.getenv("FRIDA_XLSX_SHEET_WINDOWS", ""))
 
-            # Get the data from the sheet
-            data = []
-            for row in sheet.iter_rows(values_only=True):
-                if any(cell is not None for cell in row):  # Skip completely empty rows
-                    data.append([str(cell) if cell is not None else "" for cell in row])
 
-            if not data:
-                sheet_md += "*Empty sheet*\n\n"
-                sheets_data.append({"name": sheet_name, "rows": 0, "columns": 0})
+def get_sheet_window(sheet_name: str) -> Tuple[int, int]:
+    """Rows and columns (0: all) to render for a sheet"""
+    return XLSX_SHEET_WINDOWS.get(sheet_name, (XLSX_ROW_WINDOW, XLSX_COLUMN_WINDOW))
+
+
+def scan_sheet_extent(archive: zipfile.ZipFile, worksheet_path: str) -> Tuple[int, int]:
+    """
+    Count the non-empty rows and the width of a worksheet in a single expat
+    pass over its XML, without building any cell objects. A row counts when
+    one of its cells has a value; the width includes styled empty cells, as
+    openpyxl's ``max_column`` does.
+    """
+    from openpyxl.utils import column_index_from_string
+
+    rows = 0
+    max_col = 0
+    sheet_data = None
+    with archive.open(worksheet_path.lstrip("/")) as source:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if elem.tag == f"{SPREADSHEETML_NS}sheetData":
+                    sheet_data = elem
+                continue
+            if elem.tag != f"{SPREADSHEETML_NS}row":
                 continue
 
-            # Create markdown table
-            max_cols = max(len(row) for row in data)
-            sheet_md += (
-                "| " + " | ".join([f"Column {i+1}" for i in range(max_cols)]) + " |\n"
-            )
-            sheet_md += "| " + " | ".join(["---" for _ in range(max_cols)]) + " |\n"
+            has_value = False
+            col = 0
+            for cell in elem.iter(f"{SPREADSHEETML_NS}c"):
+                ref = cell.get("r")
+                if ref:
+                    col = column_index_from_string(ref.rstrip("0123456789"))
+                else:
+                    col += 1
+                max_col = max(max_col, col)
+                if not has_value:
+                    # An empty <v/> (e.g. an uncached formula) reads as None
+                    value = cell.find(f"{SPREADSHEETML_NS}v")
+                    has_value = bool(value is not None and value.text) or (
+                        cell.find(f"{SPREADSHEETML_NS}is") is not None
+                    )
+            if has_value:
+                rows += 1
+            # Drop parsed rows so memory doesn't grow with the sheet
+            if sheet_data is not None:
+                sheet_data.clear()
+    return rows, max_col
 
-            # Add data rows (limit to first 100 rows for large sheets)
-            row_limit = min(100, len(data))
-            for row in data[:row_limit]:
-                # Ensure row has the right number of columns
-                padded_row = row + [""] * (max_cols - len(row))
-                sheet_md += "| " + " | ".join(padded_row) + " |\n"
 
-            if len(data) > row_limit:
-                sheet_md += "\n*Note: Only showing first 100 rows*\n\n"
+def render_xlsx_sheet(
+    workbook, archive: zipfile.ZipFile, sheet_name: str
+) -> Tuple[str, Dict]:
+    """
+    Render one sheet of a read-only workbook. Only the rows and columns in
+    the sheet's window are parsed into cells; the totals come from
+    scan_sheet_extent.
+    """
+    sheet = workbook[sheet_name]
+    rows, max_cols = scan_sheet_extent(archive, sheet._worksheet_path)
+    if not rows:
+        # Empty sheets are listed in the metadata only
+        return "", {"name": sheet_name, "rows": 0, "columns": 0}
+
+    row_window, column_window = get_sheet_window(sheet_name)
+    columns = min(max_cols, column_window) if column_window else max_cols
+
+    # Create markdown table
+    parts = [
+        f"## Sheet: {sheet_name}\n\n",
+        "| " + " | ".join([f"Column {i+1}" for i in range(columns)]) + " |\n",
+        "| " + " | ".join(["---" for _ in range(columns)]) + " |\n",
+    ]
+
+    # Add data rows, stopping as soon as the window is full
+    rendered = 0
+    if row_window > 0:
+        for row in sheet.iter_rows(values_only=True, max_col=columns):
+            if not any(cell is not None for cell in row):  # Skip completely empty rows
+                continue
+            cells = [str(cell) if cell is not None else "" for cell in row[:columns]]
+            # Ensure row has the right number of columns
+            cells += [""] * (columns - len(cells))
+            parts.append("| " + " | ".join(cells) + " |\n")
+            rendered += 1
+            if rendered >= row_window:
+                break
 
-            markdown_text += sheet_md + "\n\n"
-            sheets_data.append(
-                {"name": sheet_name, "rows": len(data), "columns": max_cols}
-            )
+    if rows > rendered:
+        parts.append(f"\n*Note: Only showing first {row_window} rows*\n\n")
+    if columns < max_cols:
+        parts.append(f"\n*Note: Only showing first {columns} of {max_cols} columns*\n\n")
 
-        return ConversionResult(
-            markdown=markdown_text,
-            metadata={
-                "filename": file.filename,
-                "content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                "size": len(content),
-                "sheets": sheets_data,
-            },
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+    parts.append("\n\n")
+    return "".join(parts), {"name": sheet_name, "rows": rows, "columns": max_cols}
+
+
+def xlsx_sheet_names(content: bytes) -> List[str]:
+    """List the sheets of a workbook without reading any of them"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def xlsx_render_sheets(
+    content: bytes, sheet_names: Optional[List[str]] = None
+) -> List[Tuple[str, Dict]]:
+    """Render the given sheets (default: all) of a workbook in streaming mode"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            return [
+                render_xlsx_sheet(workbook, archive, sheet_name)
+                for sheet_name in (sheet_names or workbook.sheetnames)
+            ]
+    finally:
+        workbook.close()
+
+
+# Cells holding a shared string index (<c t="s"><v>12</v></c>), and any
+# shared-string type attribute, to tell whether every such cell was matched
+_SHARED_STRING_CELL = re.compile(
+    rb"<(?:\w+:)?c\b[^>]*?\bt=[\"']s[\"'][^>]*>\s*<(?:\w+:)?v>(\d+)</"
+)
+_SHARED_STRING_TYPE = re.compile(rb"\bt=[\"']s[\"']")
+
+
+def xlsx_fingerprints(content: bytes) -> List[Tuple[str, str]]:
+    """
+    Fingerprint each sheet of a workbook from what its rendering depends
+    on: the worksheet XML, the shared strings its cells use, the styles,
+    the date system and the sheet's window. The XML is scanned a row block
+    at a time, so large sheets aren't read into memory at once.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+    try:
+        shared_strings = [str(text) for text in workbook.shared_strings]
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            styles = hashlib.sha256()
+            if "xl/styles.xml" in archive.namelist():
+                styles.update(archive.read("xl/styles.xml"))
+            fingerprints = []
+            for sheet_name in workbook.sheetnames:
+                digest = hashlib.sha256(
+                    f"{CONVERTER_VERSION}\0{sheet_name}\0{get_sheet_window(sheet_name)}"
+                    f"\0{workbook.epoch}\0{styles.hexdigest()}\0".encode("utf-8")
+                )
+                strings = hashlib.sha256()
+                all_matched = True
+                pending = b""
+                path = workbook[sheet_name]._worksheet_path.lstrip("/")
+                with archive.open(path) as source:
+                    while True:
+                        chunk = source.read(1024 * 1024)
+                        digest.update(chunk)
+                        pending += chunk
+                        if chunk:
+                            # Cells never span rows, so scan up to the last row end
+                            end = pending.rfind(b"row>") + 4
+                            if end < 4:
+                                continue
+                        else:
+                            end = len(pending)
+                        block, pending = pending[:end], pending[end:]
+                        indices = _SHARED_STRING_CELL.findall(block)
+                        if len(indices) != len(_SHARED_STRING_TYPE.findall(block)):
+                            all_matched = False
+                        for index in indices:
+                            index = int(index)
+                            if index < len(shared_strings):
+                                strings.update(shared_strings[index].encode("utf-8"))
+                            strings.update(b"\0")
+                        if not chunk:
+                            break
+                if not all_matched:
+                    # Unusual markup: depend on every shared string instead
+                    strings.update("\0".join(shared_strings).encode("utf-8"))
+                digest.update(strings.digest())
+                fingerprints.append((sheet_name, digest.hexdigest()))
+            return fingerprints
+    finally:
+        workbook.close()
+
+
+def build_xlsx_result(
+    sheets: Iterable[Tuple[str, Dict]], filename: Optional[str], size: int
+) -> ConversionResult:
+    """Assemble rendered sheets into the workbook markdown document"""
+    writer = MarkdownWriter()
+    writer.write(f"# {filename}\n\n")
+    sheets_data = []
+    for sheet_md, sheet_meta in sheets:
+        writer.write(sheet_md)
+        sheets_data.append(sheet_meta)
+
+    return ConversionResult(
+        markdown=writer.getvalue(),
+        metadata={
+            "filename": filename,
+            "content_type": XLSX_CONTENT_TYPE,
+            "size": size,
+            "sheets": sheets_data,
+        },
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+def xlsx_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
+    """Convert Excel files to markdown tables"""
+    try:
+        check_zip_container(content, "Excel file")
+        return build_xlsx_result(xlsx_render_sheets(content), filename, len(content))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error converting Excel file: {str(e)}"
         )
 
 
-async def convert_image_to_markdown(file: UploadFile) -> ConversionResult:
-    """Convert image files to markdown with embedded Base64 (for small images) or description"""
+def thumbnail_extension(img) -> str:
+    """Pick the thumbnail format from the image header: WebP, else JPEG unless there's transparency"""
+    from PIL import features
+
+    if THUMBNAIL_FORMAT == "webp" and features.check("webp"):
+        return "webp"
+    if THUMBNAIL_FORMAT == "png" or img.mode in ("RGBA", "LA", "PA") or (
+        "transparency" in img.info
+    ):
+        return "png"
+    return "jpg"
+
+
+def make_thumbnail(img, extension: str) -> bytes:
+    """
+    Encode a thumbnail of at most THUMBNAIL_SIZE pixels a side. JPEGs are
+    decoded straight at 1/2, 1/4 or 1/8 scale, and other formats are
+    reduced by integer factors before the final resample.
+    """
+    img.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    if img.width * img.height > THUMBNAIL_MAX_PIXELS:
+        raise ValueError(f"{img.width}x{img.height} pixels is too large to decode")
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), reducing_gap=2.0)
+
+    has_alpha = "A" in img.getbands() or "transparency" in img.info
+    mode = "RGBA" if has_alpha and extension != "jpg" else "RGB"
+    if img.mode != mode:
+        img = img.convert(mode)
+
+    buffer = io.BytesIO()
+    if extension == "png":
+        img.save(buffer, "PNG", optimize=True)
+    else:
+        img.save(
+            buffer, "WEBP" if extension == "webp" else "JPEG", quality=THUMBNAIL_QUALITY
+        )
+    return buffer.getvalue()
+
+
+def image_thumbnail_url(content: bytes, img) -> str:
+    """Create (or reuse) the cached thumbnail of an image and return its URL"""
+    extension = thumbnail_extension(img)
+    name = thumbnail_store.name_for(
+        hashlib.sha256(content).hexdigest(), THUMBNAIL_SIZE, extension
+    )
+    if thumbnail_store.get(name) is None:
+        thumbnail_store.put(name, make_thumbnail(img, extension))
+    return f"{THUMBNAIL_URL}/{name}"
+
+
+def image_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
+    """Convert image files to markdown with a linked thumbnail preview and details"""
     try:
-        content = await file.read()
-        file.file.seek(0)
+        from PIL import Image
 
-        # For images, if small enough, we'll convert to base64 for embedding
-        # Otherwise, we'll just describe the image
-        if len(content) < 1024 * 1024:  # Less than 1MB
-            try:
+        Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+        try:
+            # Only the header is read here; pixels are decoded for the thumbnail.
+            # Images over the limit are refused below, so Pillow needn't warn
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
                 img = Image.open(io.BytesIO(content))
-                width, height = img.size
-                format_lower = img.format.lower() if img.format else "unknown"
+            width, height = img.size
+            image_format, image_mode = img.format, img.mode
+        except Image.DecompressionBombError as bomb:
+            # Pillow refuses to even open images of twice its own pixel limit
+            raise HTTPException(status_code=413, detail=str(bomb))
+        except Exception as img_error:
+            # If image processing fails, provide basic info
+            markdown_text = f"# Image: {filename}\n\n*Could not process image for preview: {str(img_error)}*\n\n**Details:**\n\n- Size: {len(content)} bytes"
+            return ConversionResult(
+                markdown=markdown_text,
+                metadata={
+                    "filename": filename,
+                    "content_type": content_type,
+                    "size": len(content),
+                },
+                content_type=content_type,
+            )
+        check_image_pixels(width, height)
 
-                # Convert to base64 for preview
-                img_base64 = base64.b64encode(content).decode("utf-8")
-                image_md = (
-                    f"![{file.filename}](data:image/{format_lower};base64,{img_base64})"
-                )
+        metadata = {
+            "filename": filename,
+            "content_type": content_type,
+            "size": len(content),
+            "width": width,
+            "height": height,
+            "format": image_format,
+        }
 
-                markdown_text = f"# Image: {file.filename}\n\n{image_md}\n\n**Details:**\n\n- Width: {width}px\n- Height: {height}px\n- Format: {img.format}\n- Mode: {img.mode}"
-
-                return ConversionResult(
-                    markdown=markdown_text,
-                    metadata={
-                        "filename": file.filename,
-                        "content_type": file.content_type,
-                        "size": len(content),
-                        "width": width,
-                        "height": height,
-                        "format": img.format,
-                    },
-                    content_type=file.content_type,
-                    preview=f"data:image/{format_lower};base64,{img_base64}",
-                )
-            except Exception as img_error:
-                # If image processing fails, provide basic info
-                markdown_text = f"# Image: {file.filename}\n\n*Could not process image for preview: {str(img_error)}*\n\n**Details:**\n\n- Size: {len(content)} bytes"
-        else:
-            markdown_text = f"# Image: {file.filename}\n\n*Image too large for preview (size: {len(content)/1024/1024:.2f} MB)*"
+        # Link a small cached thumbnail instead of inlining the original
+        preview = None
+        try:
+            preview = image_thumbnail_url(content, img)
+            image_md = f"![{filename}]({preview})"
+            metadata["thumbnail"] = preview
+        except Exception as thumbnail_error:
+            image_md = f"*Could not create a preview: {str(thumbnail_error)}*"
+
+        markdown_text = f"# Image: {filename}\n\n{image_md}\n\n**Details:**\n\n- Width: {width}px\n- Height: {height}px\n- Format: {image_format}\n- Mode: {image_mode}"
 
         return ConversionResult(
             markdown=markdown_text,
-            metadata={
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": len(content),
-            },
-            content_type=file.content_type,
+            metadata=metadata,
+            content_type=content_type,
+            preview=preview,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting image: {str(e)}")
 
 
-async def convert_xml_to_markdown(file: UploadFile) -> ConversionResult:
+def xml_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Convert XML files to markdown with syntax highlighting"""
     try:
-        content = await file.read()
-        file.file.seek(0)
-
-        # Decode XML content
-        xml_text = content.decode("utf-8", errors="replace")
+        metadata = {
+            "filename": filename,
+            "content_type": "text/xml",
+            "size": len(content),
+        }
 
-        # Try to pretty-print the XML
+        # Pretty-print the XML while parsing it
+        writer = MarkdownWriter()
+        writer.write(f"# {filename}\n\n```xml\n")
         try:
-            root = ET.fromstring(xml_text)
-            # Use minidom for pretty printing
-            from xml.dom import minidom
-
-            pretty_xml = minidom.parseString(ET.tostring(root)).toprettyxml()
-        except:
-            pretty_xml = xml_text  # Use original if parsing fails
-
-        # Create markdown with code block
-        markdown_text = f"# {file.filename}\n\n```xml\n{pretty_xml}\n```"
+            stats = write_pretty_xml(content, writer)
+        except ET.ParseError as e:
+            # Not well-formed: show the error and the start of the raw text
+            preview = content[:XML_PREVIEW_BYTES].decode("utf-8", errors="replace")
+            if len(content) > XML_PREVIEW_BYTES:
+                preview += "..."
+            metadata["error"] = str(e)
+            return ConversionResult(
+                markdown=f"# {filename}\n\n**Error parsing XML:**\n\n{str(e)}\n\n```xml\n{preview}\n```",
+                metadata=metadata,
+                content_type="text/xml",
+            )
+        writer.write("\n```")
+
+        metadata.update(
+            root=stats.root,
+            elements=stats.elements,
+            attributes=stats.attributes,
+            depth=stats.depth,
+            tags=stats.top_tags(),
+        )
+        if stats.namespaces:
+            metadata["namespaces"] = stats.namespaces
+        if stats.comments:
+            metadata["comments"] = stats.comments
 
         return ConversionResult(
-            markdown=markdown_text,
-            metadata={
-                "filename": file.filename,
-                "content_type": "text/xml",
-                "size": len(content),
-            },
-            content_type="text/xml",
+            markdown=writer.getvalue(), metadata=metadata, content_type="text/xml"
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting XML: {str(e)}")
 
 
-async def convert_unknown_to_markdown(file: UploadFile) -> ConversionResult:
+CONTROL_BYTES = bytes(c for c in range(32) if chr(c) not in "\n\r\t")
+
+
+def unknown_to_markdown(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
     """Handle unknown file types by providing basic info"""
     try:
-        content = await file.read()
-        file.file.seek(0)
-
         # Try to detect if it's a text file
         is_text = True
         try:
             text = content.decode("utf-8", errors="strict")
-            # If more than 10% of characters are null or control, likely binary
-            control_chars = sum(
-                1 for c in text if ord(c) < 32 and c not in ["\n", "\r", "\t"]
-            )
-            if control_chars / len(text) > 0.1:
+            # If more than 10% of characters are null or control, likely binary.
+            # Control characters are single bytes in UTF-8, so count them on
+            # the bytes instead of character by character.
+            control_chars = len(content) - len(content.translate(None, CONTROL_BYTES))
+            if text and control_chars / len(text) > 0.1:
                 is_text = False
         except UnicodeDecodeError:
             is_text = False
 
         if is_text:
             # It's a text file we can display
-            text = content.decode("utf-8", errors="replace")
-            markdown_text = f"# File: {file.filename}\n\n```\n{text[:10000]}\n```"
+            markdown_text = f"# File: {filename}\n\n```\n{text[:10000]}\n```"
             if len(text) > 10000:
                 markdown_text += (
                     "\n\n*Note: File truncated, showing first 10,000 characters*"
@@ -605,16 +1200,16 @@ async def convert_unknown_to_markdown(file: UploadFile) -> ConversionResult:
         else:
             # It's a binary file we can't display
             file_size = len(content)
-            markdown_text = f"# Binary File: {file.filename}\n\n- **Size**: {file_size} bytes ({file_size/1024/1024:.2f} MB)\n- **Type**: {file.content_type or 'Unknown'}\n\n*This file appears to be binary and cannot be displayed as text.*"
+            markdown_text = f"# Binary File: {filename}\n\n- **Size**: {file_size} bytes ({file_size/1024/1024:.2f} MB)\n- **Type**: {content_type or 'Unknown'}\n\n*This file appears to be binary and cannot be displayed as text.*"
 
         return ConversionResult(
             markdown=markdown_text,
             metadata={
-                "filename": file.filename,
-                "content_type": file.content_type or "application/octet-stream",
+                "filename": filename,
+                "content_type": content_type or "application/octet-stream",
                 "size": len(content),
             },
-            content_type=file.content_type or "application/octet-stream",
+            content_type=content_type or "application/octet-stream",
         )
     except Exception as e:
         raise HTTPException(
@@ -622,20 +1217,756 @@ async def convert_unknown_to_markdown(file: UploadFile) -> ConversionResult:
         )
 
 
+# Converters by format key. The conversion engine runs them in its worker
+# processes, so they must stay importable at module level. Formats are
+# registered in the order they are listed by /supported-formats, and new ones
+# only need a register() call here.
+converter_registry = ConverterRegistry(fallback="unknown")
+converter_registry.register(
+    "pdf",
+    pdf_to_markdown,
+    {"application/pdf": "pdf"},
+    extensions=["pdf"],
+    sniff=match_prefix({b"%PDF-": "application/pdf"}),
+    libraries=["PyPDF2", "pdfplumber"],
+)
+converter_registry.register(
+    "docx",
+    docx_to_markdown,
+    {
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+        "application/msword": "doc",
+    },
+    extensions=["docx", "doc"],
+    sniff=lambda head: (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        if head.startswith(b"PK\x03\x04") and b"word/" in head
+        else None
+    ),
+    libraries=["mammoth"],
+)
+converter_registry.register("txt", txt_to_markdown, {"text/plain": "txt"}, extensions=["txt"])
+converter_registry.register(
+    "html",
+    html_to_markdown,
+    {"text/html": "html"},
+    extensions=["html", "htm"],
+    sniff_text=lambda text: (
+        "text/html" if text.startswith(("<!doctype html", "<html")) else None
+    ),
+    libraries=["api.controllers.html_engine"],
+)
+converter_registry.register("csv", csv_to_markdown, {"text/csv": "csv"}, extensions=["csv"])
+converter_registry.register(
+    "json",
+    json_to_markdown,
+    {"application/json": "json"},
+    extensions=["json"],
+    sniff_text=lambda text: "application/json" if text.startswith(("{", "[")) else None,
+)
+converter_registry.register(
+    "xlsx",
+    xlsx_to_markdown,
+    {XLSX_CONTENT_TYPE: "xlsx"},
+    extensions=["xlsx"],
+    sniff=lambda head: (
+        XLSX_CONTENT_TYPE if head.startswith(b"PK\x03\x04") and b"xl/" in head else None
+    ),
+    libraries=["openpyxl"],
+)
+converter_registry.register(
+    "image",
+    image_to_markdown,
+    {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/svg+xml": "svg"},
+    extensions=["jpg", "jpeg", "png", "gif", "svg"],
+    sniff=match_prefix(
+        {
+            b"\x89PNG\r\n\x1a\n": "image/png",
+            b"\xff\xd8\xff": "image/jpeg",
+            b"GIF87a": "image/gif",
+            b"GIF89a": "image/gif",
+        }
+    ),
+    libraries=["PIL.Image"],
+)
+converter_registry.register(
+    "xml",
+    xml_to_markdown,
+    {"text/xml": "xml"},
+    extensions=["xml"],
+    sniff_text=lambda text: "text/xml" if text.startswith("<?xml") else None,
+)
+# Listed formats without a converter of their own are shown as text (or
+# described as binary) by the fallback
+converter_registry.register(
+    "unknown", unknown_to_markdown, {"text/markdown": "md", "application/rtf": "rtf"}
+)
+
+SUPPORTED_FORMATS = converter_registry.supported_formats()
+
+
+def detect_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Choose the converter format key and MIME type for an upload from its
+    first bytes, its name and its declared content type
+    """
+    file.file.seek(0)
+    head = file.file.read(converter_registry.sniff_bytes)
+    file.file.seek(0)
+    return converter_registry.detect(head, file.filename, file.content_type)
+
+
+# Bump whenever converter output changes so cached results are not reused
+CONVERTER_VERSION = "7"
+
+conversion_cache = ConversionCache(ConversionResult)
+
+
+async def convert_pdf_sharded(
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    tier: str = PDF_TIER,
+) -> ConversionResult:
+    """
+    Convert a PDF, extracting large documents as page shards on several
+    worker processes and reassembling the pages in order.
+    """
+    options = {"tier": tier}
+    lane = conversion_engine.lane_for("pdf")
+    workers = min(PDF_SHARD_WORKERS or lane.workers, lane.workers)
+    if lane.mode != "process" or workers < 2 or len(content) < PDF_SHARD_MIN_BYTES:
+        return await conversion_engine.run(
+            "pdf", content, filename, content_type, options
+        )
+
+    try:
+        metadata = await conversion_engine.submit("pdf", pdf_probe, content, filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
+
+    page_count = metadata["page_count"]
+    started = time.perf_counter()
+    if page_count < PDF_SHARD_MIN_PAGES:
+        return await conversion_engine.run(
+            "pdf", content, filename, content_type, options
+        )
+
+    shards = split_page_range(
+        page_count, min(workers, max(1, page_count // PDF_SHARD_PAGES_PER_SHARD))
+    )
+    try:
+        results = await asyncio.gather(
+            *[
+                conversion_engine.submit(
+                    "pdf", pdf_extract_pages, content, range(start, stop), tier
+                )
+                for start, stop in shards
+            ]
+        )
+        # Costs add up the time each shard's worker spent on its pages
+        costs = TierCosts()
+        for _, shard_costs in results:
+            costs.merge(shard_costs)
+        metadata["pdf_tier"] = tier
+        normalized = normalize_seconds()
+        result = build_pdf_result(
+            (page for pages, _ in results for page in pages), metadata, costs
+        )
+        normalize = normalize_seconds() - normalized
+        result._stages = {
+            "parse": time.perf_counter() - started - normalize,
+            "normalize": normalize,
+        }
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
+
+
+async def convert_xlsx_parallel(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
+    """Convert a workbook, rendering groups of sheets on several worker processes"""
+    lane = conversion_engine.lane_for("xlsx")
+    if lane.mode != "process" or lane.workers < 2 or len(content) < XLSX_PARALLEL_MIN_BYTES:
+        return await conversion_engine.run("xlsx", content, filename, content_type)
+
+    try:
+        started = time.perf_counter()
+        check_zip_container(content, "Excel file")
+        sheet_names = await conversion_engine.submit("xlsx", xlsx_sheet_names, content)
+        if len(sheet_names) < 2:
+            return await conversion_engine.run("xlsx", content, filename, content_type)
+
+        groups = [
+            sheet_names[start:stop]
+            for start, stop in split_page_range(
+                len(sheet_names), min(lane.workers, len(sheet_names))
+            )
+        ]
+        results = await asyncio.gather(
+            *[
+                conversion_engine.submit("xlsx", xlsx_render_sheets, content, group)
+                for group in groups
+            ]
+        )
+        result = build_xlsx_result(
+            (sheet for group in results for sheet in group), filename, len(content)
+        )
+        result._stages = {"parse": time.perf_counter() - started}
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error converting Excel file: {str(e)}"
+        )
+
+
+def split_units(units: List, workers: int) -> List[List]:
+    """Split the units to convert into at most ``workers`` contiguous groups"""
+    return [
+        units[start:stop]
+        for start, stop in split_page_range(len(units), max(1, min(workers, len(units))))
+    ]
+
+
+async def convert_pdf_incremental(
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    tier: str = PDF_TIER,
+) -> ConversionResult:
+    """
+    Convert a PDF, reusing the stored text of pages whose fingerprint an
+    earlier document had and extracting the others on several workers
+    """
+    lane = conversion_engine.lane_for("pdf")
+    workers = min(PDF_SHARD_WORKERS or lane.workers, lane.workers)
+    try:
+        started = time.perf_counter()
+        metadata, fingerprints = await conversion_engine.submit(
+            "pdf", pdf_fingerprints, content, filename, tier
+        )
+        stored = await asyncio.to_thread(unit_store.get_many, fingerprints)
+        missing = [
+            page_num
+            for page_num, fingerprint in enumerate(fingerprints)
+            if fingerprint not in stored
+        ]
+
+        pages: Dict[int, Tuple[int, Optional[str], bool]] = {
+            page_num: (page_num, *stored[fingerprint])
+            for page_num, fingerprint in enumerate(fingerprints)
+            if fingerprint in stored
+        }
+        costs = TierCosts()
+        if missing:
+            results = await asyncio.gather(
+                *[
+                    conversion_engine.submit(
+                        "pdf", pdf_extract_pages, content, group, tier
+                    )
+                    for group in split_units(
+                        missing, workers if lane.mode == "process" else 1
+                    )
+                ]
+            )
+            extracted = {}
+            for group_pages, group_costs in results:
+                costs.merge(group_costs)
+                for page in group_pages:
+                    pages[page[0]] = page
+                    extracted[fingerprints[page[0]]] = list(page[1:])
+            await asyncio.to_thread(unit_store.put_many, extracted)
+
+        metadata["pdf_tier"] = tier
+        metadata["reused_pages"] = len(fingerprints) - len(missing)
+        normalized = normalize_seconds()
+        # Pages a shard had no time for are missing; the result is then partial
+        result = build_pdf_result(
+            (pages[page_num] for page_num in sorted(pages)), metadata, costs
+        )
+        normalize = normalize_seconds() - normalized
+        result._stages = {
+            "parse": time.perf_counter() - started - normalize,
+            "normalize": normalize,
+        }
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
+
+
+async def convert_xlsx_incremental(
+    content: bytes, filename: Optional[str], content_type: Optional[str]
+) -> ConversionResult:
+    """
+    Convert a workbook, reusing the stored rendering of sheets whose
+    fingerprint an earlier workbook had and rendering the others on
+    several workers
+    """
+    lane = conversion_engine.lane_for("xlsx")
+    try:
+        started = time.perf_counter()
+        check_zip_container(content, "Excel file")
+        fingerprints = await conversion_engine.submit("xlsx", xlsx_fingerprints, content)
+        stored = await asyncio.to_thread(
+            unit_store.get_many, [fingerprint for _, fingerprint in fingerprints]
+        )
+        missing = [name for name, fingerprint in fingerprints if fingerprint not in stored]
+
+        rendered: Dict[str, Tuple[str, Dict]] = {}
+        if missing:
+            groups = split_units(missing, lane.workers if lane.mode == "process" else 1)
+            results = await asyncio.gather(
+                *[
+                    conversion_engine.submit("xlsx", xlsx_render_sheets, content, group)
+                    for group in groups
+                ]
+            )
+            for group, sheets in zip(groups, results):
+                rendered.update(zip(group, sheets))
+            await asyncio.to_thread(
+                unit_store.put_many,
+                {
+                    fingerprint: list(rendered[name])
+                    for name, fingerprint in fingerprints
+                    if name in rendered
+                },
+            )
+
+        result = build_xlsx_result(
+            (
+                rendered[name] if name in rendered else tuple(stored[fingerprint])
+                for name, fingerprint in fingerprints
+            ),
+            filename,
+            len(content),
+        )
+        result.metadata["reused_sheets"] = len(fingerprints) - len(missing)
+        result._stages = {"parse": time.perf_counter() - started}
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error converting Excel file: {str(e)}"
+        )
+
+
+async def run_conversion(
+    fmt: str,
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    options: Optional[Dict[str, str]] = None,
+) -> ConversionResult:
+    """
+    Run the converter for ``fmt`` in the conversion engine. ``options`` are
+    converter keyword arguments (for PDFs, the extraction ``tier``), except
+    ``incremental``: "1" converts PDFs and workbooks through the unit store.
+    """
+    options = dict(options or {})
+    incremental = options.pop("incremental", None) == "1"
+    if fmt == "pdf":
+        if incremental:
+            return await convert_pdf_incremental(
+                content, filename, content_type, **options
+            )
+        return await convert_pdf_sharded(content, filename, content_type, **options)
+    if fmt == "xlsx":
+        if incremental:
+            return await convert_xlsx_incremental(content, filename, content_type)
+        return await convert_xlsx_parallel(content, filename, content_type)
+    return await conversion_engine.run(fmt, content, filename, content_type, options)
+
+
+async def convert_content(
+    fmt: str,
+    content: bytes,
+    filename: Optional[str],
+    content_type: Optional[str],
+    options: Optional[Dict[str, str]] = None,
+    timing: Optional[ServerTiming] = None,
+) -> ConversionResult:
+    """
+    Convert raw bytes through the result cache and the conversion engine,
+    recording the conversion metrics and, if given, the stages in ``timing``.
+    Conversions run in worker processes report their ``peak_memory_bytes``.
+    """
+    started = time.perf_counter()
+    key = make_cache_key(
+        content, fmt, CONVERTER_VERSION, filename, content_type, options
+    )
+    stages: Dict[str, float] = {}
+    memory = MemoryUsage()
+    timeout = timeout_for(fmt)
+
+    async def convert() -> ConversionResult:
+        measuring = conversion_memory.set(memory)
+        timing_out = conversion_deadline.set(
+            None if timeout is None else time.monotonic() + timeout
+        )
+        try:
+            converted = await run_conversion(
+                fmt, content, filename, content_type, options
+            )
+        finally:
+            conversion_deadline.reset(timing_out)
+            conversion_memory.reset(measuring)
+        stages.update(converted._stages)
+        return converted
+
+    try:
+        if active_profile.get() is not None:
+            # A profiled request always converts, so there is something to sample
+            result = await convert()
+        else:
+            # Partial results depend on the load at the time; don't keep them
+            result = await conversion_cache.get_or_convert(
+                key, convert, cacheable=lambda done: "partial" not in done.metadata
+            )
+
+        # A cached result can outlive its thumbnail; convert again to recreate it
+        thumbnail = result.metadata.get("thumbnail")
+        if thumbnail and not await asyncio.to_thread(
+            thumbnail_store.get, thumbnail.rsplit("/", 1)[-1]
+        ):
+            result = await convert()
+            await conversion_cache.put(key, result.model_copy(deep=True))
+    except HTTPException as he:
+        conversion_metrics.error(fmt, he.status_code)
+        raise
+    except Exception:
+        conversion_metrics.error(fmt, 500)
+        raise
+
+    if memory.peak is not None:
+        # Only the request that converted reports it, never the cache hits
+        result = result.model_copy(
+            update={"metadata": {**result.metadata, "peak_memory_bytes": memory.peak}}
+        )
+
+    elapsed = time.perf_counter() - started
+    conversion_metrics.observe(
+        fmt, elapsed, len(content), result.markdown, result.metadata, memory.peak
+    )
+    if fmt == converter_registry.fallback:
+        conversion_metrics.fallback()
+    if result.metadata.get("partial") == "timeout":
+        conversion_metrics.partial(fmt)
+    if timing is not None:
+        # Without stages the result came from the cache (or a request
+        # converting the same file at the same time)
+        for stage, seconds in (stages or {"cache": elapsed}).items():
+            timing.add(stage, seconds)
+    result._content_hash = key.split("-", 1)[0]
+    return result
+
+
+async def convert_upload(
+    fmt: str,
+    file: UploadFile,
+    content_type: Optional[str] = None,
+    options: Optional[Dict[str, str]] = None,
+    timing: Optional[ServerTiming] = None,
+) -> ConversionResult:
+    """Read an upload and convert it through the result cache and the conversion engine"""
+    started = time.perf_counter()
+    content = await file.read()
+    await file.seek(0)
+    if timing is not None:
+        timing.since("read", started)
+    return await convert_content(
+        fmt, content, file.filename, content_type or file.content_type, options, timing
+    )
+
+
+async def convert_pdf_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert PDF files to markdown off the event loop"""
+    return await convert_upload("pdf", file)
+
+
+async def convert_docx_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert DOCX files to markdown off the event loop"""
+    return await convert_upload("docx", file)
+
+
+async def convert_txt_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert plain text files to markdown off the event loop"""
+    return await convert_upload("txt", file)
+
+
+async def convert_html_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert HTML files to markdown off the event loop"""
+    return await convert_upload("html", file)
+
+
+async def convert_csv_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert CSV files to markdown tables off the event loop"""
+    return await convert_upload("csv", file)
+
+
+async def convert_json_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert JSON files to markdown off the event loop"""
+    return await convert_upload("json", file)
+
+
+async def convert_xlsx_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert Excel files to markdown tables off the event loop"""
+    return await convert_upload("xlsx", file)
+
+
+async def convert_image_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert image files to markdown off the event loop"""
+    return await convert_upload("image", file)
+
+
+async def convert_xml_to_markdown(file: UploadFile) -> ConversionResult:
+    """Convert XML files to markdown off the event loop"""
+    return await convert_upload("xml", file)
+
+
+async def convert_unknown_to_markdown(file: UploadFile) -> ConversionResult:
+    """Handle unknown file types off the event loop"""
+    return await convert_upload("unknown", file)
+
+
+def build_conversion_response(result: ConversionResult, content_type: str) -> Dict:
+    """Build the /convert response body for a conversion result"""
+    # Enhance markdown with additional styling and metadata
+    enhanced_markdown = MarkdownStyler.enhance_markdown(
+        result.markdown, result.metadata
+    )
+
+    # Format the markdown as a code block for the API response
+    markdown_code_block = f"```markdown\n{enhanced_markdown}\n```"
+
+    return {
+        "success": True,
+        "message": "File converted successfully",
+        "markdownContent": markdown_code_block,
+        "rawMarkdown": enhanced_markdown,
+        "metadata": result.metadata,
+        "preview": result.preview,
+        "sourceFormat": SUPPORTED_FORMATS.get(content_type, "unknown"),
+    }
+
+
+def render_conversion_response(
+    result: ConversionResult, content_type: str, header: Optional[str] = None
+) -> bytes:
+    """
+    Render the /convert response body as JSON bytes, identical to
+    JSONResponse(build_conversion_response(...)). The markdown is escaped
+    once and shared by markdownContent and rawMarkdown instead of first
+    being copied into the enhanced and code block strings. ``header`` is
+    the MarkdownStyler header, if it was already built.
+    """
+    if header is None:
+        header = MarkdownStyler.build_header(result.metadata)
+    header = encode_json_string(header)
+    markdown_text = memoryview(encode_json_string(result.markdown))
+    rest = JSONResponse(None).render(
+        {
+            "metadata": result.metadata,
+            "preview": result.preview,
+            "sourceFormat": SUPPORTED_FORMATS.get(content_type, "unknown"),
+        }
+    )
+    return b"".join(
+        [
+            b'{"success":true,"message":"File converted successfully","markdownContent":',
+            b'"```markdown\\n',
+            header[1:-1],
+            markdown_text[1:-1],
+            b'\\n```"',
+            b',"rawMarkdown":',
+            header[:-1],
+            markdown_text[1:],
+            b",",
+            rest[1:],
+        ]
+    )
+
+
+# Response modes of /convert. "full" is the original body (the markdown twice,
+# once as a code block), kept as the default for the web client.
+RESPONSE_MODES = ["full", "compact", "markdown", "multipart"]
+RESPONSE_MEDIA_TYPES = {
+    "application/json": "full",
+    "text/markdown": "markdown",
+    "multipart/mixed": "multipart",
+}
+
+
+def select_response_mode(mode: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the response mode from the ``mode`` query parameter or, without one,
+    from the first media type of the Accept header that has a mode
+    """
+    if mode:
+        mode = mode.lower()
+        if mode not in RESPONSE_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported mode {mode!r}, expected one of {', '.join(RESPONSE_MODES)}",
+            )
+        return mode
+    for item in (accept or "").split(","):
+        media_type = item.split(";", 1)[0].strip().lower()
+        if media_type in RESPONSE_MEDIA_TYPES:
+            return RESPONSE_MEDIA_TYPES[media_type]
+    return "full"
+
+
+def render_response_body(
+    result: ConversionResult,
+    content_type: str,
+    mode: str,
+    timing: Optional[ServerTiming] = None,
+) -> Tuple[bytes, str]:
+    """
+    Render the /convert body in the given mode; returns the body and its
+    media type. Styling and serializing are timed in ``timing``, if given.
+    """
+    started = time.perf_counter()
+    header = MarkdownStyler.build_header(result.metadata)
+    styled = time.perf_counter()
+    rendered = render_styled_body(result, content_type, mode, header)
+    if timing is not None:
+        timing.add("style", styled - started)
+        timing.since("serialize", styled)
+    return rendered
+
+
+def render_styled_body(
+    result: ConversionResult, content_type: str, mode: str, header: str
+) -> Tuple[bytes, str]:
+    """render_response_body with the MarkdownStyler header already built"""
+    if mode == "full":
+        return (
+            render_conversion_response(result, content_type, header),
+            "application/json",
+        )
+
+    if mode == "markdown":
+        writer = MarkdownWriter()
+        writer.write(header)
+        writer.write(result.markdown)
+        return writer.getvalue().encode("utf-8"), "text/markdown; charset=utf-8"
+
+    details = {
+        "metadata": result.metadata,
+        "preview": result.preview,
+        "sourceFormat": SUPPORTED_FORMATS.get(content_type, "unknown"),
+    }
+    if mode == "compact":
+        # Only rawMarkdown, escaped the same way as in the full body
+        rest = JSONResponse(None).render(details)
+        return (
+            b"".join(
+                [
+                    b'{"success":true,"rawMarkdown":',
+                    encode_json_string(header)[:-1],
+                    memoryview(encode_json_string(result.markdown))[1:],
+                    b",",
+                    rest[1:],
+                ]
+            ),
+            "application/json",
+        )
+
+    # multipart: a JSON part with the metadata, then the markdown unescaped
+    boundary = f"frida-{uuid.uuid4().hex}"
+    head = JSONResponse(None).render({"success": True, **details})
+    return (
+        b"".join(
+            [
+                f"--{boundary}\r\n".encode(),
+                b"Content-Type: application/json\r\n\r\n",
+                head,
+                f"\r\n--{boundary}\r\n".encode(),
+                b"Content-Type: text/markdown; charset=utf-8\r\n\r\n",
+                header.encode("utf-8"),
+                result.markdown.encode("utf-8"),
+                f"\r\n--{boundary}--\r\n".encode(),
+            ]
+        ),
+        f"multipart/mixed; boundary={boundary}",
+    )
+
+
 @router.post("/convert")
-async def convert_to_markdown(file: UploadFile = File(...)):
+async def convert_to_markdown(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: Optional[str] = Query(None),
+    pdf_tier: Optional[str] = Query(None),
+    incremental: Optional[bool] = Query(None),
+):
     """
     Convert various file formats to Markdown with enhanced styling.
     Supports PDF, DOCX, TXT, HTML, CSV, JSON, XLSX, images, and more.
+
+    PDFs are extracted with the ``?pdf_tier=`` tier: "fast" text, "layout"
+    tables and headings, or "auto" per page (default: FRIDA_PDF_TIER).
+
+    With ``?incremental=true`` (default: FRIDA_INCREMENTAL) PDF pages and
+    workbook sheets that an earlier upload shared are reused instead of
+    converted again; the metadata counts them as reused_pages or
+    reused_sheets.
+
+    With the X-Frida-Profile header (or by sampling) the conversion is
+    profiled; the X-Frida-Profile-Id response header names the profile to
+    fetch from /convert/profiles/{profile_id}.
+
+    With FRIDA_HISTORY=1 the result is recorded in the conversion history
+    of the X-Frida-Owner header's owner once the response is sent; see
+    /history.
+
+    The response shape is picked by ``?mode=`` or the Accept header: "full"
+    (default), "compact" JSON without markdownContent, "markdown" as
+    text/markdown or "multipart" metadata and markdown parts. Large bodies
+    are compressed as negotiated through Accept-Encoding. The Server-Timing
+    header breaks the request down by stage.
     """
+    timing = ServerTiming()
+    try:
+        profile = (
+            ConversionProfile()
+            if should_profile(request.headers.get(PROFILE_HEADER))
+            else None
+        )
+    except PermissionError as pe:
+        return create_error_response(403, str(pe))
+    try:
+        owner = (
+            history_owner(request.headers.get(HISTORY_OWNER_HEADER))
+            if HISTORY_ENABLED
+            else None
+        )
+    except ValueError as ve:
+        return create_error_response(400, str(ve))
     try:
+        response_mode = select_response_mode(mode, request.headers.get("accept"))
+        if pdf_tier is not None and pdf_tier not in PDF_TIERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported pdf_tier {pdf_tier!r}, expected one of {', '.join(PDF_TIERS)}",
+            )
+
         # Validate file presence
         if not file:
             return create_error_response(400, "No file uploaded")
 
-        # Get file content type
-        content_type = file.content_type or "application/octet-stream"
-
         # Validate file size
         file.file.seek(0, 2)  # Move to the end of the file
         file_size = file.file.tell()  # Get file size
@@ -645,55 +1976,45 @@ async def convert_to_markdown(file: UploadFile = File(...)):
                 400, f"File size exceeds {MAX_FILE_SIZE / 1024 / 1024} MB"
             )
 
-        # Choose converter based on content type
-        if content_type == "application/pdf":
-            result = await convert_pdf_to_markdown(file)
-        elif content_type in [
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "application/msword",
-        ]:
-            result = await convert_docx_to_markdown(file)
-        elif content_type == "text/plain":
-            result = await convert_txt_to_markdown(file)
-        elif content_type == "text/html":
-            result = await convert_html_to_markdown(file)
-        elif content_type == "text/csv":
-            result = await convert_csv_to_markdown(file)
-        elif content_type == "application/json":
-            result = await convert_json_to_markdown(file)
-        elif (
-            content_type
-            == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        ):
-            result = await convert_xlsx_to_markdown(file)
-        elif content_type in ["image/jpeg", "image/png", "image/gif", "image/svg+xml"]:
-            result = await convert_image_to_markdown(file)
-        elif content_type == "text/xml":
-            result = await convert_xml_to_markdown(file)
+        # Choose converter based on the content, name and declared type
+        fmt, content_type = detect_upload(file)
+        timing.since("read", timing.started)
+        options = {"tier": pdf_tier or PDF_TIER} if fmt == "pdf" else None
+        if fmt in ("pdf", "xlsx") and (INCREMENTAL if incremental is None else incremental):
+            options = {**(options or {}), "incremental": "1"}
+        headers = {"Vary": "Accept"}
+        if profile is None:
+            result = await convert_upload(fmt, file, content_type, options, timing)
         else:
-            # Try to handle unknown formats
-            result = await convert_unknown_to_markdown(file)
-
-        # Enhance markdown with additional styling and metadata
-        enhanced_markdown = MarkdownStyler.enhance_markdown(
-            result.markdown, result.metadata
-        )
-
-        # Format the markdown as a code block for the API response
-        markdown_code_block = f"```markdown\n{enhanced_markdown}\n```"
+            profiling = active_profile.set(profile)
+            try:
+                result = await convert_upload(fmt, file, content_type, options, timing)
+            finally:
+                active_profile.reset(profiling)
+            try:
+                await asyncio.to_thread(profile_store.put, profile)
+                headers["X-Frida-Profile-Id"] = profile.id
+            except OSError as e:
+                print(f"Could not store profile {profile.id}: {str(e)}")
+        if owner is not None:
+            background_tasks.add_task(
+                record_history,
+                owner,
+                fmt,
+                result._content_hash,
+                file_size,
+                file.filename,
+                result.content_type,
+                result.markdown,
+                dict(result.metadata),
+            )
 
         # Return the response
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "message": "File converted successfully",
-                "markdownContent": markdown_code_block,
-                "rawMarkdown": enhanced_markdown,
-                "metadata": result.metadata,
-                "preview": result.preview,
-                "sourceFormat": SUPPORTED_FORMATS.get(content_type, "unknown"),
-            },
+        body, media_type = render_response_body(
+            result, content_type, response_mode, timing
+        )
+        return compressed_response(
+            request, body, media_type, headers=headers, timing=timing
         )
 
     except HTTPException as he:
@@ -704,6 +2025,170 @@ async def convert_to_markdown(file: UploadFile = File(...)):
         return create_error_response(500, f"Failed to convert file: {str(e)}")
 
 
+def format_stream_frame(frame: Dict, sse: bool) -> str:
+    """Serialize a streaming frame as an NDJSON line or a Server-Sent Event"""
+    data = json.dumps(frame, default=str)
+    if sse:
+        return f"event: {frame['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def spool_upload(file: UploadFile) -> BinaryIO:
+    """
+    Copy an upload to a private temporary file. Uploads are closed once the
+    handler returns, so streaming responses read from the copy instead.
+    """
+    spool = tempfile.TemporaryFile()
+
+    def copy():
+        file.file.seek(0)
+        shutil.copyfileobj(file.file, spool, 1024 * 1024)
+        spool.seek(0)
+
+    await asyncio.to_thread(copy)
+    return spool
+
+
+@router.post("/convert/stream")
+async def convert_to_markdown_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    stream_format: Optional[str] = Query(None, alias="format"),
+    max_rows: Optional[int] = Query(None, ge=0),
+    sample: int = Query(1, ge=1),
+):
+    """
+    Stream a PDF page by page, or a CSV table in batches of rows, as NDJSON
+    (default) or Server-Sent Events (``?format=sse`` or
+    ``Accept: text/event-stream``). The first frame carries the document
+    metadata and the last one a trailer with totals. CSV tables can be
+    capped with ``max_rows`` and sampled to every ``sample``-th row.
+    """
+    fmt, content_type = detect_upload(file)
+    if fmt not in ("pdf", "csv"):
+        return create_error_response(
+            415, "Streaming conversion supports PDF and CSV files only"
+        )
+    label = fmt.upper()
+
+    file.file.seek(0, 2)
+    file_size = file.file.tell()
+    file.file.seek(0)
+    if file_size > MAX_FILE_SIZE:
+        return create_error_response(
+            400, f"File size exceeds {MAX_FILE_SIZE / 1024 / 1024} MB"
+        )
+
+    sse = stream_format == "sse" or (
+        stream_format is None
+        and "text/event-stream" in request.headers.get("accept", "")
+    )
+
+    # The worker gets the upload's bytes; the size limit above bounds them
+    content = await file.read()
+    started = time.perf_counter()
+    if fmt == "pdf":
+        frames_iter = conversion_engine.stream(fmt, stream_pdf_frames, content, file.filename)
+    else:
+        frames_iter = conversion_engine.stream(
+            fmt, stream_csv_frames, content, file.filename, max_rows, sample
+        )
+
+    # Open the document before committing to a 200 so unreadable files get a
+    # proper error status instead of an error frame
+    try:
+        header = await frames_iter.__anext__()
+    except HTTPException:
+        await frames_iter.aclose()
+        raise
+    except Exception as e:
+        await frames_iter.aclose()
+        return create_error_response(500, f"Error converting {label}: {str(e)}")
+
+    async def frames():
+        trailer = {"type": "trailer"}
+        pages = 0
+        characters = 0
+        yield format_stream_frame(header, sse)
+        try:
+            async for frame in frames_iter:
+                if frame["type"] == "trailer":
+                    trailer.update(frame)
+                    continue
+                if frame["type"] == "page":
+                    pages += 1
+                characters += len(frame["markdown"])
+                yield format_stream_frame(frame, sse)
+        except HTTPException as he:
+            # Ran out of time or memory after the 200 went out
+            yield format_stream_frame({"type": "error", "error": he.detail}, sse)
+            return
+        except Exception as e:
+            print(f"Unexpected error during streaming conversion: {str(e)}")
+            yield format_stream_frame(
+                {"type": "error", "error": f"Error converting {label}: {str(e)}"}, sse
+            )
+            return
+        finally:
+            await frames_iter.aclose()
+
+        if fmt == "pdf":
+            trailer["pages"] = pages
+        trailer.update(
+            characters=characters,
+            size=file_size,
+            elapsedMs=round((time.perf_counter() - started) * 1000, 2),
+        )
+        yield format_stream_frame(trailer, sse)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/convert/cache")
+async def get_cache_stats():
+    """Get conversion cache hit/miss/eviction counters for cache sizing"""
+    return JSONResponse(
+        status_code=200,
+        content={"success": True, "cache": conversion_cache.stats()},
+    )
+
+
+@router.get("/convert/thumbnails/{name}")
+async def get_thumbnail(name: str):
+    """Get an image preview thumbnail created by a conversion"""
+    path = await asyncio.to_thread(thumbnail_store.get, name)
+    if path is None:
+        return create_error_response(404, "Thumbnail not found")
+    return FileResponse(
+        path,
+        media_type=thumbnail_store.media_type(name),
+        # Names are content hashes, so a thumbnail never changes
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@router.get("/convert/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    """
+    Get the profile of a profiled conversion as folded stacks, the input
+    format of flamegraph.pl, speedscope and inferno
+    """
+    try:
+        authorize(request.headers.get(PROFILE_HEADER))
+    except LookupError as le:
+        return create_error_response(404, str(le))
+    except PermissionError as pe:
+        return create_error_response(403, str(pe))
+    path = await asyncio.to_thread(profile_store.get, profile_id)
+    if path is None:
+        return create_error_response(404, "Profile not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
+
+
 @router.get("/supported-formats")
 async def get_supported_formats():
     """Get list of supported file formats for conversion"""
@@ -724,5 +2209,6 @@ async def get_supported_formats():
             "formats": formats,
             "maxFileSize": MAX_FILE_SIZE,
             "maxFileSizeMB": MAX_FILE_SIZE / 1024 / 1024,
+            "maxImagePixels": IMAGE_MAX_PIXELS,
         },
     )
@@ -0,0 +1,67 @@
+import json
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
+
+from api.controllers.history_controller import (
+    HISTORY_MAX_PAGE_SIZE,
+    HISTORY_OWNER_HEADER,
+    HISTORY_PAGE_SIZE,
+    decode_cursor,
+    get_history_controller,
+    history_owner,
+)
+from api.controllers.response_compression import compressed_response
+from api.route.converter import create_error_response
+
+router = APIRouter()
+
+
+# GET: Get a page of the conversion history
+@router.get("/history")
+async def get_conversion_history(
+    request: Request,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    List the conversions of the owner named by the X-Frida-Owner header,
+    newest first and without their markdown. Pass the ``nextCursor`` of a
+    page as ``?cursor=`` to get the next one; it is null on the last page.
+    """
+    try:
+        owner = history_owner(request.headers.get(HISTORY_OWNER_HEADER))
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as ve:
+        return create_error_response(400, str(ve))
+    try:
+        # Connecting blocks too, so the first request opens it off the event loop
+        page = await asyncio.to_thread(
+            lambda: get_history_controller().list_history(owner, limit, before)
+        )
+    except Exception as e:
+        return create_error_response(503, f"Error retrieving history: {str(e)}")
+    return JSONResponse(status_code=200, content=page)
+
+
+# GET: Get a conversion from the history
+@router.get("/history/{entry_id}")
+async def get_conversion_history_entry(entry_id: str, request: Request):
+    """Get a conversion of the history with its markdownContent"""
+    try:
+        owner = history_owner(request.headers.get(HISTORY_OWNER_HEADER))
+    except ValueError as ve:
+        return create_error_response(400, str(ve))
+    try:
+        entry = await asyncio.to_thread(
+            lambda: get_history_controller().get_entry(owner, entry_id)
+        )
+    except Exception as e:
+        return create_error_response(503, f"Error retrieving history: {str(e)}")
+    if entry is None:
+        return create_error_response(404, "History entry not found")
+    # Large markdown bodies compress well; the history list stays small
+    body = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+    return compressed_response(request, body, "application/json")
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, File, Request, UploadFile
+from fastapi.responses import JSONResponse
+
+from api.controllers.job_controller import job_controller
+from api.controllers.response_compression import compressed_response
+from api.route.converter import MAX_FILE_SIZE, create_error_response
+
+router = APIRouter()
+
+
+# POST: Submit a conversion job
+@router.post("/convert/jobs")
+async def submit_conversion_job(file: UploadFile = File(...)):
+    """
+    Queue a conversion and return its job id immediately. Poll
+    ``/convert/jobs/{job_id}`` for its status and fetch the /convert response
+    body from ``/convert/jobs/{job_id}/result`` once it has succeeded.
+    """
+    file.file.seek(0, 2)
+    file_size = file.file.tell()
+    file.file.seek(0)
+    if file_size > MAX_FILE_SIZE:
+        return create_error_response(
+            400, f"File size exceeds {MAX_FILE_SIZE / 1024 / 1024} MB"
+        )
+
+    content = await file.read()
+    job = await job_controller.submit(content, file.filename, file.content_type)
+    status_url = f"/api/py/convert/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "jobId": job["id"],
+            "job": job,
+            "statusUrl": status_url,
+            "resultUrl": f"{status_url}/result",
+        },
+        headers={"Location": status_url},
+    )
+
+
+# GET: Get job status
+@router.get("/convert/jobs/{job_id}")
+async def get_conversion_job(job_id: str):
+    job = await job_controller.get_job(job_id)
+    if job is None:
+        return create_error_response(404, "Job not found")
+    return JSONResponse(status_code=200, content={"success": True, "job": job})
+
+
+# GET: Get job result
+@router.get("/convert/jobs/{job_id}/result")
+async def get_conversion_job_result(job_id: str, request: Request):
+    outcome = await job_controller.get_result(job_id)
+    if outcome is None:
+        return create_error_response(404, "Job not found")
+
+    job = outcome["job"]
+    if job["status"] == "succeeded":
+        if outcome["body"] is None:
+            return create_error_response(410, "Job result is no longer available")
+        return compressed_response(request, outcome["body"], "application/json")
+    if job["status"] == "failed":
+        return create_error_response(outcome["status_code"], job["error"])
+
+    # Not finished yet: point the client back at the status endpoint
+    return JSONResponse(
+        status_code=202,
+        content={"success": True, "job": job},
+        headers={"Retry-After": "1"},
+    )
+
+
+# DELETE: Delete a job and its stored files
+@router.delete("/convert/jobs/{job_id}")
+async def delete_conversion_job(job_id: str):
+    deleted_count = await job_controller.delete_job(job_id)
+    if deleted_count > 0:
+        return {"success": True, "message": "Job deleted successfully"}
+    return create_error_response(404, "Job not found")
@@ -4,10 +4,6 @@ from pydantic import BaseModel, EmailStr
 from datetime import datetime
 from typing import Optional
 
-# Initialize the database
-db = get_database()
-
-
 # Create a Pydantic model for the request body
 class MessageCreateRequest(BaseModel):
     content: str
@@ -47,7 +43,6 @@ class MessageController:
 
 # Import the MessageModel
 from bson import ObjectId
-from pymongo.collection import Collection
 
 
 class MessageModel:
@@ -103,7 +98,16 @@ class MessageModel:
         return result.deleted_count
 
 
-message_controller = MessageController(db)
+# Connect to the database when a message route is first called, not at import
+_message_controller = None
+
+
+def get_message_controller() -> MessageController:
+    global _message_controller
+    if _message_controller is None:
+        _message_controller = MessageController(get_database())
+    return _message_controller
+
 
 message_routes = APIRouter()
 
@@ -112,7 +116,7 @@ message_routes = APIRouter()
 @message_routes.post("/messages")
 async def create_message(message: MessageCreateRequest):
     try:
-        new_message_id = message_controller.create_message(
+        new_message_id = get_message_controller().create_message(
             message.content, message.sender_name, message.sender_email, message.subject
         )
         return {"message_id": new_message_id}
@@ -124,7 +128,7 @@ async def create_message(message: MessageCreateRequest):
 @message_routes.get("/messages")
 async def get_all_messages():
     try:
-        messages = message_controller.get_all_messages()
+        messages = get_message_controller().get_all_messages()
         return messages
     except Exception as e:
         raise HTTPException(
@@ -135,7 +139,7 @@ async def get_all_messages():
 # GET: Get message by ID
 @message_routes.get("/messages/{message_id}")
 async def get_message_by_id(message_id: str):
-    message = message_controller.get_message_by_id(message_id)
+    message = get_message_controller().get_message_by_id(message_id)
     if message:
         return message
     else:
@@ -145,14 +149,14 @@ async def get_message_by_id(message_id: str):
 # GET: Get messages by email
 @message_routes.get("/messages/email/{email}")
 async def get_messages_by_email(email: str):
-    messages = message_controller.get_messages_by_email(email)
+    messages = get_message_controller().get_messages_by_email(email)
     return messages
 
 
 # PUT: Update message
 @message_routes.put("/messages/{message_id}")
 async def update_message(message_id: str, update_fields: dict):
-    updated_count = message_controller.update_message(message_id, update_fields)
+    updated_count = get_message_controller().update_message(message_id, update_fields)
     if updated_count > 0:
         return {"message": "Message updated successfully"}
     else:
@@ -164,7 +168,7 @@ async def update_message(message_id: str, update_fields: dict):
 # PUT: Mark message as read
 @message_routes.put("/messages/{message_id}/read")
 async def mark_message_as_read(message_id: str):
-    updated_count = message_controller.mark_as_read(message_id)
+    updated_count = get_message_controller().mark_as_read(message_id)
     if updated_count > 0:
         return {"message": "Message marked as read"}
     else:
@@ -176,7 +180,7 @@ async def mark_message_as_read(message_id: str):
 # DELETE: Delete message
 @message_routes.delete("/messages/{message_id}")
 async def delete_message(message_id: str):
-    deleted_count = message_controller.delete_message(message_id)
+    deleted_count = get_message_controller().delete_message(message_id)
     if deleted_count > 0:
         return {"message": "Message deleted successfully"}
     else:
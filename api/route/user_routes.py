@@ -4,10 +4,6 @@ from api.config.db import get_database
 
 from pydantic import BaseModel
 
-# Initialize the database
-db = get_database()
-
-
 # Create a Pydantic model for the request body
 class UserCreateRequest(BaseModel):
     username: str
@@ -15,7 +11,16 @@ class UserCreateRequest(BaseModel):
     password: str
     role: str = "user"
 
-user_controller = UserController(db)
+# Connect to the database when a user route is first called, not at import
+_user_controller = None
+
+
+def get_user_controller() -> UserController:
+    global _user_controller
+    if _user_controller is None:
+        _user_controller = UserController(get_database())
+    return _user_controller
+
 
 user_routes = APIRouter()
 
@@ -24,7 +29,7 @@ user_routes = APIRouter()
 @user_routes.post("/users")
 async def create_user(user: UserCreateRequest):
     try:
-        new_user_id = user_controller.create_user(
+        new_user_id = get_user_controller().create_user(
             user.username, user.email, user.password, user.role
         )
         return {"user_id": new_user_id}
@@ -36,7 +41,7 @@ async def create_user(user: UserCreateRequest):
 @user_routes.get("/users")
 async def get_all_users():
     try:
-        users = user_controller.get_all_users()
+        users = get_user_controller().get_all_users()
         return users
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error retrieving users: {str(e)}")
@@ -45,7 +50,7 @@ async def get_all_users():
 # GET: Get user by ID
 @user_routes.get("/users/{user_id}")
 async def get_user_by_id(user_id: str):
-    user = user_controller.get_user_by_id(user_id)
+    user = get_user_controller().get_user_by_id(user_id)
     if user:
         return user
     else:
@@ -55,7 +60,7 @@ async def get_user_by_id(user_id: str):
 # PUT: Update user
 @user_routes.put("/users/{user_id}")
 async def update_user(user_id: str, update_fields: dict):
-    updated_count = user_controller.update_user(user_id, update_fields)
+    updated_count = get_user_controller().update_user(user_id, update_fields)
     if updated_count > 0:
         return {"message": "User updated successfully"}
     else:
@@ -65,7 +70,7 @@ async def update_user(user_id: str, update_fields: dict):
 # DELETE: Delete user
 @user_routes.delete("/users/{user_id}")
 async def delete_user(user_id: str):
-    deleted_count = user_controller.delete_user(user_id)
+    deleted_count = get_user_controller().delete_user(user_id)
     if deleted_count > 0:
         return {"message": "User deleted successfully"}
     else:
@@ -0,0 +1,399 @@
+"""
+Deterministic synthetic documents for the converter benchmarks.
+
+Every generator takes a size ("small", "medium" or "large") and a seed and
+returns the same bytes on every run and every machine: text comes from a
+seeded random.Random, and the DOCX/XLSX archives are written by hand with
+fixed timestamps instead of through libraries that stamp the current time.
+"""
+import io
+import json
+import random
+import zipfile
+from typing import Callable, Dict, List, NamedTuple
+from xml.sax.saxutils import escape
+
+SIZES = ["small", "medium", "large"]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure "
+    "in reprehenderit voluptate velit esse cillum fugiat nulla pariatur excepteur sint "
+    "occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est"
+).split()
+
+# Fixed timestamp for archive members, so archives are byte-identical
+ZIP_DATE = (2024, 1, 1, 0, 0, 0)
+
+
+class Document(NamedTuple):
+    format: str
+    size: str
+    filename: str
+    content_type: str
+    content: bytes
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return " ".join(sentence(rng, rng.randint(6, 16)) for _ in range(sentences))
+
+
+def _zip(members: Dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, text in members.items():
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, text.encode("utf-8"))
+    return buffer.getvalue()
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(rng: random.Random, pages: int) -> bytes:
+    """Text pages with a heading; every fifth page also has a ruled table"""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids [%s] /Count %d >>"
+            % (" ".join(f"{3 + i * 2} 0 R" for i in range(pages)), pages)
+        ).encode(),
+    ]
+    font = 3 + pages * 2
+    for index in range(pages):
+        operators = [
+            f"BT /F1 16 Tf 50 750 Td (Section {index + 1}: "
+            f"{_pdf_string(sentence(rng, 4))}) Tj ET",
+            "BT /F1 10 Tf 50 725 Td 13 TL "
+            + " ".join(f"({_pdf_string(sentence(rng, 10))}) '" for _ in range(30))
+            + " ET",
+        ]
+        if index % 5 == 4:
+            for row in range(6):
+                for column in range(4):
+                    x, y = 50 + column * 125, 300 - row * 18
+                    operators.append(f"{x} {y} 125 18 re S")
+                    operators.append(
+                        f"BT /F1 9 Tf {x + 4} {y + 5} Td "
+                        f"({_pdf_string(' '.join(rng.sample(WORDS, 2)))}) Tj ET"
+                    )
+        stream = "\n".join(operators).encode("latin-1")
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + index * 2} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    objects.append(b"<< /Title (Benchmark document) /Author (Frida bench) >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        len(objects),
+        xref,
+    )
+    return bytes(out)
+
+
+def make_docx(rng: random.Random, paragraphs: int) -> bytes:
+    """Headings, paragraphs and a small table every 25 paragraphs"""
+    body = []
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            body.append(
+                '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr>'
+                f"<w:r><w:t>{escape(sentence(rng, 4))}</w:t></w:r></w:p>"
+            )
+        body.append(f"<w:p><w:r><w:t>{escape(paragraph(rng))}</w:t></w:r></w:p>")
+        if index % 25 == 24:
+            rows = "".join(
+                "<w:tr>"
+                + "".join(
+                    f"<w:tc><w:p><w:r><w:t>{rng.choice(WORDS)}</w:t></w:r></w:p></w:tc>"
+                    for _ in range(3)
+                )
+                + "</w:tr>"
+                for _ in range(4)
+            )
+            body.append(f"<w:tbl>{rows}</w:tbl>")
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    return _zip(
+        {
+            "[Content_Types].xml": (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>'
+                '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+                "</Types>"
+            ),
+            "_rels/.rels": (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+                "</Relationships>"
+            ),
+            "word/_rels/document.xml.rels": (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+                "</Relationships>"
+            ),
+            "word/styles.xml": (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                f'<w:styles xmlns:w="{namespace}">'
+                '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>'
+                "</w:styles>"
+            ),
+            "word/document.xml": (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                f'<w:document xmlns:w="{namespace}"><w:body>{"".join(body)}</w:body></w:document>'
+            ),
+        }
+    )
+
+
+def _column_name(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def make_xlsx(rng: random.Random, rows: int, sheets: int, columns: int = 8) -> bytes:
+    """Sheets of inline-string and number cells"""
+    members = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in range(1, sheets + 1)
+            )
+            + "</Types>"
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(
+                f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>'
+                for n in range(1, sheets + 1)
+            )
+            + "</sheets></workbook>"
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                for n in range(1, sheets + 1)
+            )
+            + "</Relationships>"
+        ),
+    }
+    for n in range(1, sheets + 1):
+        lines = []
+        for row in range(1, rows + 1):
+            cells = []
+            for column in range(columns):
+                reference = f"{_column_name(column)}{row}"
+                if column % 2:
+                    cells.append(f'<c r="{reference}"><v>{rng.randint(0, 10**6)}</v></c>')
+                else:
+                    cells.append(
+                        f'<c r="{reference}" t="inlineStr"><is><t>{rng.choice(WORDS)}</t></is></c>'
+                    )
+            lines.append(f'<row r="{row}">{"".join(cells)}</row>')
+        members[f"xl/worksheets/sheet{n}.xml"] = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:{_column_name(columns - 1)}{rows}"/>'
+            f'<sheetData>{"".join(lines)}</sheetData></worksheet>'
+        )
+    return _zip(members)
+
+
+def make_csv(rng: random.Random, rows: int, columns: int = 8) -> bytes:
+    lines = [",".join(f"column_{n}" for n in range(columns))]
+    for _ in range(rows):
+        lines.append(
+            ",".join(
+                str(rng.randint(0, 10**6)) if n % 2 else rng.choice(WORDS)
+                for n in range(columns)
+            )
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def make_json(rng: random.Random, items: int) -> bytes:
+    records = [
+        {
+            "id": index,
+            "name": sentence(rng, 3),
+            "score": round(rng.random() * 100, 3),
+            "active": index % 3 == 0,
+            "tags": rng.sample(WORDS, 3),
+            "address": {"street": sentence(rng, 2), "number": rng.randint(1, 999)},
+        }
+        for index in range(items)
+    ]
+    return json.dumps({"generated": "bench", "records": records}).encode("utf-8")
+
+
+def make_xml(rng: random.Random, items: int) -> bytes:
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<catalog xmlns:b="urn:bench">']
+    for index in range(items):
+        parts.append(
+            f'<b:item id="{index}" kind="{rng.choice(WORDS)}">'
+            f"<title>{escape(sentence(rng, 4))}</title>"
+            f"<price>{rng.randint(1, 10**4) / 100}</price>"
+            f"<description>{escape(paragraph(rng, 2))}</description>"
+            "</b:item>"
+        )
+    parts.append("</catalog>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def make_html(rng: random.Random, sections: int) -> bytes:
+    parts = ["<!DOCTYPE html><html><head><title>Benchmark page</title></head><body>"]
+    for index in range(sections):
+        parts.append(f"<h2>{escape(sentence(rng, 4))}</h2>")
+        parts.append(f"<p>{escape(paragraph(rng))} <a href='#s{index}'>link</a></p>")
+        parts.append(
+            "<ul>" + "".join(f"<li>{escape(sentence(rng, 5))}</li>" for _ in range(3)) + "</ul>"
+        )
+        if index % 10 == 9:
+            rows = "".join(
+                "<tr>" + "".join(f"<td>{rng.choice(WORDS)}</td>" for _ in range(4)) + "</tr>"
+                for _ in range(5)
+            )
+            parts.append(f"<table>{rows}</table><img src='figure{index}.png' alt='figure'>")
+    parts.append("</body></html>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def make_txt(rng: random.Random, paragraphs: int) -> bytes:
+    return "\n\n".join(paragraph(rng) for _ in range(paragraphs)).encode("utf-8")
+
+
+def make_image(rng: random.Random, side: int) -> bytes:
+    from PIL import Image
+
+    image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_unknown(rng: random.Random, paragraphs: int) -> bytes:
+    # RTF has no converter of its own, so it goes to the fallback converter
+    body = "\\par\n".join(paragraph(rng) for _ in range(paragraphs))
+    return ("{\\rtf1\\ansi\\deff0 {\\fonttbl {\\f0 Times;}}\n" + body + "\n}").encode("utf-8")
+
+
+class Generator(NamedTuple):
+    extension: str
+    content_type: str
+    make: Callable[[random.Random, str], bytes]
+
+
+GENERATORS: Dict[str, Generator] = {
+    "pdf": Generator(
+        "pdf",
+        "application/pdf",
+        lambda rng, size: make_pdf(rng, {"small": 2, "medium": 20, "large": 100}[size]),
+    ),
+    "docx": Generator(
+        "docx",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        lambda rng, size: make_docx(rng, {"small": 20, "medium": 500, "large": 5000}[size]),
+    ),
+    "txt": Generator(
+        "txt",
+        "text/plain",
+        lambda rng, size: make_txt(rng, {"small": 20, "medium": 2000, "large": 40000}[size]),
+    ),
+    "html": Generator(
+        "html",
+        "text/html",
+        lambda rng, size: make_html(rng, {"small": 10, "medium": 300, "large": 3000}[size]),
+    ),
+    "csv": Generator(
+        "csv",
+        "text/csv",
+        lambda rng, size: make_csv(rng, {"small": 100, "medium": 10_000, "large": 100_000}[size]),
+    ),
+    "json": Generator(
+        "json",
+        "application/json",
+        lambda rng, size: make_json(rng, {"small": 50, "medium": 5000, "large": 50_000}[size]),
+    ),
+    "xlsx": Generator(
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        lambda rng, size: make_xlsx(
+            rng, {"small": 50, "medium": 2000, "large": 20_000}[size], {"small": 1, "medium": 2, "large": 4}[size]
+        ),
+    ),
+    "image": Generator(
+        "png",
+        "image/png",
+        lambda rng, size: make_image(rng, {"small": 64, "medium": 512, "large": 1024}[size]),
+    ),
+    "xml": Generator(
+        "xml",
+        "application/xml",
+        lambda rng, size: make_xml(rng, {"small": 50, "medium": 5000, "large": 50_000}[size]),
+    ),
+    "unknown": Generator(
+        "rtf",
+        "application/rtf",
+        lambda rng, size: make_unknown(rng, {"small": 20, "medium": 500, "large": 5000}[size]),
+    ),
+}
+
+
+def generate(fmt: str, size: str, seed: int = 0) -> Document:
+    """Generate the benchmark document for a format and size"""
+    generator = GENERATORS[fmt]
+    # Each document has its own stream, so adding formats doesn't change the others
+    rng = random.Random(f"{seed}:{fmt}:{size}")
+    return Document(
+        fmt,
+        size,
+        f"bench-{size}.{generator.extension}",
+        generator.content_type,
+        generator.make(rng, size),
+    )
@@ -0,0 +1,278 @@
+"""
+Converter benchmarks.
+
+Runs every convert_*_to_markdown function and the /convert route in-process
+on the synthetic corpus (see bench/corpus.py), and records the latency,
+throughput and peak memory of each case:
+
+    python -m bench                                   # small and medium documents
+    python -m bench --sizes large --formats pdf,csv
+    python -m bench --save-baseline bench/baseline.json
+    python -m bench --baseline bench/baseline.json --max-slowdown 0.2
+
+With a baseline, cases that got slower or use more memory than the
+thresholds allow are reported and the exit status is 1.
+
+The result cache is disabled so every run converts. Converters run inline
+by default (--engine), so the peak memory, which is the Python allocation
+peak traced by tracemalloc in this process, includes the converters.
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bench.corpus import GENERATORS, SIZES, Document, generate
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def measure(call: Callable[[], None], repeat: int, warmup: int) -> Dict:
+    """Time ``repeat`` calls after ``warmup`` ones, then trace one more for its peak memory"""
+    for _ in range(warmup):
+        call()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+
+    # Tracing slows allocations down, so the traced call isn't timed
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "peak_memory_bytes": peak,
+    }
+
+
+def function_case(
+    loop: asyncio.AbstractEventLoop, document: Document
+) -> Callable[[], None]:
+    """A call of the document's convert_<format>_to_markdown on a fresh upload"""
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+
+    from api.route import converter
+
+    convert: Callable[[UploadFile], Awaitable] = getattr(
+        converter, f"convert_{document.format}_to_markdown"
+    )
+
+    def call() -> None:
+        upload = UploadFile(
+            io.BytesIO(document.content),
+            filename=document.filename,
+            headers=Headers({"content-type": document.content_type}),
+        )
+        loop.run_until_complete(convert(upload))
+
+    return call
+
+
+def route_case(client, document: Document) -> Callable[[], None]:
+    """A POST of the document to /convert"""
+
+    def call() -> None:
+        response = client.post(
+            "/api/py/convert",
+            files={"file": (document.filename, document.content, document.content_type)},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"/convert answered {response.status_code} for {document.filename}: "
+                f"{response.text[:200]}"
+            )
+
+    return call
+
+
+def run(args: argparse.Namespace) -> Dict:
+    documents = [
+        generate(fmt, size, args.seed) for size in args.sizes for fmt in args.formats
+    ]
+    cases: Dict[str, Dict] = {}
+
+    def record(kind: str, document: Document, call: Callable[[], None]) -> None:
+        name = f"{kind}/{document.format}/{document.size}"
+        result = measure(call, args.repeat, args.warmup)
+        seconds = result["median_ms"] / 1000
+        result.update(
+            input_bytes=len(document.content),
+            throughput_mb_s=round(len(document.content) / seconds / 1e6, 3)
+            if seconds
+            else None,
+        )
+        cases[name] = result
+        print(
+            f"{name:<28} {len(document.content) / 1e6:>8.2f} MB "
+            f"{result['median_ms']:>10.1f} ms {result['throughput_mb_s'] or 0:>8.2f} MB/s "
+            f"{result['peak_memory_bytes'] / 1e6:>8.1f} MB peak",
+            flush=True,
+        )
+
+    if "functions" in args.targets:
+        loop = asyncio.new_event_loop()
+        try:
+            for document in documents:
+                record("function", document, function_case(loop, document))
+        finally:
+            loop.close()
+
+    if "route" in args.targets:
+        from fastapi.testclient import TestClient
+
+        from api.index import app
+
+        with TestClient(app) as client:
+            for document in documents:
+                record("route", document, route_case(client, document))
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engine": os.environ["FRIDA_ENGINE_MODE"],
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "cases": cases,
+    }
+
+
+def compare(
+    results: Dict,
+    baseline: Dict,
+    max_slowdown: float,
+    max_memory_growth: float,
+    min_ms: float,
+) -> List[str]:
+    """Describe each case that regressed past the thresholds"""
+    regressions = []
+    for name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        # Cases faster than min_ms are too noisy to compare
+        if max(case["median_ms"], base["median_ms"]) >= min_ms and base["median_ms"]:
+            slowdown = case["median_ms"] / base["median_ms"] - 1
+            if slowdown > max_slowdown:
+                regressions.append(
+                    f"{name}: {case['median_ms']:.1f} ms vs {base['median_ms']:.1f} ms "
+                    f"(+{slowdown:.0%}, allowed +{max_slowdown:.0%})"
+                )
+        if base["peak_memory_bytes"]:
+            growth = case["peak_memory_bytes"] / base["peak_memory_bytes"] - 1
+            if growth > max_memory_growth:
+                regressions.append(
+                    f"{name}: peak {case['peak_memory_bytes'] / 1e6:.1f} MB vs "
+                    f"{base['peak_memory_bytes'] / 1e6:.1f} MB "
+                    f"(+{growth:.0%}, allowed +{max_memory_growth:.0%})"
+                )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench", description="Benchmark the file converters"
+    )
+    parser.add_argument("--formats", default=",".join(GENERATORS))
+    parser.add_argument("--sizes", default="small,medium", help=f"of {', '.join(SIZES)}")
+    parser.add_argument(
+        "--targets",
+        default="functions,route",
+        help="functions (convert_*_to_markdown) and/or route (/convert)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--engine", default="inline", choices=["inline", "thread", "process"]
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument(
+        "--baseline",
+        help=f"compare against these results (default: {DEFAULT_BASELINE}, if it exists)",
+    )
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=0.25,
+        help="allowed relative increase of the median latency (0.25 = +25%%)",
+    )
+    parser.add_argument(
+        "--max-memory-growth",
+        type=float,
+        default=0.25,
+        help="allowed relative increase of the peak memory",
+    )
+    parser.add_argument(
+        "--min-ms",
+        type=float,
+        default=2.0,
+        help="latencies below this are not compared",
+    )
+    args = parser.parse_args(argv)
+    args.formats = [fmt for fmt in args.formats.split(",") if fmt]
+    args.sizes = [size for size in args.sizes.split(",") if size]
+    args.targets = [target for target in args.targets.split(",") if target]
+    for fmt in args.formats:
+        if fmt not in GENERATORS:
+            parser.error(f"unknown format {fmt!r}, expected some of {', '.join(GENERATORS)}")
+    for size in args.sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size {size!r}, expected some of {', '.join(SIZES)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    # The engine and cache read their settings when imported
+    os.environ["FRIDA_ENGINE_MODE"] = args.engine
+    os.environ["FRIDA_CACHE_ENABLED"] = "0"
+    os.environ.setdefault("FRIDA_WARM_UP", "blocking")
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Saved the baseline to {args.save_baseline}")
+
+    baseline_path = args.baseline or (
+        DEFAULT_BASELINE
+        if not args.save_baseline and os.path.exists(DEFAULT_BASELINE)
+        else None
+    )
+    if not baseline_path:
+        return 0
+    with open(baseline_path) as source:
+        baseline = json.load(source)
+    regressions = compare(
+        results, baseline, args.max_slowdown, args.max_memory_growth, args.min_ms
+    )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {baseline_path}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {baseline_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())